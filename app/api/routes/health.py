@@ -1,11 +1,36 @@
 """Health check endpoints"""
+import asyncio
 from fastapi import APIRouter
 from app.models.responses import HealthResponse
 from app.config import get_settings
+from app.services.queue import get_message_queue
+from app.services.dedup import get_dedup_store
+from app.services.media_cache import get_media_cache
+from app.core.speech.tts_cache import get_tts_cache
+from app.core.kb.embedding_cache import get_embedding_cache
+from app.core.kb.archive import get_chat_archiver
+from app.core.ai.memory import get_conversation_memory
+from app.core.ai.semantic_cache import get_semantic_cache
+from app.utils.tempfiles import get_temp_space
 
 router = APIRouter()
 
 
+def _metrics() -> dict:
+    """Queue, cache and temp-space stats (SQLite queries and a temp-folder walk, so blocking)"""
+    return {
+        "queue": get_message_queue().stats(),
+        "dedup": get_dedup_store().stats(),
+        "media_ids": get_media_cache().stats(),
+        "tts_cache": get_tts_cache().stats() if get_tts_cache() else None,
+        "embeddings": get_embedding_cache().stats() if get_embedding_cache() else None,
+        "temp": get_temp_space().stats(),
+        "chat_archive": get_chat_archiver().stats(),
+        "memory": get_conversation_memory().stats() if get_conversation_memory() else None,
+        "semantic_cache": get_semantic_cache().stats() if get_semantic_cache() else None,
+    }
+
+
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
@@ -24,7 +49,9 @@ async def health_check():
     return HealthResponse(
         status="healthy" if all_healthy else "degraded",
         version=settings.APP_VERSION,
-        services=services
+        services=services,
+        # Gathered in a worker thread so the webhook is not held up meanwhile
+        metrics=await asyncio.to_thread(_metrics)
     )
 
 
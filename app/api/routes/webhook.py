@@ -1,15 +1,54 @@
 """WhatsApp webhook endpoints"""
+import asyncio
 from fastapi import APIRouter, Request, HTTPException, Query, File, Form, UploadFile
+from pydantic import ValidationError
 from typing import Optional
 
+from app.models.requests import WebhookRequest
 from app.models.responses import WebhookResponse
 from app.services.message_handler import get_message_handler
+from app.services.queue import get_message_queue, get_worker_pool
+from app.services.dedup import get_dedup_store
 from app.config import get_settings
 from app.core.ai.llm import generate_ai_response
 
 router = APIRouter()
 
 
+def queue_messages(messages: list) -> int:
+    """
+    Queue each new message of a delivery (blocking SQLite calls; run in a thread).
+    Ids are claimed before the enqueue, so concurrent workers never queue the
+    same message twice, and released if it fails, so Meta's redelivery is not
+    dropped as a duplicate.
+    """
+    # Each message is accepted on its own; a malformed one never drops the rest
+    dedup = get_dedup_store()
+    jobs, claimed = [], []
+    duplicates = 0
+    for message in messages:
+        phone = message.get('from')
+        if not phone:
+            print(f"Webhook message without sender skipped: {message.get('id')}")
+            continue
+        # Meta redelivers when we answer slowly; the first delivery is already queued
+        if message.get('id'):
+            if dedup.is_duplicate(message['id']):
+                duplicates += 1
+                continue
+            claimed.append(message['id'])
+        jobs.append((phone, message))
+    
+    if duplicates:
+        print(f"Skipped {duplicates} redelivered message(s)")
+    
+    try:
+        return get_message_queue().enqueue_many(jobs)
+    except Exception:
+        dedup.release(claimed)
+        raise
+
+
 @router.get("/webhook")
 async def webhook_verification(
     hub_mode: Optional[str] = Query(None, alias="hub.mode"),
@@ -39,39 +78,35 @@ async def webhook_verification(
 async def webhook_handler(request: Request):
     """
     WhatsApp webhook message handler
-    Processes incoming messages from WhatsApp
+    Persists every message of the delivery to the job queue and acknowledges immediately
     """
     data = await request.json()
     
     try:
-        # Extract message data
-        entry = data['entry'][0]
-        changes = entry['changes'][0]
-        value = changes['value']
-        
-        # Check if there are messages
-        if 'messages' not in value or not value['messages']:
-            return WebhookResponse(status='no_messages')
-        
-        message = value['messages'][0]
-        phone = message['from']
-        
-        # Process the message
-        handler = get_message_handler()
-        result = handler.process_message(phone, message)
-        
-        return WebhookResponse(
-            status=result.get('status', 'ok'),
-            media_sent=result.get('media_sent'),
-            message=result.get('message')
-        )
-        
-    except KeyError as e:
+        payload = WebhookRequest(**data)
+    except ValidationError as e:
         print(f"Webhook payload error: {e}")
-        raise HTTPException(status_code=400, detail=f'Invalid webhook payload: missing {e}')
-    except Exception as e:
-        print(f"Webhook processing error: {e}")
-        raise HTTPException(status_code=500, detail=f'Internal error: {str(e)}')
+        raise HTTPException(status_code=400, detail='Invalid webhook payload')
+    
+    messages = payload.messages()
+    statuses = payload.statuses()
+    
+    if not messages and not statuses:
+        return WebhookResponse(status='no_messages')
+    
+    # Queue workers process different customers concurrently, each in order
+    queued = await asyncio.to_thread(queue_messages, messages)
+    if queued:
+        get_worker_pool().notify()
+    
+    handler = get_message_handler()
+    for status in statuses:
+        try:
+            handler.handle_status(status)
+        except Exception as e:
+            print(f"Webhook status error: {e}")
+    
+    return WebhookResponse(status='accepted', queued=queued, statuses=len(statuses))
 
 
 # test endpoint for text or audio input
@@ -99,7 +134,7 @@ async def test(
         result["input_type"] = "text"
         result["text"] = text
 
-        data = generate_ai_response(text)
+        data = await asyncio.to_thread(generate_ai_response, text)
         print(data)
         
         # Process text with message handler if needed
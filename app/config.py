@@ -17,30 +17,112 @@ class Settings(BaseSettings):
     DEBUG: bool = Field(default=False, env="DEBUG")
     HOST: str = Field(default="0.0.0.0", env="HOST")
     PORT: int = Field(default=8000, env="PORT")
+    # Build API clients in the background at startup instead of on the first message
+    WARMUP_ON_STARTUP: bool = Field(default=True, env="WARMUP_ON_STARTUP")
     
     # OpenAI
     OPENAI_API_KEY: str = Field(..., env="OPENAI_API_KEY")
     LLM_MODEL: str = Field(default="gpt-4o-mini", env="LLM_MODEL")
+    # Stream replies: the first sentence is sent, and speech synthesized per
+    # sentence, while the rest is still being generated
+    LLM_STREAMING: bool = Field(default=True, env="LLM_STREAMING")
+    REPLY_MIN_SENTENCE_CHARS: int = Field(default=20, env="REPLY_MIN_SENTENCE_CHARS")
     
     # Pinecone
     PINECONE_API_KEY: str = Field(..., env="PINECONE_API_KEY")
     PINECONE_ENV: Optional[str] = Field(default=None, env="PINECONE_ENV")
     PINECONE_INDEX: str = Field(default="sales-agent-kb", env="PINECONE_INDEX")
     
+    # Vector store: "pinecone", or "local" (in-process index under VECTOR_INDEX_FOLDER)
+    VECTOR_BACKEND: str = Field(default="pinecone", env="VECTOR_BACKEND")
+    VECTOR_INDEX_FOLDER: str = Field(default="materials/data/vectors", env="VECTOR_INDEX_FOLDER")
+    # Token budget for KB text passed to the LLM per question (0 = no limit)
+    KB_CONTEXT_TOKENS: int = Field(default=1500, env="KB_CONTEXT_TOKENS")
+    
     # WhatsApp
     WHATSAPP_ACCESS_TOKEN: str = Field(..., env="WHATSAPP_ACCESS_TOKEN")
     WHATSAPP_PHONE_ID: str = Field(..., env="WHATSAPP_PHONE_ID")
     WHATSAPP_VERIFY_TOKEN: Optional[str] = Field(default=None, env="WHATSAPP_VERIFY_TOKEN")
+    WHATSAPP_POOL_SIZE: int = Field(default=20, env="WHATSAPP_POOL_SIZE")
+    WHATSAPP_TIMEOUT: float = Field(default=30.0, env="WHATSAPP_TIMEOUT")
+    WHATSAPP_CONNECT_TIMEOUT: float = Field(default=5.0, env="WHATSAPP_CONNECT_TIMEOUT")
+    WHATSAPP_MAX_RETRIES: int = Field(default=3, env="WHATSAPP_MAX_RETRIES")
+    WHATSAPP_RETRY_BACKOFF: float = Field(default=0.5, env="WHATSAPP_RETRY_BACKOFF")
+    # Uploaded media stays available for 30 days; renew a day early
+    MEDIA_ID_TTL_SECONDS: int = Field(default=29 * 24 * 3600, env="MEDIA_ID_TTL_SECONDS")
+    MAX_MEDIA_DOWNLOAD_BYTES: int = Field(default=16 * 1024 * 1024, env="MAX_MEDIA_DOWNLOAD_BYTES")
+    MEDIA_SPOOL_BYTES: int = Field(default=2 * 1024 * 1024, env="MEDIA_SPOOL_BYTES")
     
     # ElevenLabs
     ELEVENLABS_API_KEY: str = Field(..., env="ELEVENLABS_API_KEY")
     ELEVENLABS_VOICE_ID: Optional[str] = Field(default=None, env="ELEVENLABS_VOICE_ID")
     ELEVENLABS_VOICE_NAME: Optional[str] = Field(default=None, env="ELEVENLABS_VOICE_NAME")
+    TTS_CACHE_ENABLED: bool = Field(default=True, env="TTS_CACHE_ENABLED")
+    TTS_CACHE_MAX_MB: int = Field(default=256, env="TTS_CACHE_MAX_MB")
+    TTS_PARALLEL_SENTENCES: int = Field(default=3, env="TTS_PARALLEL_SENTENCES")
+    
+    # Semantic answer cache: a question this similar (cosine) to one answered
+    # before, with no prior conversation, reuses that answer instead of the LLM
+    SEMANTIC_CACHE_ENABLED: bool = Field(default=True, env="SEMANTIC_CACHE_ENABLED")
+    SEMANTIC_CACHE_THRESHOLD: float = Field(default=0.92, env="SEMANTIC_CACHE_THRESHOLD")
+    SEMANTIC_CACHE_TTL_SECONDS: int = Field(default=86400, env="SEMANTIC_CACHE_TTL_SECONDS")
+    SEMANTIC_CACHE_MAX_ENTRIES: int = Field(default=2000, env="SEMANTIC_CACHE_MAX_ENTRIES")
+    SEMANTIC_CACHE_MIN_CHARS: int = Field(default=12, env="SEMANTIC_CACHE_MIN_CHARS")
     
     # Folders
     MEDIA_FOLDER: str = Field(default="materials/media", env="MEDIA_FOLDER")
     PDF_FOLDER: str = Field(default="materials/pdfs", env="PDF_FOLDER")
     TEMP_FOLDER: str = Field(default="materials/temp", env="TEMP_FOLDER")
+    TEMP_QUOTA_MB: int = Field(default=512, env="TEMP_QUOTA_MB")
+    TEMP_MAX_AGE_SECONDS: int = Field(default=3600, env="TEMP_MAX_AGE_SECONDS")
+    TEMP_USE_TMPFS: bool = Field(default=False, env="TEMP_USE_TMPFS")
+    DATA_FOLDER: str = Field(default="materials/data", env="DATA_FOLDER")
+    
+    # Embedding cache
+    EMBED_CACHE_ENABLED: bool = Field(default=True, env="EMBED_CACHE_ENABLED")
+    EMBED_CACHE_MEMORY_ENTRIES: int = Field(default=2048, env="EMBED_CACHE_MEMORY_ENTRIES")
+    
+    # KB chunking: tokens per chunk (three fit in KB_CONTEXT_TOKENS), tokens
+    # repeated from the previous chunk, and whether exact repeats are dropped
+    CHUNK_TOKENS: int = Field(default=256, env="CHUNK_TOKENS")
+    CHUNK_OVERLAP_TOKENS: int = Field(default=32, env="CHUNK_OVERLAP_TOKENS")
+    CHUNK_DEDUP: bool = Field(default=True, env="CHUNK_DEDUP")
+    
+    # KB ingestion (scripts/init_kb.py)
+    INGEST_WORKERS: int = Field(default=0, env="INGEST_WORKERS")  # PDF parsing processes, 0 = CPU count
+    INGEST_EMBED_CONCURRENCY: int = Field(default=4, env="INGEST_EMBED_CONCURRENCY")
+    INGEST_BATCH_SIZE: int = Field(default=64, env="INGEST_BATCH_SIZE")
+    INGEST_REQUESTS_PER_MINUTE: int = Field(default=3000, env="INGEST_REQUESTS_PER_MINUTE")
+    INGEST_PAGES_PER_TASK: int = Field(default=50, env="INGEST_PAGES_PER_TASK")
+    # URL crawling: concurrent requests, same-domain link hops to follow, page cap
+    CRAWL_CONCURRENCY: int = Field(default=8, env="CRAWL_CONCURRENCY")
+    CRAWL_MAX_DEPTH: int = Field(default=0, env="CRAWL_MAX_DEPTH")
+    CRAWL_MAX_PAGES: int = Field(default=500, env="CRAWL_MAX_PAGES")
+    
+    # Chat archiving: turns per embedding/upsert batch, seconds a turn may wait
+    # for its batch, and turns buffered before the oldest are dropped
+    CHAT_ARCHIVE_BATCH_SIZE: int = Field(default=32, env="CHAT_ARCHIVE_BATCH_SIZE")
+    CHAT_ARCHIVE_FLUSH_SECONDS: float = Field(default=5.0, env="CHAT_ARCHIVE_FLUSH_SECONDS")
+    CHAT_ARCHIVE_MAX_PENDING: int = Field(default=1000, env="CHAT_ARCHIVE_MAX_PENDING")
+    
+    # Conversation memory: recent turns per customer go into the prompt within
+    # MEMORY_WINDOW_TOKENS; older turns are folded into a summary
+    MEMORY_ENABLED: bool = Field(default=True, env="MEMORY_ENABLED")
+    MEMORY_MAX_CUSTOMERS: int = Field(default=1000, env="MEMORY_MAX_CUSTOMERS")
+    MEMORY_MAX_TURNS: int = Field(default=12, env="MEMORY_MAX_TURNS")
+    MEMORY_WINDOW_TOKENS: int = Field(default=600, env="MEMORY_WINDOW_TOKENS")
+    MEMORY_SUMMARY_TOKENS: int = Field(default=150, env="MEMORY_SUMMARY_TOKENS")
+    MEMORY_IDLE_SECONDS: int = Field(default=1800, env="MEMORY_IDLE_SECONDS")
+    
+    # Message processing
+    MAX_CONCURRENT_MESSAGES: int = Field(default=8, env="MAX_CONCURRENT_MESSAGES")
+    QUEUE_WORKERS: int = Field(default=8, env="QUEUE_WORKERS")
+    QUEUE_MAX_ATTEMPTS: int = Field(default=3, env="QUEUE_MAX_ATTEMPTS")
+    
+    # Webhook deduplication
+    DEDUP_MAX_ENTRIES: int = Field(default=10000, env="DEDUP_MAX_ENTRIES")
+    DEDUP_TTL_SECONDS: int = Field(default=86400, env="DEDUP_TTL_SECONDS")
+    DEDUP_PERSIST: bool = Field(default=True, env="DEDUP_PERSIST")
     
     # Payment Links
     PAYMENT_LINK_NORMAL: str = Field(default="https://pay.example.com/linkA", env="PAYMENT_LINK_NORMAL")
@@ -66,6 +148,7 @@ def ensure_folders():
         settings.MEDIA_FOLDER,
         settings.PDF_FOLDER,
         settings.TEMP_FOLDER,
+        settings.DATA_FOLDER,
     ]
     for folder in folders:
         os.makedirs(folder, exist_ok=True)
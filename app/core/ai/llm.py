@@ -1,41 +1,116 @@
 """LLM and chain setup"""
+import time
 from functools import lru_cache
-from langchain.chains import RetrievalQA
+from typing import AsyncIterator, Optional
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 
 from app.config import get_settings
-from app.core.ai.prompts import get_qa_prompt_template
+from app.core.ai.prompts import NO_HISTORY, SUMMARY_PROMPT, get_qa_prompt_template
+from app.core.ai.semantic_cache import get_semantic_cache
+from app.core.kb.manager import fit_context
 from app.core.kb.retriever import get_retriever
 
 
 @lru_cache()
 def get_llm():
-    """Get cached LLM instance"""
+    """Get cached LLM instance (token streaming when LLM_STREAMING is on)"""
     settings = get_settings()
     return ChatOpenAI(
         model=settings.LLM_MODEL,
         temperature=0.6,
-        openai_api_key=settings.OPENAI_API_KEY
+        openai_api_key=settings.OPENAI_API_KEY,
+        streaming=settings.LLM_STREAMING
     )
 
 
+def _join_context(docs: list) -> str:
+    """KB documents as prompt context, within KB_CONTEXT_TOKENS (0 = no limit)"""
+    return "\n\n".join(doc.page_content for doc in fit_context(docs, get_settings().KB_CONTEXT_TOKENS))
+
+
+def _prompt(inputs: dict, docs: list):
+    return get_qa_prompt_template().format_prompt(
+        question=inputs["question"],
+        history=inputs.get("history") or NO_HISTORY,
+        context=_join_context(docs),
+    )
+
+
+def _build_prompt(inputs: dict):
+    docs = inputs.get("docs")
+    if docs is None:
+        docs = get_retriever().invoke(inputs["question"])
+    return _prompt(inputs, docs)
+
+
+async def _abuild_prompt(inputs: dict):
+    docs = inputs.get("docs")
+    if docs is None:
+        docs = await get_retriever().ainvoke(inputs["question"])
+    return _prompt(inputs, docs)
+
+
 @lru_cache()
 def get_qa_chain():
-    """Get cached RetrievalQA chain"""
-    llm = get_llm()
-    retriever = get_retriever()
-    prompt_template = get_qa_prompt_template()
-    
-    return RetrievalQA.from_chain_type(
-        llm=llm,
-        retriever=retriever,
-        chain_type='stuff',
-        chain_type_kwargs={'prompt': prompt_template}
+    """
+    QA chain as one runnable: {"question", "history", "docs"} -> answer text.
+    "docs" (already retrieved for this turn) and "history" are optional; the
+    retriever runs only when docs are missing. Supports invoke, ainvoke,
+    batch/abatch and stream/astream.
+    """
+    # Retrieval and prompt formatting are one plain step: every runnable in
+    # the sequence adds callback setup to each call, and
+    # RunnablePassthrough.assign would also fan out to a thread pool
+    return (
+        RunnableLambda(_build_prompt, afunc=_abuild_prompt)
+        | get_llm()
+        | StrOutputParser()
     )
 
 
-def generate_ai_response(user_text: str) -> str:
-    """Generate AI response for user text"""
-    chain = get_qa_chain()
-    return chain.run(user_text)
+def qa_inputs(user_text: str, docs: Optional[list] = None, history: str = "") -> dict:
+    return {"question": user_text, "docs": docs, "history": history}
+
+
+def generate_ai_response(user_text: str, docs: Optional[list] = None, history: str = "",
+                         use_cache: bool = True) -> str:
+    """
+    Generate AI response for user text
+    When docs are given (already retrieved for this turn) the retriever is skipped.
+    history is the customer's conversation so far (see ConversationMemory.history).
+    Questions asked without history are answered from the semantic cache
+    when a similar one was answered before (use_cache=False when the caller
+    already looked the question up).
+    """
+    cache = get_semantic_cache() if not history and use_cache else None
+    cached = cache.lookup(user_text) if cache else None
+    if cached and cached.answer:
+        return cached.answer
+    
+    start = time.perf_counter()
+    answer = get_qa_chain().invoke(qa_inputs(user_text, docs, history))
+    if cache:
+        cache.store(user_text, answer, time.perf_counter() - start, cached.vector)
+    return answer
+
+
+async def astream_ai_response(user_text: str, docs: Optional[list] = None,
+                              history: str = "") -> AsyncIterator[str]:
+    """
+    Same answer as generate_ai_response, yielded in pieces as the model
+    produces them, so the first sentence can go out before the last is written
+    """
+    async for piece in get_qa_chain().astream(qa_inputs(user_text, docs, history)):
+        if piece:
+            yield piece
+
+
+def summarize_conversation(summary: str, transcript: str, max_tokens: int) -> str:
+    """Fold new turns into a conversation's running summary"""
+    prompt = SUMMARY_PROMPT.format(
+        max_words=max(20, max_tokens * 3 // 4), summary=summary or "-", transcript=transcript
+    )
+    return get_llm().invoke(prompt).content.strip()
 
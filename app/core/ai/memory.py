@@ -0,0 +1,279 @@
+"""Per-customer conversation memory for the sales agent"""
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Deque, List, Optional
+
+from app.config import get_settings
+from app.utils.db import connect
+from app.utils.text import count_tokens, truncate_tokens
+
+
+@dataclass
+class Turn:
+    """One customer message and the agent's reply"""
+    user: str
+    reply: str
+    tokens: int  # of render(), the form the turn takes in the prompt
+    at: float
+    id: Optional[int] = None  # row id in the turns table
+
+    def render(self) -> str:
+        return f"Cliente: {self.user}\nAgente: {self.reply}"
+
+
+@dataclass
+class Conversation:
+    """Summary of older turns plus the most recent turns of one customer"""
+    phone: str
+    summary: str = ''
+    turns: Deque[Turn] = field(default_factory=deque)
+    last_active: float = 0.0
+    compacting: bool = False
+
+    @property
+    def turn_tokens(self) -> int:
+        return sum(t.tokens for t in self.turns)
+
+
+def extractive_summary(summary: str, turns: List[Turn], max_tokens: int) -> str:
+    """Fallback summary without the LLM: the latest customer messages that fit in max_tokens"""
+    lines = [summary] if summary else []
+    lines += [f"Cliente disse: {t.user}" for t in turns]
+    kept, used = [], 0
+    for line in reversed(lines):
+        tokens = count_tokens(line)
+        if used + tokens > max_tokens:
+            break
+        kept.append(line)
+        used += tokens
+    return '\n'.join(reversed(kept))
+
+
+class ConversationMemory:
+    """
+    Recent turns per phone, ready to go into the prompt without a vector query.
+    Conversations live in an LRU of at most max_customers entries (idle ones
+    are evicted after idle_seconds) backed by SQLite, so they survive restarts
+    and evictions. Each conversation keeps its latest turns within
+    window_tokens; older turns are folded into a rolling summary of at most
+    summary_tokens, written on a background thread.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_customers: int = 1000, max_turns: int = 12,
+                 window_tokens: int = 600, summary_tokens: int = 150, idle_seconds: float = 1800,
+                 summarize: Optional[Callable[[str, str, int], str]] = None):
+        self.max_customers = max_customers
+        self.max_turns = max(2, max_turns)
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.idle_seconds = idle_seconds
+        self.summarize = summarize
+        self._conversations: OrderedDict[str, Conversation] = OrderedDict()
+        self._lock = threading.RLock()
+        self._summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='memory-summary')
+        self._counters = {'hits': 0, 'loads': 0, 'evictions': 0, 'summaries': 0, 'summary_failures': 0}
+        self.conn = None
+        if db_path:
+            self.conn = connect(db_path)
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    phone TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL DEFAULT '',
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS turns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    phone TEXT NOT NULL,
+                    user_text TEXT NOT NULL,
+                    reply TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_turns_phone ON turns (phone, id);
+            """)
+
+    # -------------------
+    # Cache
+    # -------------------
+    def _get(self, phone: str) -> Conversation:
+        """The phone's conversation, loaded from SQLite on a cache miss (call with the lock held)"""
+        conv = self._conversations.get(phone)
+        if conv is not None:
+            self._conversations.move_to_end(phone)
+            self._counters['hits'] += 1
+            return conv
+        conv = Conversation(phone, last_active=time.time())
+        if self.conn is not None:
+            row = self.conn.execute("SELECT summary FROM conversations WHERE phone = ?", (phone,)).fetchone()
+            if row:
+                conv.summary = row['summary']
+            rows = self.conn.execute(
+                "SELECT id, user_text, reply, created_at FROM turns WHERE phone = ? ORDER BY id DESC LIMIT ?",
+                (phone, self.max_turns)
+            ).fetchall()
+            for r in reversed(rows):
+                conv.turns.append(self._turn(r['user_text'], r['reply'], r['created_at'], r['id']))
+        self._counters['loads'] += 1
+        self._conversations[phone] = conv
+        self._evict()
+        return conv
+
+    @staticmethod
+    def _turn(user_text: str, reply: str, at: float, row_id: Optional[int] = None) -> Turn:
+        turn = Turn(user_text, reply, 0, at, row_id)
+        turn.tokens = count_tokens(turn.render() + '\n')
+        return turn
+
+    def _evict(self):
+        """Drop least recently used conversations beyond max_customers, and idle ones"""
+        cutoff = time.time() - self.idle_seconds
+        while self._conversations:
+            phone, conv = next(iter(self._conversations.items()))
+            if len(self._conversations) <= self.max_customers and conv.last_active >= cutoff:
+                break
+            if conv.compacting:  # its summary is being written; keep it until then
+                self._conversations.move_to_end(phone)
+                if all(c.compacting for c in self._conversations.values()):
+                    break
+                continue
+            del self._conversations[phone]
+            self._counters['evictions'] += 1
+
+    # -------------------
+    # Public API
+    # -------------------
+    def history(self, phone: str, max_tokens: Optional[int] = None) -> str:
+        """Summary and the newest turns that fit in max_tokens (window_tokens by default)"""
+        budget = self.window_tokens if max_tokens is None else max_tokens
+        with self._lock:
+            conv = self._get(phone)
+            summary, turns = conv.summary, list(conv.turns)
+        parts = []
+        if summary:
+            summary = f"Resumo da conversa anterior: {truncate_tokens(summary, self.summary_tokens)}"
+            budget -= count_tokens(summary + '\n')
+        for turn in reversed(turns):
+            if turn.tokens > budget:
+                break
+            parts.append(turn.render())
+            budget -= turn.tokens
+        parts.reverse()
+        if summary:
+            parts.insert(0, summary)
+        return '\n'.join(parts)
+
+    def add_turn(self, phone: str, user_text: str, reply: str):
+        """Record a turn; folds older turns into the summary once the window overflows"""
+        # A single huge message must not crowd out the rest of the window
+        limit = max(1, self.window_tokens // 2)
+        user_text, reply = truncate_tokens(user_text, limit), truncate_tokens(reply, limit)
+        now = time.time()
+        turn = self._turn(user_text, reply, now)
+        with self._lock:
+            if self.conn is not None:
+                turn.id = self.conn.execute(
+                    "INSERT INTO turns (phone, user_text, reply, created_at) VALUES (?, ?, ?, ?)",
+                    (phone, user_text, reply, now)
+                ).lastrowid
+            conv = self._get(phone)
+            conv.turns.append(turn)
+            conv.last_active = now
+            overflow = conv.turn_tokens > self.window_tokens or len(conv.turns) > self.max_turns
+            if overflow and not conv.compacting:
+                conv.compacting = True
+                self._summarizer.submit(self._compact, conv)
+
+    def _compact(self, conv: Conversation):
+        """Fold the oldest turns into the summary until the rest fits in half the window"""
+        try:
+            with self._lock:
+                turns = list(conv.turns)
+                summary = conv.summary
+            keep_tokens, keep = 0, 0
+            for turn in reversed(turns):
+                if keep_tokens + turn.tokens > self.window_tokens // 2 or keep >= self.max_turns // 2:
+                    break
+                keep_tokens += turn.tokens
+                keep += 1
+            folded = turns[:len(turns) - keep]
+            if not folded:
+                return
+            new_summary = None
+            if self.summarize is not None:
+                try:
+                    transcript = '\n'.join(t.render() for t in folded)
+                    new_summary = self.summarize(summary, transcript, self.summary_tokens)
+                    self._counters['summaries'] += 1
+                except Exception as e:
+                    self._counters['summary_failures'] += 1
+                    print(f"⚠️ Conversation summary failed for {conv.phone}, keeping an extract: {e}")
+            if not new_summary:
+                new_summary = extractive_summary(summary, folded, self.summary_tokens)
+            new_summary = truncate_tokens(new_summary.strip(), self.summary_tokens)
+
+            with self._lock:
+                folded_ids = {id(t) for t in folded}
+                conv.turns = deque(t for t in conv.turns if id(t) not in folded_ids)
+                conv.summary = new_summary
+                if self.conn is not None:
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        self.conn.execute(
+                            """INSERT INTO conversations (phone, summary, updated_at) VALUES (?, ?, ?)
+                               ON CONFLICT(phone) DO UPDATE SET summary = excluded.summary,
+                               updated_at = excluded.updated_at""",
+                            (conv.phone, new_summary, time.time())
+                        )
+                        self.conn.executemany("DELETE FROM turns WHERE id = ?",
+                                              [(t.id,) for t in folded if t.id is not None])
+                        self.conn.execute("COMMIT")
+                    except Exception:
+                        self.conn.execute("ROLLBACK")
+                        raise
+        except Exception as e:
+            print(f"❌ Conversation compaction failed for {conv.phone}: {e}")
+        finally:
+            with self._lock:
+                conv.compacting = False
+
+    def forget(self, phone: str):
+        """Drop a customer's history (e.g. on request)"""
+        with self._lock:
+            self._conversations.pop(phone, None)
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM turns WHERE phone = ?", (phone,))
+                self.conn.execute("DELETE FROM conversations WHERE phone = ?", (phone,))
+
+    def close(self):
+        """Wait for pending summaries"""
+        self._summarizer.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, 'customers': len(self._conversations)}
+
+
+_memory: Optional[ConversationMemory] = None
+
+
+def get_conversation_memory() -> Optional[ConversationMemory]:
+    """Get conversation memory singleton, or None when memory is disabled"""
+    global _memory
+    settings = get_settings()
+    if not settings.MEMORY_ENABLED:
+        return None
+    if _memory is None:
+        from app.core.ai.llm import summarize_conversation
+        _memory = ConversationMemory(
+            os.path.join(settings.DATA_FOLDER, 'conversations.db'),
+            max_customers=settings.MEMORY_MAX_CUSTOMERS,
+            max_turns=settings.MEMORY_MAX_TURNS,
+            window_tokens=settings.MEMORY_WINDOW_TOKENS,
+            summary_tokens=settings.MEMORY_SUMMARY_TOKENS,
+            idle_seconds=settings.MEMORY_IDLE_SECONDS,
+            summarize=summarize_conversation,
+        )
+    return _memory
@@ -1,19 +1,39 @@
 """Prompt templates for the AI agent"""
+from functools import lru_cache
 
 SYSTEM_PROMPT = """Você é uma vendedora virtual em Português (Brasil), sotaque de São Paulo.
 Seja simpática, objetiva e persuasiva. Use o contexto do KB quando disponível. 
 Se cliente reclamar do preço, ofereça desconto (40%/50%) conforme regras.
 Sempre que relevante, envie imagens ou vídeos do KB; se não houver mídia relacionada, existe 30% de chance de enviar uma mídia de reforço."""
 
+# Shown in place of the history on a customer's first message
+NO_HISTORY = "(primeira mensagem do cliente)"
 
+SUMMARY_PROMPT = """Resuma a conversa de vendas abaixo em no máximo {max_words} palavras, em Português.
+Mantenha o que importa para continuar o atendimento: nome e interesses do cliente, produtos
+e preços mencionados, objeções, descontos oferecidos e compromissos assumidos.
+
+Resumo anterior:
+{summary}
+
+Novas mensagens:
+{transcript}
+
+Resumo atualizado:"""
+
+
+@lru_cache()
 def get_qa_prompt_template():
-    """Get the QA prompt template with context and question variables"""
+    """QA prompt template with history, context and question variables, compiled once"""
     from langchain.prompts import PromptTemplate
     
     return PromptTemplate(
-        input_variables=["context", "question"],
+        input_variables=["history", "context", "question"],
         template=f"""{SYSTEM_PROMPT}
 
+Conversa até agora:
+{{history}}
+
 Contexto (do KB):
 {{context}}
 
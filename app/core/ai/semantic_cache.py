@@ -0,0 +1,180 @@
+"""Semantic cache of AI answers to frequently asked questions"""
+import time
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from app.config import get_settings
+from app.core.kb.manager import get_embeddings, kb_version, normalize_text
+
+
+@dataclass
+class CacheEntry:
+    question: str
+    answer: str
+    generation_seconds: float  # what the answer cost to generate, saved again on every hit
+    hits: int = 0
+
+
+@dataclass
+class CacheLookup:
+    """Result of a lookup; vector is reused by store() on a miss"""
+    answer: Optional[str]
+    vector: Optional[np.ndarray]
+    similarity: float = 0.0
+    question: Optional[str] = None  # the cached question that matched
+
+
+class SemanticCache:
+    """
+    Answers keyed by question embedding. A question whose cosine similarity
+    to a cached one reaches `threshold` gets that answer without an LLM call.
+    Vectors sit in one preallocated numpy matrix, so a lookup is a single
+    matrix-vector product. Entries expire after ttl_seconds, the least
+    recently used is replaced when full, and everything is dropped when the
+    KB changes (kb_version), since answers are built from KB content.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl_seconds: float = 86400, max_entries: int = 2000,
+                 min_chars: int = 12, embed: Optional[Callable[[str], List[float]]] = None,
+                 version: Callable[[], str] = kb_version):
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.min_chars = min_chars
+        self.embed = embed or (lambda text: get_embeddings().embed_query(text))
+        self.version = version
+        self._matrix: Optional[np.ndarray] = None  # (max_entries, dim), rows L2-normalized
+        self._entries: List[Optional[CacheEntry]] = [None] * max_entries
+        # Per slot; -inf marks an empty slot, so it is never live and always reused first
+        self._created = np.full(max_entries, -np.inf)
+        self._last_used = np.full(max_entries, -np.inf)
+        self._used = 0  # slots fill from the front; lookups only scan [:_used]
+        self._kb_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.invalidations = 0
+        self.lookup_seconds = 0.0
+        self.seconds_saved = 0.0
+
+    def _vector(self, question: str) -> np.ndarray:
+        vec = np.asarray(self.embed(normalize_text(question)), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _check_version(self):
+        """Drop every entry if the KB changed since they were stored (call with the lock held)"""
+        current = self.version()
+        if current != self._kb_version:
+            if np.isfinite(self._created).any():
+                self.invalidations += 1
+            self._clear()
+            self._kb_version = current
+
+    def _clear(self):
+        self._entries = [None] * self.max_entries
+        self._created[:] = -np.inf
+        self._last_used[:] = -np.inf
+        self._used = 0
+
+    def cacheable(self, question: str) -> bool:
+        """Very short messages ("sim", "ok") only make sense in context, so they are never cached"""
+        return len(normalize_text(question)) >= self.min_chars
+
+    def lookup(self, question: str) -> CacheLookup:
+        """The cached answer closest to question, if it is similar enough"""
+        if not self.cacheable(question):
+            self.skipped += 1
+            return CacheLookup(None, None)
+        start = time.perf_counter()
+        try:
+            vec = self._vector(question)
+        except Exception as e:
+            print(f"⚠️ Semantic cache lookup skipped: {e}")
+            self.skipped += 1
+            return CacheLookup(None, None)
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            best, similarity = None, 0.0
+            if self._used and self._matrix.shape[1] == len(vec):
+                sims = self._matrix[:self._used] @ vec
+                sims[now - self._created[:self._used] >= self.ttl] = -np.inf  # empty and expired slots
+                best = int(np.argmax(sims))
+                similarity = float(sims[best])
+            if best is not None and similarity >= self.threshold:
+                entry = self._entries[best]
+                entry.hits += 1
+                self._last_used[best] = now
+                self.hits += 1
+                self.seconds_saved += entry.generation_seconds
+                self.lookup_seconds += time.perf_counter() - start
+                return CacheLookup(entry.answer, vec, similarity, entry.question)
+            self.misses += 1
+            self.lookup_seconds += time.perf_counter() - start
+        return CacheLookup(None, vec, similarity)
+
+    def store(self, question: str, answer: str, generation_seconds: float = 0.0,
+              vector: Optional[np.ndarray] = None):
+        """Cache answer for question (vector from the lookup that missed, if any)"""
+        if not answer or not self.cacheable(question):
+            return
+        try:
+            vec = vector if vector is not None else self._vector(question)
+        except Exception as e:
+            print(f"⚠️ Answer not cached: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            if self._matrix is None or self._matrix.shape[1] != len(vec):
+                self._matrix = np.zeros((self.max_entries, len(vec)), dtype=np.float32)
+                self._clear()
+            # An empty or expired slot, else the least recently used one
+            expired = np.flatnonzero(now - self._created >= self.ttl)
+            slot = int(expired[0]) if len(expired) else int(np.argmin(self._last_used))
+            self._matrix[slot] = vec
+            self._entries[slot] = CacheEntry(question, answer, generation_seconds)
+            self._created[slot] = self._last_used[slot] = now
+            self._used = max(self._used, slot + 1)
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        """Hit rate, lookup cost and LLM time saved"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'skipped': self.skipped,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'entries': int(np.isfinite(self._created).sum()),
+            'invalidations': self.invalidations,
+            'avg_lookup_ms': round(self.lookup_seconds / total * 1000, 2) if total else 0.0,
+            'seconds_saved': round(self.seconds_saved, 1),
+        }
+
+
+_semantic_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Get semantic cache singleton, or None when the cache is disabled"""
+    global _semantic_cache
+    settings = get_settings()
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache(
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            min_chars=settings.SEMANTIC_CACHE_MIN_CHARS,
+        )
+    return _semantic_cache
@@ -0,0 +1,166 @@
+"""Background archiving of chat turns into the knowledge base"""
+import time
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+from app.config import get_settings
+from app.core.kb.manager import add_chats_to_kb, chat_record
+from app.utils.lazy import lazy
+
+
+class ChatArchiver:
+    """
+    Buffers chat turns and archives them off the response path.
+    A background thread embeds and upserts the buffer in one batch when it
+    reaches batch_size turns or its oldest turn is flush_seconds old. A failed
+    batch goes back to the front of the buffer and is retried on the next
+    flush; beyond max_pending turns the oldest ones are dropped.
+    """
+
+    def __init__(self, batch_size: int = 32, flush_seconds: float = 5.0, max_pending: int = 1000,
+                 archive: Callable[[list], None] = add_chats_to_kb, retry_seconds: float = 5.0):
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.max_pending = max(self.batch_size, max_pending)
+        self.archive = archive
+        self.retry_seconds = retry_seconds
+        self._pending = deque()  # (queued_at, record)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+        self._flush_requested = False
+        self._busy = False
+        self._retry_at = 0.0
+        self._counters = {'queued': 0, 'archived': 0, 'batches': 0, 'failed_batches': 0, 'dropped': 0}
+
+    def add(self, user_msg: str, ai_reply: str, phone: str = None) -> bool:
+        """Queue a chat turn; returns immediately. False once the archiver is closed."""
+        record = chat_record(user_msg, ai_reply, phone)
+        with self._cond:
+            if self._closing:
+                return False
+            self._pending.append((time.monotonic(), record))
+            self._counters['queued'] += 1
+            while len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                self._counters['dropped'] += 1
+            self._ensure_thread()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='chat-archiver', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self) -> Optional[list]:
+        """Wait until a batch is due and take it; None when closed and drained"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._pending and now >= self._retry_at:
+                    if (self._closing or self._flush_requested or len(self._pending) >= self.batch_size
+                            or now - self._pending[0][0] >= self.flush_seconds):
+                        break
+                elif not self._pending:
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    if self._closing:
+                        return None
+                if self._closing and now < self._retry_at:
+                    # Shutting down: one last attempt now rather than after the backoff
+                    self._retry_at = 0.0
+                    continue
+                if self._pending:
+                    due = max(self._pending[0][0] + self.flush_seconds, self._retry_at)
+                    self._cond.wait(max(0.0, due - now))
+                else:
+                    self._cond.wait()
+            size = min(self.batch_size, len(self._pending))
+            batch = [self._pending.popleft() for _ in range(size)]
+            self._busy = True
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self.archive([record for _, record in batch])
+                failed = False
+            except Exception as e:
+                failed = True
+                print(f"⚠️ Chat archive batch of {len(batch)} failed: {e}")
+            with self._cond:
+                self._busy = False
+                self._counters['batches'] += 1
+                if not failed:
+                    self._counters['archived'] += len(batch)
+                    self._retry_at = 0.0
+                elif self._closing:
+                    self._counters['failed_batches'] += 1
+                    self._counters['dropped'] += len(batch)
+                    print(f"❌ Dropped {len(batch)} chat turns that could not be archived at shutdown")
+                else:
+                    self._counters['failed_batches'] += 1
+                    self._pending.extendleft(reversed(batch))
+                    while len(self._pending) > self.max_pending:
+                        self._pending.popleft()
+                        self._counters['dropped'] += 1
+                    self._retry_at = time.monotonic() + self.retry_seconds
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Archive everything queued so far; True if the buffer drained within timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._pending and not self._busy:
+                return True
+            self._ensure_thread()
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout: float = 30.0):
+        """Stop accepting turns, archive what is buffered and stop the thread"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                print(f"⚠️ Chat archiver still busy after {timeout:.0f}s; {len(self._pending)} turns not archived")
+                return
+        if self._pending:
+            # Never started (or died): archive the remainder on this thread
+            try:
+                self.archive([record for _, record in self._pending])
+                self._counters['archived'] += len(self._pending)
+            except Exception as e:
+                self._counters['dropped'] += len(self._pending)
+                print(f"❌ Dropped {len(self._pending)} chat turns at shutdown: {e}")
+            self._pending.clear()
+        print(f"✅ Chat archiver closed ({self._counters['archived']} turns archived)")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self._counters, 'pending': len(self._pending)}
+
+
+@lazy
+def get_chat_archiver() -> ChatArchiver:
+    settings = get_settings()
+    return ChatArchiver(
+        batch_size=settings.CHAT_ARCHIVE_BATCH_SIZE,
+        flush_seconds=settings.CHAT_ARCHIVE_FLUSH_SECONDS,
+        max_pending=settings.CHAT_ARCHIVE_MAX_PENDING,
+    )
@@ -0,0 +1,79 @@
+"""Local side-store of chunk text, keyed by vector id"""
+import os
+import time
+import zlib
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from app.config import get_settings
+from app.utils.db import connect
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class ChunkStore:
+    """
+    zlib-compressed chunk text in SQLite. Vectors only carry small metadata;
+    query() hydrates page_content from here in one round-trip per batch.
+    """
+
+    def __init__(self, db_path: str):
+        self.conn = connect(db_path)
+        self._lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                text BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+
+    def put_many(self, items: Iterable[Tuple[str, str]]):
+        """Store (vector id, text) pairs, replacing existing text"""
+        now = time.time()
+        rows = [(vid, zlib.compress(text.encode('utf-8')), now) for vid, text in items]
+        if not rows:
+            return
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany("INSERT OR REPLACE INTO chunks (id, text, created_at) VALUES (?, ?, ?)", rows)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def get_many(self, ids: List[str]) -> Dict[str, str]:
+        """Text for the ids that have any"""
+        found = {}
+        unique = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(unique), _SQL_BATCH):
+                batch = unique[i:i + _SQL_BATCH]
+                rows = self.conn.execute(
+                    f"SELECT id, text FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for row in rows:
+                    found[row['id']] = zlib.decompress(row['text']).decode('utf-8')
+        return found
+
+    def delete_many(self, ids: Iterable[str]):
+        """Forget the text of deleted vectors"""
+        ids = list(ids)
+        with self._lock:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                self.conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+
+
+# Singleton instance
+_chunk_store = None
+
+
+def get_chunk_store() -> ChunkStore:
+    """Get chunk store singleton"""
+    global _chunk_store
+    if _chunk_store is None:
+        _chunk_store = ChunkStore(os.path.join(get_settings().DATA_FOLDER, 'chunks.db'))
+    return _chunk_store
@@ -0,0 +1,230 @@
+"""Token-aware chunking that keeps sentences and sections together"""
+import re
+import hashlib
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+from app.config import get_settings
+from app.utils.text import count_tokens
+
+# Sentence ends: . ! ? … followed by space and an uppercase letter, digit or quote
+_SENTENCE_END = re.compile(r'(?<=[.!?…])["”\')]*\s+(?=["“(\[]?[A-ZÀ-ÖØ-Ý0-9])')
+_BULLET = re.compile(r'^([-•*▪–]|\d{1,2}[.)])\s+')
+_MD_HEADING = re.compile(r'^#{1,6}\s+\S')
+_NUMBERED_HEADING = re.compile(r'^(\d+(\.\d+)*\.?|[IVXLC]+\.)\s+[A-ZÀ-ÖØ-Ý]')
+# Paragraphs at least this long are dropped when repeated word for word
+BOILERPLATE_MIN_TOKENS = 32
+
+
+def is_heading(line: str) -> bool:
+    """Markdown headings, and short numbered or upper-case title lines"""
+    if _MD_HEADING.match(line):
+        return True
+    if not line or len(line) > 80 or line[-1] in '.!?;,':
+        return False
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 3 and all(c.isupper() for c in letters):
+        return True
+    return bool(_NUMBERED_HEADING.match(line)) and len(line.split()) <= 10
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+@dataclass
+class _Unit:
+    """A sentence, list item or heading, the smallest piece a chunk is built from"""
+    text: str
+    tokens: int
+    heading: bool = False
+    new_block: bool = False  # starts a paragraph, list item or heading
+
+
+def _units(text: str, max_tokens: int) -> List[_Unit]:
+    """Split text into units, re-joining lines wrapped by PDF extraction"""
+    units: List[_Unit] = []
+    paragraph: List[str] = []
+
+    def flush_paragraph():
+        if not paragraph:
+            return
+        joined = ''
+        for line in paragraph:
+            if joined.endswith('-') and line[:1].islower():
+                joined = joined[:-1] + line  # hyphenated line wrap
+            else:
+                joined = f"{joined} {line}" if joined else line
+        first = True
+        for sentence in split_sentences(joined):
+            for piece in _split_long(sentence, max_tokens):
+                units.append(_Unit(piece, count_tokens(piece), new_block=first))
+                first = False
+        paragraph.clear()
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            flush_paragraph()
+        elif is_heading(line):
+            flush_paragraph()
+            heading = line.lstrip('#').strip()
+            units.append(_Unit(heading, count_tokens(heading), heading=True, new_block=True))
+        elif _BULLET.match(line):
+            flush_paragraph()
+            paragraph.append(line)
+            flush_paragraph()
+        else:
+            paragraph.append(line)
+    flush_paragraph()
+    return units
+
+
+def _split_long(sentence: str, max_tokens: int) -> List[str]:
+    """Cut a sentence longer than max_tokens at word boundaries"""
+    if count_tokens(sentence) <= max_tokens:
+        return [sentence]
+    pieces, words, tokens = [], [], 0
+    for word in sentence.split():
+        n = count_tokens(' ' + word)
+        if words and tokens + n > max_tokens:
+            pieces.append(' '.join(words))
+            words, tokens = [], 0
+        words.append(word)
+        tokens += n
+    if words:
+        pieces.append(' '.join(words))
+    return pieces
+
+
+def _join(units: List[_Unit]) -> str:
+    out, after_heading = '', False
+    for unit in units:
+        if not out:
+            out = unit.text
+        else:
+            out += ('\n' if unit.new_block or after_heading else ' ') + unit.text
+        after_heading = unit.heading
+    return out
+
+
+# -------------------
+# Duplicate detection
+# -------------------
+class DuplicateFilter:
+    """
+    Remembers kept texts by a digest of their whitespace-normalized form.
+    Only exact repeats are rejected: texts that differ in a single word or
+    number (a price, a date) are both kept.
+    """
+
+    def __init__(self):
+        self._digests = set()
+
+    def seen(self, text: str) -> bool:
+        """Whether text repeats an earlier one; if not, remember it"""
+        key = hashlib.blake2b(' '.join(text.split()).encode('utf-8'), digest_size=16).digest()
+        if key in self._digests:
+            return True
+        self._digests.add(key)
+        return False
+
+
+def _skip_repeated_blocks(units: Iterable[_Unit], seen: DuplicateFilter) -> Iterator[_Unit]:
+    """
+    Drop paragraphs of at least BOILERPLATE_MIN_TOKENS that already appeared
+    word for word (terms and conditions after every product, disclaimers).
+    Shorter ones can be facts that legitimately repeat under different
+    headings, so they are kept.
+    """
+    block: List[_Unit] = []
+
+    def flush():
+        tokens = sum(u.tokens for u in block)
+        if block[0].heading or tokens < BOILERPLATE_MIN_TOKENS or not seen.seen(_join(block)):
+            yield from block
+
+    for unit in units:
+        if unit.new_block and block:
+            yield from flush()
+            block = []
+        block.append(unit)
+    if block:
+        yield from flush()
+
+
+# -------------------
+# Chunking
+# -------------------
+def _pack(units: Iterable[_Unit], max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    """Pack units into chunks as they arrive"""
+    # A heading starts a new chunk once the current one is half full, so short
+    # sections share a chunk instead of each costing an embedding
+    min_tokens = max_tokens // 2
+    current: List[_Unit] = []
+    tokens = 0
+    heading: Optional[_Unit] = None
+
+    for unit in units:
+        if unit.heading:
+            if tokens >= min_tokens:
+                if any(not u.heading for u in current):
+                    yield _join(current)
+                current, tokens = [], 0
+            heading = unit
+            current.append(unit)
+            tokens += unit.tokens
+            continue
+
+        if current and tokens + unit.tokens > max_tokens:
+            if any(not u.heading for u in current):
+                yield _join(current)
+            # Carry the last sentences over, under the section heading
+            tail, tail_tokens = [], 0
+            for prev in reversed(current):
+                if prev.heading or tail_tokens + prev.tokens > overlap_tokens:
+                    break
+                tail.insert(0, prev)
+                tail_tokens += prev.tokens
+            current = ([heading] if heading else []) + tail
+            tokens = sum(u.tokens for u in current)
+            while current and tokens + unit.tokens > max_tokens:
+                tokens -= current.pop(0).tokens
+        current.append(unit)
+        tokens += unit.tokens
+    if any(not u.heading for u in current):
+        yield _join(current)
+
+
+def iter_chunks(texts: Iterable[str], max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None,
+                dedup: Optional[bool] = None) -> Iterator[str]:
+    """
+    Chunk a stream of texts (e.g. PDF pages, each ending a paragraph) into
+    chunks of at most max_tokens tokens that end on sentence boundaries.
+    Only the chunk being built is held in memory.
+
+    A heading starts a new chunk (unless the current one is still small) and
+    is repeated at the top of its section's continuation chunks, which also
+    carry up to overlap_tokens of the previous chunk's last sentences.
+    With dedup (CHUNK_DEDUP by default), long paragraphs repeated word for
+    word (boilerplate) and chunks identical to an earlier one are dropped.
+    """
+    settings = get_settings()
+    max_tokens = max_tokens or settings.CHUNK_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    dedup = settings.CHUNK_DEDUP if dedup is None else dedup
+
+    units = (unit for text in texts for unit in _units(text, max_tokens))
+    if not dedup:
+        yield from _pack(units, max_tokens, overlap_tokens)
+        return
+    chunks, blocks = DuplicateFilter(), DuplicateFilter()
+    for chunk in _pack(_skip_repeated_blocks(units, blocks), max_tokens, overlap_tokens):
+        if not chunks.seen(chunk):
+            yield chunk
+
+
+def chunk_text(text: str, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None,
+               dedup: Optional[bool] = None) -> List[str]:
+    """All chunks of text, see iter_chunks"""
+    return list(iter_chunks([text], max_tokens, overlap_tokens, dedup))
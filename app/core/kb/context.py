@@ -0,0 +1,36 @@
+"""Per-turn retrieval shared by media selection and answer generation"""
+import asyncio
+import threading
+from typing import Optional
+
+
+class RetrievalContext:
+    """
+    Knowledge-base documents for one customer turn. Retrieval runs once, on
+    first use or when prefetched, and every consumer gets the same documents.
+    """
+
+    def __init__(self, question: str, retriever):
+        self.question = question
+        self.retriever = retriever
+        self._docs: Optional[list] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Future] = None
+
+    @property
+    def docs(self) -> list:
+        """Retrieved documents, fetched on first access"""
+        with self._lock:
+            if self._docs is None:
+                self._docs = self.retriever.get_relevant_documents(self.question)
+            return self._docs
+
+    def prefetch(self) -> asyncio.Future:
+        """Start retrieval in a worker thread so it overlaps with other async work"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(asyncio.to_thread(lambda: self.docs))
+        return self._task
+
+    async def adocs(self) -> list:
+        """Retrieved documents, awaiting the prefetch (or starting it)"""
+        return await self.prefetch()
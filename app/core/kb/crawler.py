@@ -0,0 +1,158 @@
+"""Concurrent web crawler for the knowledge base"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+from urllib.parse import urldefrag, urljoin, urlparse
+
+from app.services.http_client import arequest, build_async_client
+
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:  # fall back to BeautifulSoup's pure-Python parser
+    LXML_AVAILABLE = False
+
+# Elements whose text goes into the KB; headings are marked for the chunker
+TEXT_TAGS = ('h1', 'h2', 'h3', 'h4', 'p', 'li', 'td', 'th')
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4')
+SKIP_TAGS = ('script', 'style', 'noscript', 'template', 'svg')
+
+
+@dataclass
+class Page:
+    """Outcome of fetching one URL"""
+    url: str
+    depth: int
+    status: str  # 'changed', 'unchanged' (304), 'gone' (404/410) or 'error'
+    blocks: List[str] = field(default_factory=list)
+    links: List[str] = field(default_factory=list)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    error: Optional[str] = None
+
+
+def normalize_url(url: str) -> str:
+    return urldefrag(url.strip())[0]
+
+
+def parse_html(html: str, base_url: str):
+    """(text blocks, absolute links) of a page"""
+    if not html.strip():
+        return [], []
+    if LXML_AVAILABLE:
+        try:
+            doc = lxml.html.fromstring(html)
+        except ValueError:  # str input with an XML encoding declaration
+            doc = lxml.html.fromstring(html.encode('utf-8'))
+        for el in list(doc.iter(*SKIP_TAGS)):
+            el.drop_tree()
+        blocks = []
+        for el in doc.iter(*TEXT_TAGS):
+            # Nested matches (a <p> inside an <li>) are read once, from the outer element
+            if any(parent.tag in TEXT_TAGS for parent in el.iterancestors()):
+                continue
+            text = ' '.join(el.text_content().split())
+            if text:
+                blocks.append(f"# {text}" if el.tag in HEADING_TAGS else text)
+        hrefs = doc.xpath('//a/@href')
+    else:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'html.parser')
+        for el in soup(list(SKIP_TAGS)):
+            el.decompose()
+        blocks = []
+        for el in soup.find_all(list(TEXT_TAGS)):
+            if el.find_parent(list(TEXT_TAGS)):
+                continue
+            text = el.get_text(separator=' ', strip=True)
+            if text:
+                blocks.append(f"# {text}" if el.name in HEADING_TAGS else text)
+        hrefs = [a.get('href') for a in soup.find_all('a', href=True)]
+
+    links = []
+    for href in hrefs:
+        link = normalize_url(urljoin(base_url, href))
+        if urlparse(link).scheme in ('http', 'https'):
+            links.append(link)
+    return blocks, list(dict.fromkeys(links))
+
+
+class Crawler:
+    """
+    Fetches pages over one pooled client with at most `concurrency` requests
+    in flight. Pages seen before are requested with If-None-Match /
+    If-Modified-Since, so an unchanged page costs a 304 and no parsing.
+    With max_depth > 0, links to a seed's domain are followed up to max_depth
+    hops away; the links of an unchanged page, or of one that failed this
+    time, come from `previous`. `truncated` tells whether max_pages cut the
+    last crawl short.
+
+    previous(url) returns what the last crawl recorded for a URL: a dict with
+    'etag', 'last_modified' and 'links', or None.
+    """
+
+    def __init__(self, previous: Callable[[str], Optional[dict]] = lambda url: None,
+                 concurrency: int = 8, max_depth: int = 0, max_pages: int = 500,
+                 same_domain: bool = True, timeout: float = 15.0):
+        self.previous = previous
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.same_domain = same_domain
+        self.timeout = timeout
+        self.truncated = False
+
+    async def _fetch(self, client, sem: asyncio.Semaphore, url: str, depth: int) -> Page:
+        prev = self.previous(url) or {}
+        headers = {}
+        if prev.get('etag'):
+            headers['If-None-Match'] = prev['etag']
+        if prev.get('last_modified'):
+            headers['If-Modified-Since'] = prev['last_modified']
+        # A failed fetch says nothing about the page's links: follow the last known ones,
+        # so one timeout does not hide the pages below it
+        links = prev.get('links') or []
+        async with sem:
+            try:
+                r = await arequest(client, 'GET', url, headers=headers, follow_redirects=True)
+            except Exception as e:
+                return Page(url, depth, 'error', links=links, error=repr(e))
+        if r.status_code == 304:
+            return Page(url, depth, 'unchanged', links=links,
+                        etag=prev.get('etag'), last_modified=prev.get('last_modified'))
+        if r.status_code in (404, 410):
+            return Page(url, depth, 'gone')
+        if r.status_code != 200:
+            return Page(url, depth, 'error', links=links, error=f"HTTP {r.status_code}")
+        content_type = r.headers.get('content-type', '')
+        if 'html' not in content_type and content_type:
+            return Page(url, depth, 'error', links=links, error=f"not HTML ({content_type})")
+        blocks, links = parse_html(r.text, str(r.url))
+        return Page(url, depth, 'changed', blocks, links,
+                    r.headers.get('etag'), r.headers.get('last-modified'))
+
+    async def crawl(self, seeds: Iterable[str]) -> AsyncIterator[Page]:
+        """Pages in the order they finish; each URL is fetched once"""
+        seeds = [normalize_url(u) for u in seeds]
+        domains = {urlparse(u).netloc for u in seeds}
+        seen = set(seeds)
+        self.truncated = False
+        sem = asyncio.Semaphore(self.concurrency)
+        async with build_async_client(pool_size=self.concurrency, timeout=self.timeout) as client:
+            pending = {asyncio.ensure_future(self._fetch(client, sem, u, 0)) for u in seeds}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    page = task.result()
+                    if page.depth < self.max_depth:
+                        for link in page.links:
+                            if link in seen:
+                                continue
+                            if self.same_domain and urlparse(link).netloc not in domains:
+                                continue
+                            if len(seen) >= self.max_pages:
+                                self.truncated = True
+                                continue
+                            seen.add(link)
+                            pending.add(asyncio.ensure_future(self._fetch(client, sem, link, page.depth + 1)))
+                    yield page
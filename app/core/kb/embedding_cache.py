@@ -0,0 +1,182 @@
+"""Persistent embedding cache in front of the embeddings API"""
+import os
+import time
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+try:
+    from langchain_core.embeddings import Embeddings
+except Exception:
+    from langchain.embeddings.base import Embeddings
+
+from app.config import get_settings
+from app.utils.db import connect
+from app.utils.text import normalize_text
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Cache key for the embedding of text by model"""
+    digest = hashlib.sha256(normalize_text(text).encode()).hexdigest()
+    return f"{model}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    Embeddings stored as float32 blobs in SQLite, with an in-process LRU of
+    the most recently used vectors on top. Vectors never change for a given
+    (model, text), so entries do not expire.
+    """
+
+    def __init__(self, db_path: str, memory_entries: int = 2048):
+        self.memory_entries = memory_entries
+        self._memory: OrderedDict[str, array] = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.api_calls_saved = 0
+        self.conn = connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Cached vectors for keys, None where there is no entry"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vec
+                    self.memory_hits += 1
+
+            missing = list({k for k in keys if k not in found})
+            for i in range(0, len(missing), _SQL_BATCH):
+                batch = missing[i:i + _SQL_BATCH]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for row in rows:
+                    vec = array('f')
+                    vec.frombytes(row['vector'])
+                    found[row['key']] = vec
+                    self._remember(row['key'], vec)
+                    self.disk_hits += 1
+
+            self.misses += sum(1 for k in keys if k not in found)
+        return [found[k].tolist() if k in found else None for k in keys]
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        """Store freshly computed vectors"""
+        now = time.time()
+        packed = [array('f', v) for v in vectors]
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dim, vector, created_at) VALUES (?, ?, ?, ?)",
+                    [(k, len(v), v.tobytes(), now) for k, v in zip(keys, packed)]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            for key, vec in zip(keys, packed):
+                self._remember(key, vec)
+
+    def _remember(self, key: str, vec: array):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Hit rates and embedding API calls made and avoided"""
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round(hits / total, 3) if total else 0.0,
+            'api_calls': self.api_calls,
+            'api_calls_saved': self.api_calls_saved,
+            'memory_entries': len(self._memory),
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings that only send texts missing from the cache to the wrapped model"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, 'model', None) or type(embeddings).__name__
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model, t) for t in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Each distinct missing text is sent once, in a single call
+        todo = {}
+        for key, text, vec in zip(keys, texts, vectors):
+            if vec is None and key not in todo:
+                todo[key] = text
+        if not todo:
+            self.cache.api_calls_saved += 1
+            return vectors
+
+        fresh = self.embeddings.embed_documents(list(todo.values()))
+        self.cache.api_calls += 1
+        self.cache.put_many(list(todo), fresh)
+        by_key = dict(zip(todo, fresh))
+        return [vec if vec is not None else by_key[key] for key, vec in zip(keys, vectors)]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model, text)
+        vec = self.cache.get_many([key])[0]
+        if vec is not None:
+            self.cache.api_calls_saved += 1
+            return vec
+
+        vec = self.embeddings.embed_query(text)
+        self.cache.api_calls += 1
+        self.cache.put_many([key], [vec])
+        return vec
+
+
+# Singleton instance
+_embedding_cache = None
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Get embedding cache singleton, or None when the cache is disabled"""
+    global _embedding_cache
+    settings = get_settings()
+    if not settings.EMBED_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(
+            os.path.join(settings.DATA_FOLDER, 'embeddings.db'),
+            memory_entries=settings.EMBED_CACHE_MEMORY_ENTRIES
+        )
+    return _embedding_cache
+
+
+def cached_embeddings(embeddings: Embeddings) -> Embeddings:
+    """Wrap embeddings with the shared cache when it is enabled"""
+    cache = get_embedding_cache()
+    return CachedEmbeddings(embeddings, cache) if cache else embeddings
@@ -0,0 +1,172 @@
+"""
+Text extraction for KB documents
+
+Extractors are registered by file extension and MIME type. Each one streams
+a document's text as blocks (pages, paragraphs, table rows), each ending a
+paragraph, into the shared chunk -> embed -> upsert pipeline.
+"""
+import os
+import shutil
+import mimetypes
+import subprocess
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class UnsupportedDocument(ValueError):
+    """No extractor can read this file"""
+
+
+@dataclass
+class Extractor:
+    """Streams the text of one document format"""
+    name: str
+    # (path, start, stop) -> text blocks of parts [start, stop); the whole file when unsliced
+    iter_text: Callable[..., Iterator[str]]
+    # Number of parts (PDF pages), so large files can be parsed in slices; None = one part
+    part_count: Optional[Callable[[str], int]] = None
+
+
+_by_extension: Dict[str, Extractor] = {}
+_by_mime: Dict[str, Extractor] = {}
+
+
+def register_extractor(extractor: Extractor, extensions: List[str], mime_types: List[str] = ()):
+    """Use extractor for files with these extensions ('.pdf') or MIME types"""
+    for ext in extensions:
+        _by_extension[ext.lower()] = extractor
+    for mime in mime_types:
+        _by_mime[mime.lower()] = extractor
+
+
+def get_extractor(path: str, mime_type: Optional[str] = None) -> Optional[Extractor]:
+    """Extractor for a MIME type if given, else for the file's extension"""
+    if mime_type and mime_type.split(';')[0].strip().lower() in _by_mime:
+        return _by_mime[mime_type.split(';')[0].strip().lower()]
+    ext = os.path.splitext(path)[1].lower()
+    if ext in _by_extension:
+        return _by_extension[ext]
+    guessed, _ = mimetypes.guess_type(path)
+    return _by_mime.get(guessed or '')
+
+
+def supported_extensions() -> List[str]:
+    return sorted(_by_extension)
+
+
+def iter_document_text(path: str, start: int = 0, stop: Optional[int] = None,
+                       mime_type: Optional[str] = None) -> Iterator[str]:
+    """Text blocks of any supported document"""
+    extractor = get_extractor(path, mime_type)
+    if extractor is None:
+        raise UnsupportedDocument(f"No extractor for {os.path.basename(path)}")
+    return extractor.iter_text(path, start, stop)
+
+
+# -------------------
+# PDF
+# -------------------
+def pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def iter_pdf_pages(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """
+    Text of pages [start, stop) of a PDF, one page at a time. Each page's
+    text is extracted once, and pypdf only parses a page when it is reached.
+    """
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+    for i in range(start, stop):
+        text = reader.pages[i].extract_text()
+        if text and text.strip():
+            yield text
+
+
+# -------------------
+# Plain text
+# -------------------
+def iter_text_file(path: str, start: int = 0, stop: Optional[int] = None,
+                   block_chars: int = 64 * 1024) -> Iterator[str]:
+    """Paragraphs of a text file, read in blocks; UTF-8, falling back to Windows-1252"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            f.read(block_chars)
+        encoding = 'utf-8'
+    except UnicodeDecodeError:
+        encoding = 'cp1252'
+    with open(path, encoding=encoding, errors='replace') as f:
+        block: List[str] = []
+        size = 0
+        for line in f:
+            block.append(line)
+            size += len(line)
+            # Cut only at a blank line so paragraphs stay whole
+            if size >= block_chars and not line.strip():
+                yield ''.join(block)
+                block, size = [], 0
+        if block:
+            yield ''.join(block)
+
+
+# -------------------
+# Word
+# -------------------
+def _docx_table_rows(table) -> Iterator[str]:
+    """Rows as 'header: value' pairs when the first row looks like a header, else 'a | b'"""
+    rows = [[cell.text.strip() for cell in row.cells] for row in table.rows]
+    if not rows:
+        return
+    header = rows[0]
+    labelled = len(rows) > 1 and all(header) and len(set(header)) == len(header)
+    for cells in rows[1:] if labelled else rows:
+        if labelled:
+            text = '; '.join(f"{h}: {c}" for h, c in zip(header, cells) if c)
+        else:
+            # Merged cells repeat their text in every column they span
+            text = ' | '.join(dict.fromkeys(c for c in cells if c))
+        if text:
+            yield text
+
+
+def iter_docx(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """Paragraphs and table rows of a .docx in document order; headings become '# ' lines"""
+    from docx import Document
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    doc = Document(path)
+    # Paragraph.style resolves the style through the whole styles part on every call
+    style_names = {style.style_id: style.name or '' for style in doc.styles}
+    for element in doc.element.body.iterchildren():
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag == 'p':
+            text = Paragraph(element, doc).text.strip()
+            if not text:
+                continue
+            if style_names.get(element.style, '').startswith(('Heading', 'Title', 'Título')):
+                text = f"# {text}"
+            yield text
+        elif tag == 'tbl':
+            yield from _docx_table_rows(Table(element, doc))
+
+
+def iter_doc(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """Legacy .doc files, through antiword or catdoc when one is installed"""
+    for tool in ('antiword', 'catdoc'):
+        if shutil.which(tool):
+            out = subprocess.run([tool, path], capture_output=True, check=True, timeout=120).stdout
+            yield out.decode('utf-8', errors='replace')
+            return
+    raise UnsupportedDocument(f"{os.path.basename(path)}: .doc needs antiword or catdoc; save it as .docx")
+
+
+register_extractor(Extractor('pdf', iter_pdf_pages, pdf_page_count), ['.pdf'], ['application/pdf'])
+register_extractor(Extractor('text', iter_text_file), ['.txt', '.md'], ['text/plain', 'text/markdown'])
+register_extractor(
+    Extractor('docx', iter_docx), ['.docx'],
+    ['application/vnd.openxmlformats-officedocument.wordprocessingml.document']
+)
+register_extractor(Extractor('doc', iter_doc), ['.doc'], ['application/msword'])
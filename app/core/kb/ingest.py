@@ -0,0 +1,489 @@
+"""Incremental, parallel knowledge-base ingestion"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from app.config import get_settings
+from app.core.kb import manager
+from app.core.kb.chunker import iter_chunks
+from app.core.kb.crawler import Crawler, Page
+from app.core.kb.extract import UnsupportedDocument, get_extractor, iter_document_text
+from app.services.http_client import backoff_delay
+from app.utils.db import connect
+from app.utils.files import file_sha256
+
+
+# -------------------
+# Extraction (top-level functions, so they can run in worker processes)
+# -------------------
+def extract_document_chunks(path: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """Chunks of the text of parts (PDF pages) [start, stop) of a document"""
+    return list(iter_chunks(iter_document_text(path, start, stop)))
+
+
+def text_sha256(chunks: Iterable[str]) -> str:
+    h = hashlib.sha256()
+    for chunk in chunks:
+        h.update(chunk.encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+# -------------------
+# Manifest
+# -------------------
+class IngestManifest:
+    """
+    What was ingested from each source (file path, URL or media file): its
+    content hash, file stat and vector ids, plus kind-specific extras such as
+    a page's HTTP validators and links. Lets re-runs skip unchanged sources
+    and delete the vectors of changed or removed ones.
+    """
+
+    def __init__(self, db_path: str):
+        self.conn = connect(db_path)
+        self._lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                mtime REAL,
+                size INTEGER,
+                chunk_ids TEXT NOT NULL,
+                ingested_at REAL NOT NULL,
+                extra TEXT
+            )
+        """)
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(sources)")}
+        if 'extra' not in columns:
+            self.conn.execute("ALTER TABLE sources ADD COLUMN extra TEXT")
+
+    def get(self, source: str) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM sources WHERE source = ?", (source,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['chunk_ids'] = json.loads(entry['chunk_ids'])
+        entry['extra'] = json.loads(entry['extra']) if entry.get('extra') else {}
+        return entry
+
+    def sources(self, kind: str) -> List[str]:
+        with self._lock:
+            rows = self.conn.execute("SELECT source FROM sources WHERE kind = ?", (kind,)).fetchall()
+        return [row['source'] for row in rows]
+
+    def put(self, source: str, kind: str, sha256: str, chunk_ids: List[str],
+            mtime: Optional[float] = None, size: Optional[int] = None, extra: Optional[dict] = None):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources (source, kind, sha256, mtime, size, chunk_ids, ingested_at, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, kind, sha256, mtime, size, json.dumps(chunk_ids), time.time(),
+                 json.dumps(extra) if extra else None)
+            )
+
+    def set_extra(self, source: str, extra: dict):
+        """Replace the extras of a source whose content did not change"""
+        with self._lock:
+            self.conn.execute("UPDATE sources SET extra = ? WHERE source = ?", (json.dumps(extra), source))
+
+    def touch(self, source: str, mtime: float, size: int):
+        """Record a new stat for a source whose content did not change"""
+        with self._lock:
+            self.conn.execute("UPDATE sources SET mtime = ?, size = ? WHERE source = ?", (mtime, size, source))
+
+    def remove(self, source: str):
+        with self._lock:
+            self.conn.execute("DELETE FROM sources WHERE source = ?", (source,))
+
+
+_manifest = None
+
+
+def get_manifest() -> IngestManifest:
+    global _manifest
+    if _manifest is None:
+        _manifest = IngestManifest(os.path.join(get_settings().DATA_FOLDER, 'ingest_manifest.db'))
+    return _manifest
+
+
+# -------------------
+# Rate limiting
+# -------------------
+class RateLimiter:
+    """Spaces calls evenly to stay within a requests-per-minute budget; shared by threads"""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def _retryable(exc: Exception) -> Tuple[bool, Optional[str]]:
+    """Whether an API error is a rate limit or server error, and its Retry-After if any"""
+    response = getattr(exc, 'response', None)
+    status = getattr(exc, 'status_code', None) or getattr(exc, 'status', None) or getattr(response, 'status_code', None)
+    retry_after = None
+    headers = getattr(response, 'headers', None)
+    if headers:
+        retry_after = headers.get('retry-after')
+    if 'RateLimit' in type(exc).__name__:
+        return True, retry_after
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False, None
+    return status == 429 or status >= 500, retry_after
+
+
+# -------------------
+# Ingestion engine
+# -------------------
+@dataclass
+class IngestStats:
+    """Counters for one ingestion run"""
+    sources: int = 0
+    skipped: int = 0
+    ingested: int = 0
+    removed: int = 0
+    failed: int = 0
+    chunks_embedded: int = 0
+    chunks_kept: int = 0
+    chunks_deleted: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def summary(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"{self.sources} sources: {self.ingested} ingested, {self.skipped} unchanged, "
+            f"{self.removed} removed, {self.failed} failed | "
+            f"{self.chunks_embedded} chunks embedded, {self.chunks_kept} kept, {self.chunks_deleted} deleted | "
+            f"{elapsed:.1f}s, {self.chunks_embedded / elapsed:.1f} chunks/sec"
+        )
+
+
+@dataclass
+class _SourceJob:
+    """A changed source whose new chunks are being embedded"""
+    source: str
+    kind: str
+    sha256: str
+    old_ids: set
+    mtime: Optional[float] = None
+    size: Optional[int] = None
+    extra: Optional[dict] = None
+    chunk_ids: dict = field(default_factory=dict)  # insertion-ordered set
+    futures: list = field(default_factory=list)
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class _Slice:
+    """Pages [start, stop) of a document, parsed by one worker process; stop None = to the end"""
+    job: _SourceJob
+    path: str
+    start: int = 0
+    stop: Optional[int] = None
+
+
+class Ingestor:
+    """
+    Ingests sources into the KB with deterministic chunk ids. Unchanged
+    sources are skipped, only chunks not already indexed are embedded, and
+    vectors of changed or removed sources are deleted.
+
+    Documents are parsed in a process pool (PDFs in slices of
+    INGEST_PAGES_PER_TASK pages) while a thread pool embeds and upserts the
+    chunks of finished slices. Both stages are bounded (a few slices and
+    batches in flight), so memory does not grow with document size. API
+    calls share a rate limiter and back off on 429/5xx.
+    """
+
+    def __init__(self, manifest: Optional[IngestManifest] = None, workers: Optional[int] = None,
+                 concurrency: Optional[int] = None, batch_size: Optional[int] = None,
+                 requests_per_minute: Optional[int] = None, pages_per_task: Optional[int] = None,
+                 max_retries: int = 5):
+        settings = get_settings()
+        self.manifest = manifest or get_manifest()
+        self.workers = workers or settings.INGEST_WORKERS or os.cpu_count() or 1
+        self.concurrency = concurrency or settings.INGEST_EMBED_CONCURRENCY
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.pages_per_task = pages_per_task or settings.INGEST_PAGES_PER_TASK
+        self.limiter = RateLimiter(requests_per_minute if requests_per_minute is not None
+                                   else settings.INGEST_REQUESTS_PER_MINUTE)
+        self.max_retries = max_retries
+        self.stats = IngestStats()
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='kb-ingest')
+        # Batches queued or running; _flush blocks beyond this
+        self._inflight = threading.BoundedSemaphore(self.concurrency * 2)
+        self._buffer: List[Tuple[tuple, str, _SourceJob]] = []
+        self._jobs: List[_SourceJob] = []
+
+    # --- API calls ---
+    def _call(self, fn: Callable, *args, **kwargs):
+        """Rate-limited call with backoff on rate limits and server errors"""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                retry, retry_after = _retryable(e)
+                if not retry or attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, base=1.0, cap=60.0, retry_after=retry_after)
+                print(f"⏳ {type(e).__name__}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _embed_and_upsert(self, batch: List[Tuple[tuple, str]]):
+        texts = [text for _, text in batch]
+        vectors = self._call(manager.get_embeddings().embed_documents, [manager.normalize_text(t) for t in texts])
+        items = [(vid, vec, meta) for ((vid, meta), _), vec in zip(batch, vectors)]
+        self._call(manager._upsert_chunks, items, texts, batch_size=len(items))
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self._inflight.acquire()
+        future = self._pool.submit(self._embed_and_upsert, [(item, text) for item, text, _ in batch])
+        future.add_done_callback(lambda _: self._inflight.release())
+        for job in {id(job): job for _, _, job in batch}.values():
+            job.futures.append(future)
+
+    # --- sources ---
+    def _start_source(self, source: str, kind: str, sha256: str, mtime: Optional[float] = None,
+                      size: Optional[int] = None, extra: Optional[dict] = None) -> _SourceJob:
+        """Begin ingesting a new or changed source"""
+        previous = self.manifest.get(source)
+        job = _SourceJob(source, kind, sha256, set(previous['chunk_ids']) if previous else set(), mtime, size, extra)
+        self._jobs.append(job)
+        self.stats.ingested += 1
+        return job
+
+    def _add_chunks(self, job: _SourceJob, chunks: Iterable[str], meta: dict):
+        """Queue a source's chunks; ones already indexed are kept as they are"""
+        for text in chunks:
+            vid = manager.chunk_id(job.kind, job.source, text)
+            if vid in job.chunk_ids:
+                continue
+            job.chunk_ids[vid] = None
+            if vid in job.old_ids:
+                self.stats.chunks_kept += 1
+                continue
+            self.stats.chunks_embedded += 1
+            self._buffer.append(((vid, meta), text, job))
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def _finish(self):
+        """Wait for queued batches, then record finished sources and drop their stale vectors"""
+        self._flush()
+        for job in self._jobs:
+            job.error = job.error or next((f.exception() for f in job.futures if f.exception()), None)
+            stale = sorted(job.old_ids - job.chunk_ids.keys())
+            if not job.error:
+                try:
+                    if stale:
+                        self._call(manager.delete_from_kb, stale)
+                    self.manifest.put(job.source, job.kind, job.sha256, list(job.chunk_ids),
+                                      job.mtime, job.size, job.extra)
+                except Exception as e:
+                    job.error = e
+            if job.error:
+                # Not recorded: the next run retries this source
+                print(f"❌ {job.source}: {job.error}")
+                self.stats.failed += 1
+                self.stats.ingested -= 1
+                continue
+            self.stats.chunks_deleted += len(stale)
+        self._jobs = []
+
+    def _unchanged(self, path: str) -> Tuple[bool, Optional[str], os.stat_result]:
+        """Whether a file matches the manifest (stat first, then content hash)"""
+        st = os.stat(path)
+        entry = self.manifest.get(path)
+        if entry and entry['mtime'] == st.st_mtime and entry['size'] == st.st_size:
+            return True, entry['sha256'], st
+        digest = file_sha256(path)
+        if entry and entry['sha256'] == digest:
+            self.manifest.touch(path, st.st_mtime, st.st_size)
+            return True, digest, st
+        return False, digest, st
+
+    def _slices(self, job: _SourceJob, path: str) -> List[_Slice]:
+        extractor = get_extractor(path)
+        if extractor is None:
+            job.error = UnsupportedDocument(f"No extractor for {os.path.basename(path)}")
+            return []
+        if extractor.part_count is None:
+            return [_Slice(job, path)]
+        try:
+            pages = extractor.part_count(path)
+        except Exception as e:
+            job.error = e
+            return []
+        step = self.pages_per_task
+        return [_Slice(job, path, start, min(start + step, pages)) for start in range(0, pages, step)]
+
+    def ingest_files(self, paths: Iterable[str], kind: str = 'doc',
+                     extract: Callable[..., List[str]] = extract_document_chunks):
+        """Ingest documents, parsing changed ones (PDFs in page slices) across a process pool"""
+        slices: List[_Slice] = []
+        for path in paths:
+            self.stats.sources += 1
+            try:
+                unchanged, digest, st = self._unchanged(path)
+            except OSError as e:
+                print(f"❌ {path}: {e}")
+                self.stats.failed += 1
+                continue
+            if unchanged:
+                self.stats.skipped += 1
+                continue
+            job = self._start_source(path, kind, digest, st.st_mtime, st.st_size)
+            slices += self._slices(job, path)
+
+        if slices:
+            todo = iter(slices)
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(slices))) as pool:
+                running = {}
+
+                def submit_next():
+                    part = next(todo, None)
+                    if part is not None:
+                        running[pool.submit(extract, part.path, part.start, part.stop)] = part
+
+                # Keep a couple of slices per worker queued, not the whole backlog
+                for _ in range(self.workers * 2):
+                    submit_next()
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        part = running.pop(future)
+                        submit_next()
+                        if part.job.error:
+                            continue
+                        try:
+                            chunks = future.result()
+                        except Exception as e:
+                            part.job.error = e
+                            continue
+                        pages = f" pages {part.start + 1}-{part.stop}" if part.stop else ""
+                        print(f"  📄 {os.path.basename(part.path)}{pages}: {len(chunks)} chunks")
+                        self._add_chunks(part.job, chunks, {"source": part.path, "type": "text"})
+        self._finish()
+
+    def ingest_urls(self, urls: Iterable[str], kind: str = 'url', max_depth: Optional[int] = None) -> List[str]:
+        """
+        Crawl web pages, and same-domain links up to max_depth hops away
+        (CRAWL_MAX_DEPTH by default). Pages answering 304, or whose text did
+        not change, are not re-embedded. Returns the URLs to keep, for
+        remove_missing(). If a page failed or CRAWL_MAX_PAGES cut the crawl
+        short, pages that were not reached may still be online, so every
+        known URL is kept except those reported gone (404/410).
+        """
+        settings = get_settings()
+
+        def previous(url):
+            entry = self.manifest.get(url)
+            return entry['extra'] if entry else None
+
+        crawler = Crawler(previous, concurrency=settings.CRAWL_CONCURRENCY,
+                          max_depth=settings.CRAWL_MAX_DEPTH if max_depth is None else max_depth,
+                          max_pages=settings.CRAWL_MAX_PAGES)
+        online, gone, errors = [], set(), 0
+
+        async def crawl():
+            nonlocal errors
+            async for page in crawler.crawl(urls):
+                self.stats.sources += 1
+                if page.status == 'gone':
+                    gone.add(page.url)
+                    continue
+                online.append(page.url)
+                if page.status == 'error':
+                    print(f"❌ {page.url}: {page.error}")
+                    self.stats.failed += 1
+                    errors += 1
+                    continue
+                if page.status == 'unchanged':
+                    self.stats.skipped += 1
+                    continue
+                # Chunking, the manifest and a full embed queue all block, so
+                # they run in a thread while the fetches in flight carry on
+                await asyncio.to_thread(self._add_page, page, kind)
+
+        asyncio.run(crawl())
+        self._finish()
+        if errors or crawler.truncated:
+            reason = f"{errors} pages failed" if errors else f"stopped at {crawler.max_pages} pages"
+            print(f"⚠️ Incomplete crawl ({reason}): only pages that are gone will be removed")
+            online += [url for url in self.manifest.sources(kind) if url not in gone]
+        return online
+
+    def _add_page(self, page: Page, kind: str):
+        """Queue a fetched page's chunks, unless its text did not change"""
+        chunks = list(iter_chunks(page.blocks))
+        extra = {'etag': page.etag, 'last_modified': page.last_modified, 'links': page.links}
+        digest = text_sha256(chunks)
+        entry = self.manifest.get(page.url)
+        if entry and entry['sha256'] == digest:
+            self.manifest.set_extra(page.url, extra)  # new validators, same text
+            self.stats.skipped += 1
+            return
+        print(f"  🌐 {page.url}: {len(chunks)} chunks")
+        job = self._start_source(page.url, kind, digest, extra=extra)
+        self._add_chunks(job, chunks, {"source": page.url, "type": "url"})
+
+    def ingest_media(self, entries: Iterable[Tuple[str, str]], kind: str = 'media'):
+        """Ingest (file path, caption) pairs; only new or re-captioned files are embedded"""
+        for file_path, caption in entries:
+            self.stats.sources += 1
+            digest = text_sha256([caption])
+            entry = self.manifest.get(file_path)
+            if entry and entry['sha256'] == digest:
+                self.stats.skipped += 1
+                continue
+            job = self._start_source(file_path, kind, digest)
+            self._add_chunks(job, [caption], {"file_path": file_path, "type": "media", "caption": caption})
+        self._finish()
+
+    def remove_missing(self, kind: str, current: Iterable[str]):
+        """Delete the vectors of sources of this kind that are no longer present"""
+        current = set(current)
+        for source in self.manifest.sources(kind):
+            if source in current:
+                continue
+            entry = self.manifest.get(source)
+            try:
+                self._call(manager.delete_from_kb, entry['chunk_ids'])
+            except Exception as e:
+                print(f"❌ Could not remove {source}: {e}")
+                continue
+            self.manifest.remove(source)
+            self.stats.removed += 1
+            self.stats.chunks_deleted += len(entry['chunk_ids'])
+            print(f"  🗑️ Removed {source} ({len(entry['chunk_ids'])} chunks)")
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        if self.stats.ingested or self.stats.removed:
+            manager.bump_kb_version()
@@ -1,7 +1,9 @@
-"""Knowledge Base manager for Pinecone operations"""
+"""Knowledge Base manager for vector store operations"""
 import os
 import time
 import re
+import hashlib
+import uuid
 from dotenv import load_dotenv
 
 # langchain document types
@@ -19,73 +21,44 @@ except Exception:
     except Exception:
         raise ImportError("Could not import OpenAIEmbeddings from langchain. Install/upgrade langchain.")
 
+from app.config import get_settings
+from app.core.kb.chunk_store import get_chunk_store
+from app.core.kb.chunker import iter_chunks
+from app.core.kb.extract import iter_document_text
+from app.core.kb.embedding_cache import cached_embeddings
+from app.core.kb.vectorstore import create_vector_store
+from app.utils.lazy import lazy
+from app.utils.text import count_tokens, truncate_tokens
+
 load_dotenv()
 
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-PINECONE_KEY = os.getenv("PINECONE_API_KEY")
-PINECONE_ENV = os.getenv("PINECONE_ENV", None)
-INDEX_NAME = os.getenv("PINECONE_INDEX", "sales-agent-kb")
 EMBED_DIM = 1536  # matches text-embedding-3-small
+# Archived chats are one customer's conversation: never context for another
+# (each customer's own history comes from ConversationMemory)
+KB_FILTER = {"source": {"$ne": "chat_history"}}
 
-# initialize embeddings
-emb = OpenAIEmbeddings(openai_api_key=OPENAI_KEY)
 
 # ---------------------------
+# Clients, built on first use (importing this module makes no network calls)
 # ---------------------------
-try:
-    from pinecone import Pinecone, ServerlessSpec
-except Exception as e:
-    raise ImportError("Missing pinecone>=5.0.0. Run: pip install pinecone") from e
-
-_index = None
-_pc = None
-
-
-def _init_pinecone_client():
-    global _index, _pc
-
-    try:
-        # Initialize Pinecone v5.x client
-        _pc = Pinecone(api_key=PINECONE_KEY)
-        
-        # List existing indexes
-        existing_indexes = _pc.list_indexes()
-        index_names = [idx.name for idx in existing_indexes]
-        
-        if INDEX_NAME not in index_names:
-            print(f"Creating index '{INDEX_NAME}' with Pinecone v5.x API...")
-            # Create serverless index (adjust cloud/region as needed)
-            _pc.create_index(
-                name=INDEX_NAME,
-                dimension=EMBED_DIM,
-                metric="cosine",
-                spec=ServerlessSpec(
-                    cloud="aws",
-                    region=PINECONE_ENV or "us-east-1"
-                )
-            )
-            print(f"✅ Index '{INDEX_NAME}' created successfully")
-        
-        _index = _pc.Index(INDEX_NAME)
-        
-    except Exception as e:
-        raise RuntimeError(
-            f"Failed to initialize Pinecone index. "
-            f"Check PINECONE_API_KEY and PINECONE_ENV. Error: {str(e)}"
-        ) from e
+@lazy
+def get_embeddings():
+    """Embeddings client; repeated texts are served from the local embedding cache"""
+    return cached_embeddings(OpenAIEmbeddings(openai_api_key=OPENAI_KEY))
 
 
-# initialize on import
-_init_pinecone_client()
-index = _index
+@lazy
+def get_vector_store():
+    """Vector store (Pinecone or local, see VECTOR_BACKEND)"""
+    return create_vector_store(EMBED_DIM)
 
 
 def init_pinecone_if_needed():
-    """Compatibility wrapper used by main.py"""
-    if index is None:
-        _init_pinecone_client()
-    print(f"✅ Pinecone index ready: {INDEX_NAME}")
-    return index
+    """Compatibility wrapper: connect to the vector store now"""
+    store = get_vector_store()
+    print(f"✅ Vector store ready: {store.describe()}")
+    return store
 
 
 # -------------------
@@ -96,20 +69,32 @@ def normalize_text(text: str) -> str:
 
 
 def _embed_text(text: str):
-    return emb.embed_query(normalize_text(text))
+    return get_embeddings().embed_query(normalize_text(text))
+
+
+def _batched(items, size: int):
+    """Lists of up to size items from any iterable, consumed lazily"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
 def _embed_texts(texts: list[str], batch_size: int = 20):
     vectors = []
     for i in range(0, len(texts), batch_size):
         batch = [normalize_text(t) for t in texts[i:i+batch_size]]
-        batch_vecs = emb.embed_documents(batch)
+        batch_vecs = get_embeddings().embed_documents(batch)
         vectors.extend(batch_vecs)
     return vectors
 
 
 # -------------------
-# Pinecone helpers
+# Vector store helpers
 # -------------------
 def _upsert(vectors, batch_size: int = 20):
     if not vectors:
@@ -117,65 +102,124 @@ def _upsert(vectors, batch_size: int = 20):
     for i in range(0, len(vectors), batch_size):
         batch = vectors[i:i+batch_size]
         try:
-            # Pinecone v5.x uses index.upsert() directly
-            index.upsert(vectors=batch)
+            get_vector_store().upsert(batch)
         except Exception as e:
             print("❌ _upsert failed:", e)
             raise
 
 
-def _query(vector, top_k, include_metadata=True):
+def _query(vector, top_k, include_metadata=True, filter=None):
+    return get_vector_store().query(vector, top_k=top_k, include_metadata=include_metadata, filter=filter)
+
+
+def chunk_id(prefix: str, source: str, text: str) -> str:
+    """Deterministic vector id: the same text from the same source always maps to the same id"""
+    digest = hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()[:32]
+    return f"{prefix}_{digest}"
+
+
+def delete_from_kb(ids):
+    """Delete vectors and their stored text"""
+    ids = list(ids)
+    if not ids:
+        return
+    get_vector_store().delete(ids)
+    get_chunk_store().delete_many(ids)
+    bump_kb_version()
+
+
+# -------------------
+# KB version: answers cached from the KB are dropped when it changes
+# -------------------
+def _kb_version_path() -> str:
+    return os.path.join(get_settings().DATA_FOLDER, "kb_version")
+
+
+def kb_version() -> str:
+    """Token that changes whenever KB content is added or removed; shared with init_kb.py through DATA_FOLDER"""
     try:
-        return index.query(vector=vector, top_k=top_k, include_metadata=include_metadata)
-    except Exception:
-        return index.query(vector=vector, top_k=top_k)
+        with open(_kb_version_path()) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def bump_kb_version():
+    """Mark the KB as changed (archived chat turns don't count: they are not catalogue content)"""
+    path = _kb_version_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp, path)
+
+
+def _upsert_chunks(vectors, texts, batch_size: int = 20):
+    """Upsert vectors and keep their text in the chunk store (written first, so no vector lacks text)"""
+    get_chunk_store().put_many((vid, text) for (vid, _, _), text in zip(vectors, texts))
+    _upsert(vectors, batch_size=batch_size)
+
+
+def fit_context(docs, max_tokens: int):
+    """Keep the best-ranked docs within max_tokens, truncating the last one that fits partly"""
+    if not max_tokens:
+        return docs
+    fitted, remaining = [], max_tokens
+    for doc in docs:
+        tokens = count_tokens(doc.page_content)
+        if tokens > remaining:
+            if remaining >= 50:  # a useful fragment, not just a few words
+                fitted.append(Document(page_content=truncate_tokens(doc.page_content, remaining), metadata=doc.metadata))
+            break
+        fitted.append(doc)
+        remaining -= tokens
+    return fitted
 
 
 # -------------------
 # Add to KB functions
 # -------------------
 def add_file_to_kb(file_path: str):
+    """
+    Stream a document (PDF, DOCX, TXT, see app.core.kb.extract) into the KB:
+    text blocks, chunks, embedding batch, upsert. Only one page and one batch
+    are held in memory at a time.
+    """
     try:
-        from PyPDF2 import PdfReader
-        reader = PdfReader(file_path)
-        texts = [p.extract_text() for p in reader.pages if p.extract_text()]
-        chunks = [t[i:i+800] for t in texts for i in range(0, len(t), 800)]
-
-        if not chunks:
+        batch_size = get_settings().INGEST_BATCH_SIZE
+        meta = {"source": file_path, "type": "text"}
+        count = 0
+        for chunks in _batched(iter_chunks(iter_document_text(file_path)), batch_size):
+            vectors = _embed_texts(chunks, batch_size=batch_size)
+            to_upsert = [(chunk_id("doc", file_path, chunk), vec, meta) for chunk, vec in zip(chunks, vectors)]
+            _upsert_chunks(to_upsert, chunks, batch_size=batch_size)
+            count += len(chunks)
+
+        if not count:
             print(f"⚠️ No text extracted from {file_path}")
             return
-
-        vectors = _embed_texts(chunks)
-        to_upsert = [
-            (f"{int(time.time())}_{i}", vec, {"source": file_path, "type": "text"})
-            for i, vec in enumerate(vectors)
-        ]
-        _upsert(to_upsert)
-        print(f"✅ added file {file_path}, chunks={len(to_upsert)}")
+        bump_kb_version()
+        print(f"✅ added file {file_path}, chunks={count}")
     except Exception as e:
         print("❌ add_file_to_kb error:", e)
 
 
-def add_url_to_kb(url: str):
+def add_url_to_kb(url: str, max_depth: int = None):
+    """
+    Crawl url into the KB, following same-domain links up to max_depth hops
+    (CRAWL_MAX_DEPTH by default). Pages fetched before are requested
+    conditionally and only re-embedded when their text changed. They are
+    recorded under their own kind, so init_kb's clean-up of the configured
+    URL list leaves them alone.
+    """
     try:
-        import requests
-        from bs4 import BeautifulSoup
-        r = requests.get(url, timeout=15)
-        soup = BeautifulSoup(r.text, "html.parser")
-        texts = " ".join(p.get_text(separator=" ", strip=True) for p in soup.find_all(["p", "h1", "h2", "h3", "li"]))
-
-        if not texts:
-            print(f"⚠️ No text extracted from {url}")
-            return
-
-        chunks = [texts[i:i+800] for i in range(0, len(texts), 800)]
-        vectors = _embed_texts(chunks)
-        to_upsert = [
-            (f"{int(time.time())}_u_{i}", vec, {"source": url, "type": "url"})
-            for i, vec in enumerate(vectors)
-        ]
-        _upsert(to_upsert)
-        print(f"✅ added url {url}, chunks={len(to_upsert)}")
+        from app.core.kb.ingest import Ingestor  # imports this module
+        ingestor = Ingestor()
+        try:
+            ingestor.ingest_urls([url], kind='url_added', max_depth=max_depth)
+        finally:
+            ingestor.close()
+        print(f"✅ added url {url}: {ingestor.stats.summary()}")
     except Exception as e:
         print("❌ add_url_to_kb error:", e)
 
@@ -184,41 +228,67 @@ def add_media_to_kb(file_path: str, caption: str):
     try:
         vec = _embed_text(caption)
         meta = {"file_path": file_path, "type": "media", "caption": caption}
-        _upsert([(f"media_{int(time.time())}", vec, meta)])
+        _upsert([(chunk_id("media", file_path, caption), vec, meta)])
+        bump_kb_version()
         print(f"✅ added media {file_path}")
     except Exception as e:
         print("❌ add_media_to_kb error:", e)
 
 
+def chat_record(user_msg: str, ai_reply: str, phone: str = None, timestamp: float = None):
+    """(vector id, text, metadata) for one chat turn; ids are random, so turns never overwrite each other"""
+    timestamp = time.time() if timestamp is None else timestamp
+    if phone:
+        text = f"Cliente ({phone}): {user_msg}\nAgente: {ai_reply}"
+        key = f"chat_{phone}_{uuid.uuid4().hex}"
+        meta = {"source": "chat_history", "phone": phone, "timestamp": int(timestamp)}
+    else:
+        text = f"Cliente: {user_msg}\nAgente: {ai_reply}"
+        key = f"chat_{uuid.uuid4().hex}"
+        meta = {"source": "chat_history", "timestamp": int(timestamp)}
+    return key, text, meta
+
+
+def add_chats_to_kb(records, batch_size: int = 64):
+    """
+    Embed and upsert chat_record() tuples in bulk; raises on failure so callers can retry.
+    Only vectors and metadata are kept: chat text stays out of the shared chunk store.
+    """
+    records = list(records)
+    if not records:
+        return
+    vectors = _embed_texts([text for _, text, _ in records], batch_size=batch_size)
+    _upsert([(key, vec, meta) for (key, _, meta), vec in zip(records, vectors)], batch_size=batch_size)
+
+
 def add_chat_to_kb(user_msg: str, ai_reply: str, phone: str = None):
+    """Archive one chat turn right away (the app queues turns through ChatArchiver instead)"""
     try:
-        if phone:
-            text = f"Cliente ({phone}): {user_msg}\nAgente: {ai_reply}"
-            key = f"chat_{phone}_{int(time.time())}"
-            meta = {"source": "chat_history", "phone": phone}
-        else:
-            text = f"Cliente: {user_msg}\nAgente: {ai_reply}"
-            key = f"chat_{int(time.time())}"
-            meta = {"source": "chat_history"}
-
-        vec = _embed_text(text)
-        _upsert([(key, vec, meta)])
+        add_chats_to_kb([chat_record(user_msg, ai_reply, phone)])
         print(f"✅ Chat archived {('for ' + phone) if phone else ''}")
     except Exception as e:
         print("❌ add_chat error:", e)
 
 
-def query(text: str, top_k: int = 3):
+def query(text: str, top_k: int = 3, max_tokens: int = None):
+    """
+    Top-k documents for text with their chunk text as page_content, cut to
+    max_tokens (KB_CONTEXT_TOKENS by default; 0 = no limit). Archived chats
+    are excluded.
+    """
     try:
         vec = _embed_text(text)
-        res = _query(vec, top_k=top_k, include_metadata=True)
+        res = _query(vec, top_k=top_k, include_metadata=True, filter=KB_FILTER)
         docs = []
         matches = res.get("matches", res.get("results", [])) if isinstance(res, dict) else []
+        texts = get_chunk_store().get_many([m.get("id") for m in matches if m.get("id")])
         for match in matches:
             md = match.get("metadata", {}) or match.get("meta", {})
-            content = md.get("caption") or md.get("source") or ""
+            content = texts.get(match.get("id")) or md.get("text") or md.get("caption") or md.get("source") or ""
             docs.append(Document(page_content=content, metadata=md))
-        return docs
+        if max_tokens is None:
+            max_tokens = get_settings().KB_CONTEXT_TOKENS
+        return fit_context(docs, max_tokens)
     except Exception as e:
         print("❌ query error:", e)
         return []
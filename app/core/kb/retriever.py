@@ -1,4 +1,5 @@
 """LangChain retriever wrapper for Pinecone KB"""
+import asyncio
 from functools import lru_cache
 from langchain.schema import BaseRetriever
 from app.core.kb.manager import query
@@ -11,7 +12,8 @@ class RetrieverWrapper(BaseRetriever):
         return query(query_text, top_k=3)
 
     async def _aget_relevant_documents(self, query_text: str, *, run_manager=None):
-        return query(query_text, top_k=3)
+        # query() makes blocking embedding and vector store calls
+        return await asyncio.to_thread(query, query_text, 3)
 
 
 @lru_cache()
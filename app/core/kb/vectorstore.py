@@ -0,0 +1,393 @@
+"""Vector store backends for the knowledge base"""
+import os
+import json
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from app.config import get_settings
+
+try:
+    import fcntl  # cross-process file locks (POSIX only)
+except ImportError:
+    fcntl = None
+
+
+class VectorStore(ABC):
+    """
+    What the KB manager needs from a vector index. Vectors are (id, values,
+    metadata) tuples or Pinecone-style dicts; query() returns
+    {'matches': [{'id', 'score', 'metadata'}]} ordered by similarity.
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def upsert(self, vectors: list):
+        ...
+
+    @abstractmethod
+    def query(self, vector: List[float], top_k: int, include_metadata: bool = True,
+              filter: Optional[dict] = None) -> dict:
+        ...
+
+    @abstractmethod
+    def delete(self, ids: Iterable[str]):
+        ...
+
+    def describe(self) -> str:
+        return self.name
+
+
+def _as_item(vector) -> tuple:
+    """(id, values, metadata) from a tuple or a Pinecone-style dict"""
+    if isinstance(vector, dict):
+        return vector['id'], vector['values'], vector.get('metadata') or {}
+    vid, values, *rest = vector
+    return vid, values, (rest[0] if rest else None) or {}
+
+
+# -------------------
+# Pinecone
+# -------------------
+class PineconeStore(VectorStore):
+    """Pinecone serverless index, created on first connection if missing"""
+
+    name = 'pinecone'
+
+    def __init__(self, api_key: str, index_name: str, dim: int, region: Optional[str] = None):
+        try:
+            from pinecone import Pinecone, ServerlessSpec
+        except Exception as e:
+            raise ImportError("Missing pinecone>=5.0.0. Run: pip install pinecone") from e
+
+        self.index_name = index_name
+        try:
+            # Initialize Pinecone v5.x client
+            self.client = Pinecone(api_key=api_key)
+
+            # List existing indexes
+            index_names = [idx.name for idx in self.client.list_indexes()]
+
+            if index_name not in index_names:
+                print(f"Creating index '{index_name}' with Pinecone v5.x API...")
+                # Create serverless index (adjust cloud/region as needed)
+                self.client.create_index(
+                    name=index_name,
+                    dimension=dim,
+                    metric="cosine",
+                    spec=ServerlessSpec(cloud="aws", region=region or "us-east-1")
+                )
+                print(f"✅ Index '{index_name}' created successfully")
+
+            self.index = self.client.Index(index_name)
+
+        except Exception as e:
+            raise RuntimeError(
+                f"Failed to initialize Pinecone index. "
+                f"Check PINECONE_API_KEY and PINECONE_ENV. Error: {str(e)}"
+            ) from e
+
+    def upsert(self, vectors: list):
+        self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k, include_metadata=True, filter=None) -> dict:
+        res = self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, filter=filter)
+        # QueryResponse is a model object, not a dict
+        return res.to_dict() if hasattr(res, 'to_dict') else res
+
+    def delete(self, ids):
+        self.index.delete(ids=list(ids))
+
+    def describe(self) -> str:
+        return f"pinecone:{self.index_name}"
+
+
+# -------------------
+# Local (NumPy, memory-mapped)
+# -------------------
+def _matches_filter(metadata: dict, flt: dict) -> bool:
+    """Pinecone metadata filter subset: equality, $eq/$ne/$in/$nin/$gt/$gte/$lt/$lte, $and/$or"""
+    for key, cond in flt.items():
+        if key == '$and':
+            if not all(_matches_filter(metadata, c) for c in cond):
+                return False
+        elif key == '$or':
+            if not any(_matches_filter(metadata, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = metadata.get(key)
+            for op, arg in cond.items():
+                if op == '$eq' and value != arg:
+                    return False
+                if op == '$ne' and value == arg:
+                    return False
+                if op == '$in' and value not in arg:
+                    return False
+                if op == '$nin' and value in arg:
+                    return False
+                if op in ('$gt', '$gte', '$lt', '$lte'):
+                    if value is None:
+                        return False
+                    if op == '$gt' and not value > arg:
+                        return False
+                    if op == '$gte' and not value >= arg:
+                        return False
+                    if op == '$lt' and not value < arg:
+                        return False
+                    if op == '$lte' and not value <= arg:
+                        return False
+        elif metadata.get(key) != cond:
+            return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Exact cosine search over a float32 matrix, for KBs that fit in RAM.
+
+    Rows live in an append-only file that is memory-mapped for queries;
+    a JSON-lines log maps ids to rows and holds metadata. Overwrites and
+    deletes append to the log, and the files are compacted once dead rows
+    outnumber live ones. Every process re-reads the log tail before a query,
+    so writes from other uvicorn workers become visible. Writers hold an
+    exclusive flock and log replays a shared one, so no process reads the
+    pair of files halfway through a compaction.
+    """
+
+    name = 'local'
+
+    def __init__(self, folder: str, dim: int, compact_min_dead: int = 1000):
+        self.folder = folder
+        self.dim = dim
+        self.compact_min_dead = compact_min_dead
+        self.vectors_path = os.path.join(folder, 'vectors.f32')
+        self.log_path = os.path.join(folder, 'rows.jsonl')
+        self.lock_path = os.path.join(folder, '.lock')
+        self._lock = threading.RLock()
+        self._writing = False  # this process holds the exclusive flock
+        os.makedirs(folder, exist_ok=True)
+        self._reset()
+        self._refresh()
+
+    def _reset(self):
+        self._ids = {}
+        self._row_ids: List[Optional[str]] = []
+        self._meta: List[Optional[dict]] = []
+        self._log_offset = 0
+        self._log_ino = None
+        self._matrix = np.empty((0, self.dim), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._filter_masks = {}
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            with self._file_lock(exclusive=True):
+                self._writing = True
+                try:
+                    yield
+                finally:
+                    self._writing = False
+
+    # --- log replay ---
+    def _refresh(self):
+        """Apply log records written since the last refresh (by any process)"""
+        with self._lock:
+            try:
+                st = os.stat(self.log_path)
+            except FileNotFoundError:
+                return
+            if st.st_ino == self._log_ino and st.st_size == self._log_offset:
+                return  # nothing new: no lock needed
+            if self._writing:
+                self._replay()
+            else:
+                # Compaction replaces vectors.f32, then rows.jsonl; the shared lock
+                # keeps this replay from pairing the new matrix with the old log
+                with self._file_lock(exclusive=False):
+                    self._replay()
+
+    def _replay(self):
+        # Caller holds self._lock and a file lock
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._log_ino or st.st_size < self._log_offset:
+            self._reset()  # compacted by another process
+            self._log_ino = st.st_ino
+        if st.st_size == self._log_offset:
+            return
+
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1  # ignore a line still being written
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._log_offset += end
+        self._remap()
+
+    def _apply(self, record: dict):
+        vid, row = record['id'], record.get('row')
+        old = self._ids.pop(vid, None)
+        if old is not None:
+            self._row_ids[old] = None
+            self._meta[old] = None
+        if row is None:
+            return
+        if row >= len(self._row_ids):
+            grow = row + 1 - len(self._row_ids)
+            self._row_ids.extend([None] * grow)
+            self._meta.extend([None] * grow)
+        self._ids[vid] = row
+        self._row_ids[row] = vid
+        self._meta[row] = record.get('metadata') or {}
+
+    def _remap(self):
+        rows = len(self._row_ids)
+        if rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+        else:
+            self._matrix = np.empty((0, self.dim), dtype=np.float32)
+        self._alive = np.fromiter((vid is not None for vid in self._row_ids), dtype=bool, count=rows)
+        self._filter_masks = {}
+
+    # --- writes ---
+    def _append(self, items: list):
+        """Append rows and their log records; items are (id, values, metadata)"""
+        with self._write_lock():
+            self._refresh()
+            if items:
+                matrix = np.asarray([values for _, values, _ in items], dtype=np.float32)
+                if matrix.shape[1] != self.dim:
+                    raise ValueError(f"vector dimension {matrix.shape[1]} does not match index dimension {self.dim}")
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                matrix /= np.where(norms == 0, 1, norms)
+
+                start = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+                with open(self.vectors_path, 'ab') as f:
+                    f.write(matrix.tobytes())
+                records = [
+                    {'id': vid, 'row': start + i, 'metadata': metadata}
+                    for i, (vid, _, metadata) in enumerate(items)
+                ]
+                self._write_log(records)
+            self._refresh()
+            self._maybe_compact()
+
+    def _write_log(self, records: list):
+        data = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+        with open(self.log_path, 'ab') as f:
+            f.write(data.encode())
+
+    def upsert(self, vectors: list):
+        self._append([_as_item(v) for v in vectors])
+
+    def delete(self, ids):
+        with self._write_lock():
+            self._refresh()
+            records = [{'id': vid, 'row': None} for vid in ids if vid in self._ids]
+            if records:
+                self._write_log(records)
+            self._refresh()
+
+    def _maybe_compact(self):
+        dead = len(self._row_ids) - len(self._ids)
+        if dead >= self.compact_min_dead and dead > len(self._ids):
+            self._compact()
+
+    def compact(self):
+        """Rewrite the files with live rows only"""
+        with self._write_lock():
+            self._refresh()
+            self._compact()
+
+    def _compact(self):
+        # Caller holds the write lock
+        live = list(self._ids.items())
+        tmp_vectors, tmp_log = self.vectors_path + '.tmp', self.log_path + '.tmp'
+        with open(tmp_vectors, 'wb') as f:
+            for vid, row in live:
+                f.write(np.asarray(self._matrix[row], dtype=np.float32).tobytes())
+        with open(tmp_log, 'wb') as f:
+            for i, (vid, row) in enumerate(live):
+                record = {'id': vid, 'row': i, 'metadata': self._meta[row]}
+                f.write((json.dumps(record, ensure_ascii=False) + '\n').encode())
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_log, self.log_path)
+        self._reset()
+        self._refresh()
+
+    # --- reads ---
+    def _filter_mask(self, flt: dict) -> np.ndarray:
+        key = json.dumps(flt, sort_keys=True)
+        mask = self._filter_masks.get(key)
+        if mask is None:
+            mask = np.fromiter(
+                (md is not None and _matches_filter(md, flt) for md in self._meta),
+                dtype=bool, count=len(self._meta)
+            )
+            self._filter_masks[key] = mask
+        return mask
+
+    def query(self, vector, top_k, include_metadata=True, filter=None) -> dict:
+        self._refresh()
+        with self._lock:
+            matrix, alive, meta, row_ids = self._matrix, self._alive, self._meta, self._row_ids
+            mask = alive & self._filter_mask(filter) if filter else alive
+        candidates = np.flatnonzero(mask)
+        if not len(candidates) or top_k <= 0:
+            return {'matches': []}
+
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        scores = (matrix @ q)[candidates] if len(candidates) > len(row_ids) // 2 else matrix[candidates] @ q
+
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        matches = []
+        for i in top:
+            row = candidates[i]
+            match = {'id': row_ids[row], 'score': float(scores[i])}
+            if include_metadata:
+                match['metadata'] = meta[row]
+            matches.append(match)
+        return {'matches': matches}
+
+    def count(self) -> int:
+        self._refresh()
+        return len(self._ids)
+
+    def describe(self) -> str:
+        return f"local:{self.folder} ({self.count()} vectors)"
+
+
+def create_vector_store(dim: int) -> VectorStore:
+    """Vector store selected by VECTOR_BACKEND ('pinecone' or 'local')"""
+    settings = get_settings()
+    backend = settings.VECTOR_BACKEND.lower()
+    if backend == 'local':
+        return LocalVectorStore(settings.VECTOR_INDEX_FOLDER, dim)
+    if backend == 'pinecone':
+        return PineconeStore(settings.PINECONE_API_KEY, settings.PINECONE_INDEX, dim, settings.PINECONE_ENV)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {settings.VECTOR_BACKEND}")
@@ -1,43 +1,75 @@
 """Speech-to-Text using OpenAI Whisper"""
 import os
+import shutil
+from typing import BinaryIO
 from dotenv import load_dotenv
 
+from app.utils.lazy import lazy
+from app.utils.tempfiles import get_temp_space
+
 load_dotenv()
 
 # --- Flexible OpenAI client import ---
 try:
     # New SDK (openai>=1.0.0)
     from openai import OpenAI
-    _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-    def _transcribe(path: str):
-        with open(path, "rb") as f:
-            return _client.audio.transcriptions.create(
-                model="whisper-1",
-                file=f,
-                language="pt"
-            )
+    @lazy
+    def get_stt_client():
+        """OpenAI client, built on first use"""
+        return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def _transcribe(file):
+        return get_stt_client().audio.transcriptions.create(
+            model="whisper-1",
+            file=file,
+            language="pt"
+        )
 
 except ImportError:
     # Fallback for legacy SDK (<1.0.0)
     import openai
-    openai.api_key = os.getenv("OPENAI_API_KEY")
 
-    def _transcribe(path: str):
-        with open(path, "rb") as f:
-            return openai.Audio.transcriptions.create(
-                model="whisper-1",
-                file=f,
-                language="pt"
-            )
+    @lazy
+    def get_stt_client():
+        """Configured legacy openai module, set up on first use"""
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        return openai
 
+    def _transcribe(file):
+        if isinstance(file, tuple):
+            # The legacy SDK only accepts real named files
+            filename, fileobj = file
+            with get_temp_space().job("stt") as job:
+                path = job.path(filename)
+                with open(path, "wb") as f:
+                    shutil.copyfileobj(fileobj, f)
+                with open(path, "rb") as f:
+                    return _transcribe(f)
+        return get_stt_client().Audio.transcriptions.create(
+            model="whisper-1",
+            file=file,
+            language="pt"
+        )
 
-def transcribe_file(path: str) -> str:
-    """Transcribe audio file into text (Portuguese)."""
-    resp = _transcribe(path)
 
+def _response_text(resp) -> str:
     # Defensive handling: resp can be dict or object
     if isinstance(resp, dict):
         return resp.get("text", "")
     return getattr(resp, "text", str(resp))
 
+
+def transcribe_file(path: str) -> str:
+    """Transcribe audio file into text (Portuguese)."""
+    with open(path, "rb") as f:
+        return _response_text(_transcribe(f))
+
+
+def transcribe_fileobj(fileobj: BinaryIO, filename: str = "audio.ogg") -> str:
+    """
+    Transcribe audio from an open binary stream (e.g. a spooled download)
+    without writing it to disk first. The filename extension tells Whisper
+    the audio format.
+    """
+    return _response_text(_transcribe((filename, fileobj)))
@@ -1,7 +1,15 @@
 """Text-to-Speech using ElevenLabs"""
 import os
+import queue
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
 from dotenv import load_dotenv
-from pydub import AudioSegment
+
+from app.core.speech.tts_cache import get_tts_cache, speech_cache_key
+from app.utils.lazy import lazy
+from app.utils.tempfiles import get_temp_space
 
 load_dotenv()
 
@@ -15,60 +23,219 @@ except ImportError:
     import elevenlabs  # old SDK
     from elevenlabs import VoiceSettings
 
+TTS_MODEL = "eleven_multilingual_v2"
+TTS_OUTPUT_FORMAT = "mp3_44100_128"
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.8,
+    "style": 0.0,
+    "use_speaker_boost": True,
+    "speed": 1.0,
+}
 
-def synthesize_to_file(text: str, phone: str, out_dir: str = "materials/temp") -> str:
-    """
-    Generate speech from text using ElevenLabs TTS and save as OGG.
-    Output file: reply_<phone>.ogg
-    """
+# MP3 on stdin -> mono Opus in an Ogg container on stdout (what WhatsApp voice notes use)
+FFMPEG_OPUS_ARGS = [
+    "ffmpeg", "-hide_banner", "-loglevel", "error",
+    "-f", "mp3", "-i", "pipe:0",
+    "-vn", "-ac", "1", "-c:a", "libopus", "-b:a", "32k", "-application", "voip",
+    "-f", "ogg", "pipe:1",
+]
 
-    api_key = os.getenv("ELEVENLABS_API_KEY")
+
+def _voice_id() -> str:
     voice_id = os.getenv("ELEVENLABS_VOICE_ID") or os.getenv("ELEVENLABS_VOICE_NAME")
+    if not voice_id:
+        raise ValueError("❌ Missing ELEVENLABS_VOICE_ID or ELEVENLABS_VOICE_NAME in .env file")
+    return voice_id
+
 
+@lazy
+def get_tts_client():
+    """ElevenLabs client, built once and reused (the old SDK is configured globally)"""
+    api_key = os.getenv("ELEVENLABS_API_KEY")
     if not api_key:
         raise ValueError("❌ Missing ELEVENLABS_API_KEY in .env file")
-    if not voice_id:
-        raise ValueError("❌ Missing ELEVENLABS_VOICE_ID or ELEVENLABS_VOICE_NAME in .env file")
 
-    os.makedirs(out_dir, exist_ok=True)
-    out_file = os.path.join(out_dir, f"reply_{phone}.ogg")
-    tmp_mp3 = os.path.join(out_dir, f"temp_{phone}.mp3")
+    if NEW_SDK:
+        return ElevenLabs(api_key=api_key)
+    elevenlabs.set_api_key(api_key)
+    return elevenlabs
+
+
+def stream_speech_mp3(text: str) -> Iterator[bytes]:
+    """MP3 chunks from ElevenLabs as they are synthesized"""
+    client = get_tts_client()
+    voice_id = _voice_id()
 
     if NEW_SDK:
-        # New ElevenLabs client
-        client = ElevenLabs(api_key=api_key)
-        audio_bytes = client.generate(
+        audio = client.generate(
             text=text,
             voice=voice_id,
-            model="eleven_multilingual_v2",
-            voice_settings=VoiceSettings(
-                stability=0.5,
-                similarity_boost=0.8,
-                style=0.0,
-                use_speaker_boost=True,
-                speed=1.0,
-            ),
-            output_format="mp3_44100_128",
+            model=TTS_MODEL,
+            voice_settings=VoiceSettings(**VOICE_SETTINGS),
+            output_format=TTS_OUTPUT_FORMAT,
+            stream=True,
         )
     else:
-        # Old SDK
-        elevenlabs.set_api_key(api_key)
-        audio_bytes = elevenlabs.generate(
+        audio = client.generate(
             text=text,
             voice=voice_id,
-            model="eleven_multilingual_v2",
-            output_format="mp3_44100_128",
+            model=TTS_MODEL,
+            output_format=TTS_OUTPUT_FORMAT,
+            stream=True,
         )
 
-    # Save MP3
-    with open(tmp_mp3, "wb") as f:
-        f.write(audio_bytes if isinstance(audio_bytes, (bytes, bytearray)) else b"".join(audio_bytes))
+    if isinstance(audio, (bytes, bytearray)):
+        yield bytes(audio)
+    else:
+        yield from audio
+
+
+def transcode_to_opus(mp3_chunks: Iterable[bytes], read_size: int = 16 * 1024) -> Iterator[bytes]:
+    """
+    Pipe MP3 chunks through ffmpeg and yield Ogg/Opus chunks as soon as they
+    are encoded. Nothing touches the disk, and the encoder runs while the
+    source is still streaming.
+    """
+    proc = subprocess.Popen(
+        FFMPEG_OPUS_ARGS,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    feed_errors = []
+
+    def feed():
+        try:
+            for chunk in mp3_chunks:
+                proc.stdin.write(chunk)
+        except BrokenPipeError:
+            pass  # ffmpeg exited; its return code explains why
+        except Exception as e:
+            feed_errors.append(e)
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        while True:
+            data = proc.stdout.read1(read_size)
+            if not data:
+                break
+            yield data
+        writer.join()
+        returncode = proc.wait()
+        if feed_errors:
+            raise feed_errors[0]
+        if returncode != 0:
+            error = proc.stderr.read().decode(errors="replace").strip()
+            raise RuntimeError(f"ffmpeg failed ({returncode}): {error}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
 
-    # Convert MP3 → OGG (WhatsApp-compatible)
-    audio = AudioSegment.from_file(tmp_mp3, format="mp3")
-    audio.export(out_file, format="ogg")
-    os.remove(tmp_mp3)
+def speech_key(text: str) -> str:
+    """Cache key for the voice note of text with the current voice and encoder"""
+    settings = VOICE_SETTINGS if NEW_SDK else {}
+    return speech_cache_key(text, _voice_id(), TTS_MODEL, settings, " ".join(FFMPEG_OPUS_ARGS))
+
+
+def synthesize_stream(text: str) -> Iterator[bytes]:
+    """
+    WhatsApp-compatible Ogg/Opus chunks for text, streamed end to end.
+    Repeated phrases are served from the TTS cache without calling ElevenLabs.
+    """
+    cache = get_tts_cache()
+    if cache is None:
+        yield from transcode_to_opus(stream_speech_mp3(text))
+        return
+
+    key = speech_key(text)
+    path = cache.get(key)
+    if path:
+        yield from cache.read(path)
+    else:
+        yield from cache.store(key, transcode_to_opus(stream_speech_mp3(text)))
+
+
+def synthesize_sentences(sentences: Iterable[str], parallel: int = 3,
+                         cache_key: Optional[Callable[[], Optional[str]]] = None) -> Iterator[bytes]:
+    """
+    One Ogg/Opus voice note for sentences that arrive over time (a reply still
+    being generated). Each sentence is synthesized as soon as it arrives, up to
+    `parallel` at once, and the MP3s are encoded in order by a single ffmpeg,
+    so audio for the first sentence streams out while later ones are pending.
+    With cache_key, the finished clip goes into the TTS cache under the key it
+    returns once the sentences end (None: not cached, e.g. a reply cut short),
+    so the same reply served later from the semantic cache reuses it.
+    """
+    cache = get_tts_cache() if cache_key else None
+    pool = ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix='tts-sentence')
+    futures: queue.Queue = queue.Queue(maxsize=max(1, parallel))  # synthesis runs at most this far ahead
+    source_errors = []
+    stopped = threading.Event()
+
+    def submit_all():
+        try:
+            for sentence in sentences:
+                if stopped.is_set():
+                    continue  # the voice note was abandoned; drain the source without synthesizing
+                futures.put(pool.submit(lambda s=sentence: b"".join(stream_speech_mp3(s))))
+        except Exception as e:
+            source_errors.append(e)
+        finally:
+            futures.put(None)
+
+    def mp3_in_order():
+        while True:
+            future = futures.get()
+            if future is None:
+                break
+            yield future.result()
+        if source_errors:
+            raise source_errors[0]
+
+    threading.Thread(target=submit_all, name='tts-sentences', daemon=True).start()
+    try:
+        clip = transcode_to_opus(mp3_in_order())
+        yield from cache.record(clip, cache_key) if cache else clip
+    finally:
+        stopped.set()
+        # Unblock a submitter waiting on a full queue
+        while not futures.empty():
+            futures.get_nowait()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def synthesize_bytes(text: str) -> bytes:
+    """Whole Ogg/Opus clip for text, encoded in memory"""
+    return b"".join(synthesize_stream(text))
+
+
+def synthesize_to_file(text: str, phone: str, out_dir: Optional[str] = None) -> str:
+    """
+    Generate speech from text using ElevenLabs TTS and save as OGG.
+    Output file: <out_dir>/reply_<phone>.ogg, or a unique reply_<phone>_*.ogg
+    in the temp space when no out_dir is given. The caller deletes it.
+    """
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        out_file = os.path.join(out_dir, f"reply_{phone}.ogg")
+    else:
+        fd, out_file = get_temp_space().mkstemp(prefix=f"reply_{phone}_", suffix=".ogg")
+        os.close(fd)
+
+    with open(out_file, "wb") as f:
+        for chunk in synthesize_stream(text):
+            f.write(chunk)
 
     print(f"✅ Audio saved to {out_file}")
     return out_file
-
@@ -0,0 +1,209 @@
+"""Content-addressed cache of synthesized voice notes"""
+import os
+import time
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from typing import Callable, Iterable, Iterator, Optional
+
+from app.config import get_settings
+from app.utils.db import connect
+from app.utils.text import normalize_text
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def speech_cache_key(text: str, voice_id: str, model: str, settings: dict, encoder: str = '') -> str:
+    """
+    Hash of everything that decides what a clip sounds like. Text is NFC- and
+    whitespace-normalized so near-verbatim repeats share a clip.
+    """
+    text = unicodedata.normalize('NFC', normalize_text(text))
+    parts = [text, voice_id, model, repr(sorted(settings.items())), encoder]
+    return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+
+class TTSCache:
+    """
+    Encoded OGG clips on disk, indexed in SQLite by content key, evicted
+    least-recently-used first once they exceed max_bytes. Each clip also
+    remembers the WhatsApp media id it was last uploaded as.
+    """
+
+    def __init__(self, folder: str, max_bytes: int, media_ttl_seconds: int):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.media_ttl = media_ttl_seconds
+        os.makedirs(folder, exist_ok=True)
+        self.conn = connect(os.path.join(folder, 'index.db'))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.media_hits = 0
+        self.evicted = 0
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS clips (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                media_id TEXT,
+                uploaded_at REAL
+            )
+        """)
+        self._remove_partials()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.ogg")
+
+    def _remove_partials(self, max_age: int = 3600):
+        """Drop clips left half-written by a crashed process"""
+        now = time.time()
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.part') and now - entry.stat().st_mtime > max_age:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached clip, or None if it must be synthesized"""
+        path = self._path(key)
+        with self._lock:
+            row = self.conn.execute("SELECT key FROM clips WHERE key = ?", (key,)).fetchone()
+            if row and os.path.exists(path):
+                self.conn.execute("UPDATE clips SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.hits += 1
+                return path
+            if row:
+                # File removed behind our back
+                self.conn.execute("DELETE FROM clips WHERE key = ?", (key,))
+            self.misses += 1
+        return None
+
+    def read(self, path: str) -> Iterator[bytes]:
+        """Chunks of a cached clip"""
+        with open(path, 'rb') as f:
+            yield from iter(lambda: f.read(READ_CHUNK_SIZE), b'')
+
+    def store(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Pass chunks through while writing them to the cache. The clip is only
+        kept if the stream runs to completion.
+        """
+        return self.record(chunks, lambda: key)
+
+    def record(self, chunks: Iterable[bytes], key: Callable[[], Optional[str]]) -> Iterator[bytes]:
+        """
+        Like store(), for a clip whose key is only known once it is complete
+        (a voice note synthesized while its text is still being written).
+        key() is called when the stream ends; None discards the clip.
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix='clip_', suffix='.part', dir=self.folder)
+        complete = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            final_key = key() if complete else None
+            if final_key:
+                self._commit(final_key, tmp_path)
+            else:
+                os.remove(tmp_path)
+
+    def _commit(self, key: str, tmp_path: str):
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, self._path(key))
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO clips (key, size, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, size, now, now)
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Delete least recently used clips until the cache fits max_bytes"""
+        removed = 0
+        with self._lock:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM clips").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            for row in self.conn.execute("SELECT key, size FROM clips ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM clips WHERE key = ?", (row['key'],))
+                try:
+                    os.remove(self._path(row['key']))
+                except FileNotFoundError:
+                    pass
+                total -= row['size']
+                removed += 1
+            self.evicted += removed
+        return removed
+
+    def media_id(self, key: str) -> Optional[str]:
+        """WhatsApp media id of the cached clip, if it was uploaded recently enough"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT media_id, uploaded_at FROM clips WHERE key = ? AND media_id IS NOT NULL", (key,)
+            ).fetchone()
+            if not row or row['uploaded_at'] + self.media_ttl < time.time():
+                return None
+            if not os.path.exists(self._path(key)):
+                return None
+            self.conn.execute("UPDATE clips SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.media_hits += 1
+        return row['media_id']
+
+    def set_media_id(self, key: str, media_id: str):
+        """Remember the media id a cached clip was uploaded as"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE clips SET media_id = ?, uploaded_at = ? WHERE key = ?",
+                (media_id, time.time(), key)
+            )
+
+    def forget_media_id(self, key: str):
+        """Forget a media id the platform no longer accepts; the clip itself is kept"""
+        with self._lock:
+            self.conn.execute("UPDATE clips SET media_id = NULL, uploaded_at = NULL WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        """Size and hit counters"""
+        with self._lock:
+            row = self.conn.execute("SELECT COUNT(*) AS clips, COALESCE(SUM(size), 0) AS bytes FROM clips").fetchone()
+        total = self.hits + self.misses
+        return {
+            'clips': row['clips'],
+            'bytes': row['bytes'],
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'media_id_hits': self.media_hits,
+            'evicted': self.evicted,
+        }
+
+
+# Singleton instance
+_tts_cache = None
+
+
+def get_tts_cache() -> Optional[TTSCache]:
+    """Get TTS cache singleton, or None when the cache is disabled"""
+    global _tts_cache
+    settings = get_settings()
+    if not settings.TTS_CACHE_ENABLED:
+        return None
+    if _tts_cache is None:
+        _tts_cache = TTSCache(
+            os.path.join(settings.DATA_FOLDER, 'tts_cache'),
+            max_bytes=settings.TTS_CACHE_MAX_MB * 1024 * 1024,
+            media_ttl_seconds=settings.MEDIA_ID_TTL_SECONDS
+        )
+    return _tts_cache
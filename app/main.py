@@ -3,11 +3,16 @@ FastAPI application entry point
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
 
 from app.config import get_settings, ensure_folders
 from app.api.routes import webhook, health
-from app.core.kb.manager import init_pinecone_if_needed
+from app.services.warmup import start_background_warmup
+from app.services.whatsapp import get_whatsapp_client, get_async_whatsapp_client
+from app.services.queue import get_worker_pool
+from app.core.kb.archive import get_chat_archiver
+from app.core.ai.memory import get_conversation_memory
 
 # Configure logging
 logging.basicConfig(
@@ -51,13 +56,15 @@ async def startup_event():
     ensure_folders()
     logger.info("✅ Folders initialized")
     
-    # Initialize Pinecone
-    try:
-        init_pinecone_if_needed()
-        logger.info("✅ Pinecone initialized")
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize Pinecone: {e}")
-        raise
+    # Connect to the external APIs without holding up startup; anything that
+    # fails here is built again on first use
+    if settings.WARMUP_ON_STARTUP:
+        start_background_warmup()
+        logger.info("✅ Client warmup started")
+    
+    # Start queue workers
+    await get_worker_pool().start()
+    logger.info("✅ Queue workers started")
     
     logger.info(f"🚀 Application started successfully on {settings.HOST}:{settings.PORT}")
 
@@ -66,6 +73,20 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down application...")
+    
+    # Finish in-flight jobs; anything unfinished is requeued for the next start
+    await get_worker_pool().stop()
+    
+    # Archive the chat turns still buffered (after the workers, which add to it)
+    await asyncio.to_thread(get_chat_archiver().close)
+    
+    # Let pending conversation summaries finish
+    if get_conversation_memory():
+        await asyncio.to_thread(get_conversation_memory().close)
+    
+    # Close pooled WhatsApp connections
+    get_whatsapp_client().close()
+    await get_async_whatsapp_client().aclose()
 
 
 if __name__ == "__main__":
@@ -16,10 +16,11 @@ class WebhookMessage(BaseModel):
 
 class WebhookValue(BaseModel):
     """WhatsApp webhook value structure"""
-    messaging_product: str
-    metadata: Dict[str, Any]
+    messaging_product: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
     contacts: Optional[List[Dict[str, Any]]] = None
     messages: Optional[List[Dict[str, Any]]] = None
+    statuses: Optional[List[Dict[str, Any]]] = None
     
     class Config:
         extra = "allow"
@@ -27,18 +28,29 @@ class WebhookValue(BaseModel):
 
 class WebhookChange(BaseModel):
     """WhatsApp webhook change structure"""
-    value: Dict[str, Any]
+    value: WebhookValue
     field: str
 
 
 class WebhookEntry(BaseModel):
     """WhatsApp webhook entry structure"""
     id: str
-    changes: List[Dict[str, Any]]
+    changes: List[WebhookChange]
 
 
 class WebhookRequest(BaseModel):
     """WhatsApp webhook request structure"""
     object: str
-    entry: List[Dict[str, Any]]
-
+    entry: List[WebhookEntry]
+    
+    def values(self) -> List[WebhookValue]:
+        """All change values across every entry of the delivery"""
+        return [change.value for entry in self.entry for change in entry.changes]
+    
+    def messages(self) -> List[Dict[str, Any]]:
+        """Every inbound message in the delivery, in delivery order"""
+        return [msg for value in self.values() for msg in (value.messages or [])]
+    
+    def statuses(self) -> List[Dict[str, Any]]:
+        """Every message status update (sent/delivered/read/failed) in the delivery"""
+        return [status for value in self.values() for status in (value.statuses or [])]
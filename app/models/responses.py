@@ -15,6 +15,7 @@ class HealthResponse(BaseModel):
     status: str
     version: str
     services: dict
+    metrics: Optional[dict] = None
 
 
 class WebhookResponse(BaseModel):
@@ -22,4 +23,6 @@ class WebhookResponse(BaseModel):
     status: str
     media_sent: Optional[int] = None
     message: Optional[str] = None
+    queued: Optional[int] = None
+    statuses: Optional[int] = None
 
@@ -0,0 +1,106 @@
+"""Webhook deduplication keyed by WhatsApp message id"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import get_settings
+from app.utils.db import connect
+
+
+class DedupStore:
+    """
+    Bounded, TTL-evicting record of message ids already accepted.
+    An in-process LRU answers repeats without I/O; the optional SQLite table
+    makes the check atomic across uvicorn workers.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 86400, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self.hits = 0
+        self.misses = 0
+        self.conn = None
+        if db_path:
+            self.conn = connect(db_path)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS seen_messages (id TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+            )
+
+    def is_duplicate(self, message_id: str) -> bool:
+        """Record the id and report whether it was already seen within the TTL"""
+        now = time.time()
+        cutoff = now - self.ttl
+        with self._lock:
+            seen_at = self._seen.get(message_id)
+            if seen_at is not None and seen_at >= cutoff:
+                self._seen.move_to_end(message_id)
+                self.hits += 1
+                return True
+
+            if self.conn is not None and not self._claim_shared(message_id, now, cutoff):
+                self._remember(message_id, now)
+                self.hits += 1
+                return True
+
+            self._remember(message_id, now)
+            self.misses += 1
+            return False
+
+    def release(self, message_ids: list):
+        """Forget ids whose messages could not be queued, so their redelivery is accepted"""
+        with self._lock:
+            for message_id in message_ids:
+                self._seen.pop(message_id, None)
+            if self.conn is not None:
+                self.conn.executemany("DELETE FROM seen_messages WHERE id = ?", [(m,) for m in message_ids])
+
+    def _claim_shared(self, message_id: str, now: float, cutoff: float) -> bool:
+        """Insert the id (or refresh an expired one); False if another worker holds it"""
+        cur = self.conn.execute(
+            """INSERT INTO seen_messages (id, seen_at) VALUES (?, ?)
+               ON CONFLICT(id) DO UPDATE SET seen_at = excluded.seen_at WHERE seen_at < ?""",
+            (message_id, now, cutoff)
+        )
+        self._inserts += 1
+        if self._inserts % 1000 == 0:
+            self.conn.execute("DELETE FROM seen_messages WHERE seen_at < ?", (cutoff,))
+        return cur.rowcount > 0
+
+    def _remember(self, message_id: str, now: float):
+        self._seen[message_id] = now
+        self._seen.move_to_end(message_id)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'size': len(self._seen),
+        }
+
+
+# Singleton instance
+_dedup_store = None
+
+
+def get_dedup_store() -> DedupStore:
+    """Get dedup store singleton"""
+    global _dedup_store
+    if _dedup_store is None:
+        settings = get_settings()
+        db_path = os.path.join(settings.DATA_FOLDER, 'dedup.db') if settings.DEDUP_PERSIST else None
+        _dedup_store = DedupStore(
+            max_entries=settings.DEDUP_MAX_ENTRIES,
+            ttl_seconds=settings.DEDUP_TTL_SECONDS,
+            db_path=db_path
+        )
+    return _dedup_store
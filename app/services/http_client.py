@@ -0,0 +1,125 @@
+"""Pooled HTTP clients with timeouts and retries for outbound API calls"""
+import time
+import uuid
+import random
+import asyncio
+import importlib.util
+from typing import Optional, Tuple
+
+import httpx
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Methods a repeat cannot change the outcome of
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Errors raised before the request reached the server, so a retry can never
+# duplicate a message, whatever the method
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# HTTP/2 needs the optional h2 package (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+def _pool_options(pool_size: int, timeout: float, connect_timeout: float) -> dict:
+    return {
+        'http2': HTTP2_AVAILABLE,
+        'limits': httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=60.0,
+        ),
+        'timeout': httpx.Timeout(timeout, connect=connect_timeout),
+    }
+
+
+def build_client(pool_size: int = 20, timeout: float = 30.0, connect_timeout: float = 5.0) -> httpx.Client:
+    """Keep-alive connection pool for blocking callers"""
+    return httpx.Client(**_pool_options(pool_size, timeout, connect_timeout))
+
+
+def build_async_client(pool_size: int = 20, timeout: float = 30.0, connect_timeout: float = 5.0) -> httpx.AsyncClient:
+    """Keep-alive connection pool for asyncio callers"""
+    return httpx.AsyncClient(**_pool_options(pool_size, timeout, connect_timeout))
+
+
+def multipart_envelope(field: str, filename: str, content_type: str,
+                       fields: Optional[dict] = None) -> Tuple[str, bytes, bytes]:
+    """
+    Content-Type header plus the bytes that go before and after a single file
+    part, so the file itself can be streamed in between as it is produced.
+    """
+    boundary = uuid.uuid4().hex
+    head = b''.join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in (fields or {}).items()
+    )
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+    return f'multipart/form-data; boundary={boundary}', head, tail
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 10.0, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when the server sends one"""
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def should_retry(method: str, r: httpx.Response, idempotent: Optional[bool] = None) -> bool:
+    """
+    Whether a response is worth retrying. A 502/504 to a POST may come from a
+    gateway after the API accepted the message, so a POST (sending a message)
+    is only retried when it was refused outright: 429, or 503 with Retry-After.
+    idempotent=True marks a POST that is safe to repeat (a media upload).
+    """
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    if idempotent:
+        return r.status_code in RETRY_STATUSES
+    return r.status_code == 429 or (r.status_code == 503 and 'Retry-After' in r.headers)
+
+
+def request(client: httpx.Client, method: str, url: str, max_retries: int = 3,
+            backoff: float = 0.5, idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+    """Send a request, retrying connection failures and the responses should_retry() allows"""
+    for attempt in range(max_retries + 1):
+        try:
+            r = client.request(method, url, **kwargs)
+        except RETRY_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt, backoff)
+            print(f"⚠️ {method} {url} failed ({e!r}), retrying in {delay:.2f}s")
+        else:
+            if not should_retry(method, r, idempotent) or attempt == max_retries:
+                return r
+            delay = backoff_delay(attempt, backoff, retry_after=r.headers.get('Retry-After'))
+            print(f"⚠️ {method} {url} returned {r.status_code}, retrying in {delay:.2f}s")
+        time.sleep(delay)
+
+
+async def arequest(client: httpx.AsyncClient, method: str, url: str, max_retries: int = 3,
+                   backoff: float = 0.5, idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+    """Async variant of request()"""
+    for attempt in range(max_retries + 1):
+        try:
+            r = await client.request(method, url, **kwargs)
+        except RETRY_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt, backoff)
+            print(f"⚠️ {method} {url} failed ({e!r}), retrying in {delay:.2f}s")
+        else:
+            if not should_retry(method, r, idempotent) or attempt == max_retries:
+                return r
+            delay = backoff_delay(attempt, backoff, retry_after=r.headers.get('Retry-After'))
+            print(f"⚠️ {method} {url} returned {r.status_code}, retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
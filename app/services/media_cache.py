@@ -0,0 +1,99 @@
+"""Persistent cache of uploaded WhatsApp media ids"""
+import os
+import time
+import threading
+from typing import Optional
+
+from app.config import get_settings
+from app.utils.db import connect
+from app.utils.files import file_sha256
+
+
+class MediaIdCache:
+    """
+    Maps a local file (path, content hash, mtime) to the WhatsApp media id it
+    was uploaded as. Ids expire with the platform's media retention window.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int):
+        self.ttl = ttl_seconds
+        self.conn = connect(db_path)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS media_ids (
+                path TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                media_id TEXT NOT NULL,
+                uploaded_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, file_path: str) -> Optional[str]:
+        """Media id for the file's current content, or None if it must be uploaded"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM media_ids WHERE path = ?", (path,)).fetchone()
+        media_id = self._valid_id(path, row) if row else None
+        if media_id:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return media_id
+
+    def _valid_id(self, path: str, row) -> Optional[str]:
+        if row['uploaded_at'] + self.ttl < time.time():
+            return None
+        st = os.stat(path)
+        if st.st_mtime == row['mtime'] and st.st_size == row['size']:
+            return row['media_id']
+        # Touched or rewritten: only the content decides
+        if st.st_size == row['size'] and file_sha256(path) == row['sha256']:
+            with self._lock:
+                self.conn.execute("UPDATE media_ids SET mtime = ? WHERE path = ?", (st.st_mtime, path))
+            return row['media_id']
+        return None
+
+    def put(self, file_path: str, media_id: str):
+        """Remember the media id a file was just uploaded as"""
+        path = os.path.abspath(file_path)
+        st = os.stat(path)
+        digest = file_sha256(path)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO media_ids (path, sha256, mtime, size, media_id, uploaded_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, digest, st.st_mtime, st.st_size, media_id, time.time())
+            )
+
+    def invalidate(self, file_path: str):
+        """Forget a media id the platform no longer accepts"""
+        with self._lock:
+            self.conn.execute("DELETE FROM media_ids WHERE path = ?", (os.path.abspath(file_path),))
+
+    def stats(self) -> dict:
+        """Hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# Singleton instance
+_media_cache = None
+
+
+def get_media_cache() -> MediaIdCache:
+    """Get media id cache singleton"""
+    global _media_cache
+    if _media_cache is None:
+        settings = get_settings()
+        _media_cache = MediaIdCache(
+            os.path.join(settings.DATA_FOLDER, 'media_ids.db'),
+            ttl_seconds=settings.MEDIA_ID_TTL_SECONDS
+        )
+    return _media_cache
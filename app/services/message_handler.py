@@ -1,16 +1,34 @@
 """Message handling orchestration"""
 import os
+import time
+import queue
 import random
+import asyncio
 from typing import Optional, Tuple
 
 from app.config import get_settings
-from app.core.ai.llm import generate_ai_response
-from app.core.speech.stt import transcribe_file
-from app.core.speech.tts import synthesize_to_file
-from app.core.kb.manager import add_chat_to_kb
+from app.core.ai.llm import astream_ai_response, generate_ai_response
+from app.core.ai.memory import get_conversation_memory
+from app.core.ai.semantic_cache import get_semantic_cache
+from app.core.speech.stt import transcribe_fileobj
+from app.core.speech.tts import synthesize_sentences, synthesize_stream, speech_key
+from app.core.speech.tts_cache import get_tts_cache
+from app.core.kb.archive import get_chat_archiver
+from app.core.kb.context import RetrievalContext
 from app.core.kb.retriever import get_retriever
-from app.services.whatsapp import get_whatsapp_client
+from app.services.whatsapp import get_whatsapp_client, get_async_whatsapp_client
 from app.services.payment import get_payment_service
+from app.utils.files import get_audio_extension
+from app.utils.aio import aiter_in_thread
+from app.utils.text import SentenceSegmenter
+
+
+class ReplyAlreadySent(RuntimeError):
+    """Processing failed after (part of) the reply reached the customer, so it must not be retried"""
+
+
+def _delivered(send: Optional[asyncio.Future]) -> bool:
+    return send is not None and send.done() and not send.cancelled() and send.exception() is None
 
 
 class MessageHandler:
@@ -19,8 +37,14 @@ class MessageHandler:
     def __init__(self):
         self.settings = get_settings()
         self.whatsapp = get_whatsapp_client()
+        self.whatsapp_async = get_async_whatsapp_client()
         self.payment = get_payment_service()
         self.retriever = get_retriever()
+        self.tts_cache = get_tts_cache()
+        self.archiver = get_chat_archiver()
+        self.memory = get_conversation_memory()
+        self.semantic_cache = get_semantic_cache()
+        self._slots = asyncio.Semaphore(self.settings.MAX_CONCURRENT_MESSAGES)
     
     def extract_user_text(self, message: dict) -> Tuple[Optional[str], Optional[str]]:
         """
@@ -34,12 +58,10 @@ class MessageHandler:
         
         elif msg_type == 'audio':
             try:
-                media_id = message['audio']['id']
-                path = self.whatsapp.download_media_file(
-                    media_id,
-                    out_path=os.path.join(self.settings.TEMP_FOLDER, 'input.ogg')
-                )
-                user_text = transcribe_file(path)
+                audio = message['audio']
+                with self.whatsapp.download_media(audio['id']) as buf:
+                    filename = f"audio.{get_audio_extension(audio.get('mime_type'))}"
+                    user_text = transcribe_fileobj(buf, filename)
                 return user_text, None
             except Exception as e:
                 print("Audio transcription error:", e)
@@ -47,9 +69,10 @@ class MessageHandler:
         
         return None, None
     
-    def get_relevant_media(self, user_text: str) -> list:
-        """Get relevant media files from KB"""
-        docs = self.retriever.get_relevant_documents(user_text)
+    def get_relevant_media(self, user_text: str, docs: Optional[list] = None) -> list:
+        """Get relevant media files from KB (or from docs already retrieved for this turn)"""
+        if docs is None:
+            docs = self.retriever.get_relevant_documents(user_text)
         media_files = [
             d.metadata.get('file_path')
             for d in docs
@@ -62,17 +85,35 @@ class MessageHandler:
         # Send text
         self.whatsapp.send_text(phone, ai_reply)
         
-        # Send TTS audio
+        # Send TTS audio, uploaded as it is synthesized (nothing is written to disk)
         try:
-            audio_path = synthesize_to_file(
-                ai_reply,
-                phone=phone,
-                out_dir=self.settings.TEMP_FOLDER
-            )
-            self.whatsapp.send_audio(phone, audio_path)
+            self.send_speech(phone, ai_reply)
         except Exception as e:
             print('TTS/send audio error:', e)
     
+    def upload_speech(self, text: str) -> dict:
+        """Upload response for the voice note of text; repeated phrases reuse the cached media id"""
+        key = speech_key(text) if self.tts_cache else None
+        media_id = self.tts_cache.media_id(key) if key else None
+        if media_id:
+            return {'id': media_id, 'cached': True}
+        
+        up = self.whatsapp.upload_media_stream(synthesize_stream(text))
+        if key and up.get('id'):
+            self.tts_cache.set_media_id(key, up['id'])
+        return up
+    
+    def send_speech(self, phone: str, text: str, up: Optional[dict] = None):
+        """Send text as a voice note, re-uploading once if a cached media id is rejected"""
+        up = up or self.upload_speech(text)
+        if up.get('cached'):
+            if self.whatsapp.send_cached_audio(phone, up['id']) is not None:
+                return
+            print('cached voice note rejected, re-uploading')
+            self.tts_cache.forget_media_id(speech_key(text))
+            up = self.upload_speech(text)
+        self.whatsapp.send_uploaded_audio(phone, up)
+    
     def send_media_files(self, phone: str, media_files: list) -> int:
         """Send relevant media files"""
         sent = 0
@@ -96,8 +137,8 @@ class MessageHandler:
         
         return sent
     
-    def detect_buying_intent(self, user_text: str, phone: str) -> bool:
-        """Detect if user wants to buy and send payment link"""
+    def buying_intent_reply(self, user_text: str) -> Optional[str]:
+        """Payment link message if the user wants to buy, else None"""
         buying_keywords = [
             'quero comprar', 'vou comprar', 'fechar pedido',
             'me manda o link', 'link de pagamento', 'como pagar', 'onde pago'
@@ -105,23 +146,31 @@ class MessageHandler:
         
         if any(kw in user_text.lower() for kw in buying_keywords):
             link = self.payment.get_payment_link(price_objection=False)
-            self.whatsapp.send_text(
-                phone,
-                f'Perfeito! Aqui está o link para finalizar sua compra: {link}'
-            )
-            return True
-        return False
+            return f'Perfeito! Aqui está o link para finalizar sua compra: {link}'
+        return None
     
-    def handle_price_objection(self, user_text: str, phone: str) -> bool:
-        """Handle price objections with discounted links"""
+    def price_objection_reply(self, user_text: str) -> Optional[str]:
+        """Discounted link message if the user objects to the price, else None"""
         price_keywords = ['caro', 'preço', 'muito caro']
         
         if any(kw in user_text.lower() for kw in price_keywords):
             link = self.payment.get_payment_link(price_objection=True, max_discount=False)
-            self.whatsapp.send_text(
-                phone,
-                f'Entendo que o preço é uma preocupação. Posso te oferecer essa condição especial: {link}'
-            )
+            return f'Entendo que o preço é uma preocupação. Posso te oferecer essa condição especial: {link}'
+        return None
+    
+    def detect_buying_intent(self, user_text: str, phone: str) -> bool:
+        """Detect if user wants to buy and send payment link"""
+        reply = self.buying_intent_reply(user_text)
+        if reply:
+            self.whatsapp.send_text(phone, reply)
+            return True
+        return False
+    
+    def handle_price_objection(self, user_text: str, phone: str) -> bool:
+        """Handle price objections with discounted links"""
+        reply = self.price_objection_reply(user_text)
+        if reply:
+            self.whatsapp.send_text(phone, reply)
             return True
         return False
     
@@ -141,17 +190,20 @@ class MessageHandler:
             self.whatsapp.send_text(phone, 'Desculpe, não entendi. Pode repetir, por favor?')
             return {'status': 'no_input'}
         
+        # Retrieve once; media selection and the answer share the same documents
+        context = RetrievalContext(user_text, self.retriever)
+        
         # Get relevant media from KB
-        media_files = self.get_relevant_media(user_text)
+        media_files = self.get_relevant_media(user_text, context.docs)
         
-        # Generate AI response
-        ai_reply = generate_ai_response(user_text)
+        # Generate AI response with the customer's conversation so far
+        history = self.memory.history(phone) if self.memory else ""
+        ai_reply = generate_ai_response(user_text, docs=context.docs, history=history)
+        if self.memory:
+            self.memory.add_turn(phone, user_text, ai_reply)
         
-        # Archive conversation
-        try:
-            add_chat_to_kb(user_text, ai_reply, phone)
-        except Exception as e:
-            print('Warning: failed to archive chat:', e)
+        # Archive conversation (queued; embedded in batches in the background)
+        self.archiver.add(user_text, ai_reply, phone)
         
         # Send reply (text + audio)
         self.send_reply(phone, ai_reply)
@@ -167,6 +219,259 @@ class MessageHandler:
         self.handle_price_objection(user_text, phone)
         
         return {'status': 'ok', 'media_sent': sent_media}
+    
+    def handle_status(self, status: dict):
+        """Handle a delivery status update for a message we sent"""
+        if status.get('status') == 'failed':
+            errors = status.get('errors') or []
+            details = '; '.join(f"{e.get('code')}: {e.get('title')}" for e in errors)
+            print(f"⚠️ Message {status.get('id')} to {status.get('recipient_id')} failed: {details}")
+    
+    # -------------------
+    # Async pipeline
+    # -------------------
+    async def aextract_user_text(self, message: dict) -> Tuple[Optional[str], Optional[str]]:
+        """Async variant of extract_user_text; transcription runs in a worker thread"""
+        msg_type = message.get('type')
+        
+        if msg_type == 'text':
+            return message['text']['body'], None
+        
+        elif msg_type == 'audio':
+            try:
+                # Voice notes stay in memory; only oversized audio spills to a temp file
+                audio = message['audio']
+                with await self.whatsapp_async.download_media(audio['id']) as buf:
+                    filename = f"audio.{get_audio_extension(audio.get('mime_type'))}"
+                    user_text = await asyncio.to_thread(transcribe_fileobj, buf, filename)
+                return user_text, None
+            except Exception as e:
+                print("Audio transcription error:", e)
+                return None, "Desculpe, não consegui processar o áudio."
+        
+        return None, None
+    
+    async def asend_reply(self, phone: str, ai_reply: str):
+        """Send text and audio reply; TTS is synthesized and uploaded while the text is being sent"""
+        text_result, upload = await asyncio.gather(
+            self.whatsapp_async.send_text(phone, ai_reply),
+            self.aupload_speech(ai_reply),
+            return_exceptions=True
+        )
+        if isinstance(text_result, Exception):
+            raise text_result
+        
+        # The audio message goes out after the text so the order stays the same
+        try:
+            if isinstance(upload, Exception):
+                raise upload
+            await self.asend_speech(phone, ai_reply, upload)
+        except Exception as e:
+            print('TTS/send audio error:', e)
+    
+    async def astream_reply(self, phone: str, user_text: str, docs: list, history: str = "") -> Tuple[str, bool]:
+        """
+        Generate and send the reply while it is being written.
+        The first sentence goes out as a text as soon as it is complete and the
+        rest follows in a second text when generation ends. Each sentence is
+        sent to TTS as it completes; the voice note, uploaded while it is
+        encoded, follows the text, and a complete reply's clip and media id go
+        into the TTS cache. Returns the reply sent and whether
+        generation completed (False when the stream broke after the first
+        sentence and only part of the answer went out). Errors after the first
+        text was delivered are raised as ReplyAlreadySent.
+        """
+        sentences: queue.Queue = queue.Queue()
+        key = None  # TTS cache key, set before the sentences end once the reply is known to be complete
+        upload = asyncio.ensure_future(self.whatsapp_async.upload_media_stream(aiter_in_thread(
+            synthesize_sentences(iter(sentences.get, None), self.settings.TTS_PARALLEL_SENTENCES,
+                                 cache_key=(lambda: key) if self.tts_cache else None)
+        )))
+        segmenter = SentenceSegmenter(min_chars=self.settings.REPLY_MIN_SENTENCE_CHARS)
+        reply, first, first_send, completed = '', None, None, True
+        try:
+            try:
+                async for piece in astream_ai_response(user_text, docs, history):
+                    reply += piece
+                    for sentence in segmenter.feed(piece):
+                        sentences.put(sentence)
+                        if first is None:
+                            first = sentence
+                            first_send = asyncio.ensure_future(self.whatsapp_async.send_text(phone, sentence))
+            except Exception as e:
+                if first is None:
+                    raise
+                # The customer already has the start of the answer; send what was generated
+                print(f'⚠️ reply stream interrupted after {len(reply)} chars:', e)
+                completed = False
+            for sentence in segmenter.flush():
+                sentences.put(sentence)
+            reply = reply.strip()
+            if completed and self.tts_cache:
+                key = speech_key(reply)
+            sentences.put(None)
+            
+            if first_send is None:
+                await self.whatsapp_async.send_text(phone, reply)
+            else:
+                await first_send
+                rest = reply[len(first):].strip()
+                if rest:
+                    await self.whatsapp_async.send_text(phone, rest)
+            
+            try:
+                up = await upload
+                if key and up.get('id'):
+                    await asyncio.to_thread(self.tts_cache.set_media_id, key, up['id'])
+                await self.whatsapp_async.send_uploaded_audio(phone, up)
+            except Exception as e:
+                print('TTS/send audio error:', e)
+        except Exception as e:
+            if _delivered(first_send):
+                raise ReplyAlreadySent(f'reply partly sent: {e}') from e
+            raise
+        finally:
+            # On errors and cancellation: end the sentence source so the TTS
+            # thread exits, and stop the sends and the upload still running
+            sentences.put(None)
+            if first_send is not None and not first_send.done():
+                first_send.cancel()
+            if not upload.done():
+                upload.cancel()
+                await asyncio.gather(upload, return_exceptions=True)
+        return reply, completed
+    
+    async def aupload_speech(self, text: str) -> dict:
+        """Async variant of upload_speech; synthesis and cache lookups run in worker threads"""
+        key = await asyncio.to_thread(speech_key, text) if self.tts_cache else None
+        media_id = await asyncio.to_thread(self.tts_cache.media_id, key) if key else None
+        if media_id:
+            return {'id': media_id, 'cached': True}
+        
+        up = await self.whatsapp_async.upload_media_stream(aiter_in_thread(synthesize_stream(text)))
+        if key and up.get('id'):
+            await asyncio.to_thread(self.tts_cache.set_media_id, key, up['id'])
+        return up
+    
+    async def asend_speech(self, phone: str, text: str, up: Optional[dict] = None):
+        """Async variant of send_speech"""
+        up = up or await self.aupload_speech(text)
+        if up.get('cached'):
+            if await self.whatsapp_async.send_cached_audio(phone, up['id']) is not None:
+                return
+            print('cached voice note rejected, re-uploading')
+            await asyncio.to_thread(self.tts_cache.forget_media_id, speech_key(text))
+            up = await self.aupload_speech(text)
+        await self.whatsapp_async.send_uploaded_audio(phone, up)
+    
+    async def asend_media_files(self, phone: str, media_files: list) -> int:
+        """Send relevant media files"""
+        sent = 0
+        for mf in media_files:
+            if mf and os.path.exists(mf):
+                try:
+                    await self.whatsapp_async.send_media(phone, mf)
+                    sent += 1
+                except Exception as e:
+                    print('send_media error', e)
+        
+        # 30% chance to send fallback media if nothing sent
+        if sent == 0 and random.random() < 0.3:
+            fallback = os.path.join(self.settings.MEDIA_FOLDER, 'before_after.jpg')
+            if os.path.exists(fallback):
+                try:
+                    await self.whatsapp_async.send_media(phone, fallback)
+                    sent += 1
+                except Exception as e:
+                    print('fallback media error', e)
+        
+        return sent
+    
+    async def aprocess_message(self, phone: str, message: dict) -> dict:
+        """
+        Async message processing pipeline
+        Network stages are awaited, blocking SDK calls run in worker threads and
+        at most MAX_CONCURRENT_MESSAGES messages are processed at once.
+        Failures after the reply went out raise ReplyAlreadySent.
+        Returns: status dict
+        """
+        async with self._slots:
+            user_text, error = await self.aextract_user_text(message)
+            
+            if error:
+                await self.whatsapp_async.send_text(phone, error)
+                return {'status': 'error', 'message': error}
+            
+            if not user_text:
+                await self.whatsapp_async.send_text(phone, 'Desculpe, não entendi. Pode repetir, por favor?')
+                return {'status': 'no_input'}
+            
+            # Retrieve once; media selection and the answer share the same documents.
+            # Retrieval runs in a worker thread while the history is loaded and
+            # the semantic cache consulted
+            context = RetrievalContext(user_text, self.retriever)
+            context.prefetch()
+            history = await asyncio.to_thread(self.memory.history, phone) if self.memory else ""
+            
+            # A question seen before, asked without prior conversation, is answered
+            # without waiting for retrieval or the LLM
+            cache = self.semantic_cache if not history else None
+            cached = await asyncio.to_thread(cache.lookup, user_text) if cache else None
+            if cached and cached.answer:
+                ai_reply, completed = cached.answer, False  # nothing new to store
+                await self.asend_reply(phone, ai_reply)
+            else:
+                docs = await context.adocs()
+                start = time.perf_counter()
+                if self.settings.LLM_STREAMING:
+                    # Text and audio go out while the reply is generated
+                    ai_reply, completed = await self.astream_reply(phone, user_text, docs, history)
+                    seconds = time.perf_counter() - start
+                else:
+                    ai_reply = await asyncio.to_thread(generate_ai_response, user_text, docs, history,
+                                                       use_cache=False)
+                    seconds, completed = time.perf_counter() - start, True
+                    await self.asend_reply(phone, ai_reply)
+            
+            try:
+                # A reply cut short must not be served to everyone who asks the same
+                if cache and completed:
+                    await asyncio.to_thread(cache.store, user_text, ai_reply, seconds, cached.vector)
+                return await self._afinish_turn(phone, user_text, ai_reply, context)
+            except Exception as e:
+                # The customer has the reply; running the job again would send it twice
+                raise ReplyAlreadySent(f'failed after the reply was sent: {e}') from e
+    
+    async def _afinish_turn(self, phone: str, user_text: str, ai_reply: str, context: RetrievalContext) -> dict:
+        """Record the turn, then send media and payment links once the reply is out"""
+        if self.memory:
+            await asyncio.to_thread(self.memory.add_turn, phone, user_text, ai_reply)
+        
+        # Archive conversation (queued; embedded in batches in the background)
+        self.archiver.add(user_text, ai_reply, phone)
+        
+        # Media come from the turn's documents; after a cache hit retrieval may still be running
+        try:
+            media_files = self.get_relevant_media(user_text, await context.adocs())
+        except Exception as e:
+            print('media retrieval error', e)
+            media_files = []
+        
+        # Send relevant media
+        sent_media = await self.asend_media_files(phone, media_files)
+        
+        # Check for buying intent
+        reply = self.buying_intent_reply(user_text)
+        if reply:
+            await self.whatsapp_async.send_text(phone, reply)
+            return {'status': 'buying_intent', 'media_sent': sent_media}
+        
+        # Handle price objection
+        reply = self.price_objection_reply(user_text)
+        if reply:
+            await self.whatsapp_async.send_text(phone, reply)
+        
+        return {'status': 'ok', 'media_sent': sent_media}
 
 
 # Singleton instance
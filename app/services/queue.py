@@ -0,0 +1,299 @@
+"""Durable local job queue for inbound WhatsApp messages"""
+import os
+import json
+import time
+import asyncio
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from app.config import get_settings
+from app.utils.db import connect
+
+
+@dataclass
+class Job:
+    """A queued inbound message"""
+    id: int
+    phone: str
+    message: dict
+    attempts: int
+    enqueued_at: float
+
+
+def _owner_alive(owner: Optional[str], current: str) -> bool:
+    """Whether the worker process that claimed a job still exists"""
+    if not owner:
+        return False
+    if owner.split(':')[0] == current.split(':')[0]:
+        # Same pid (e.g. pid 1 in a container): alive only if it is this very boot
+        return owner == current
+    try:
+        pid = int(owner.split(':')[0])
+        os.kill(pid, 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MessageQueue:
+    """
+    SQLite-backed job queue shared by all workers on this host.
+    Jobs survive restarts, and a phone's jobs are claimed strictly one at a
+    time in arrival order.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.conn = connect(db_path)
+        self._lock = threading.Lock()
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._counters = {'enqueued': 0, 'completed': 0, 'retried': 0, 'dead': 0}
+        self._wait_total = 0.0
+        self._wait_count = 0
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                phone TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                enqueued_at REAL NOT NULL,
+                started_at REAL,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_phone ON jobs (status, phone, id);
+        """)
+        self.recover()
+
+    def enqueue(self, phone: str, message: dict) -> int:
+        """Persist a message for processing, returns the job id"""
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO jobs (phone, payload, enqueued_at) VALUES (?, ?, ?)",
+                (phone, json.dumps(message), time.time())
+            )
+            self._counters['enqueued'] += 1
+            return cur.lastrowid
+
+    def enqueue_many(self, items: list[tuple[str, dict]]) -> int:
+        """Persist several (phone, message) pairs in one transaction, keeping their order"""
+        if not items:
+            return 0
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(
+                    "INSERT INTO jobs (phone, payload, enqueued_at) VALUES (?, ?, ?)",
+                    [(phone, json.dumps(message), now) for phone, message in items]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self._counters['enqueued'] += len(items)
+        return len(items)
+
+    def claim(self) -> Optional[Job]:
+        """
+        Take the oldest runnable job.
+        A job is runnable when it is the oldest pending job of its phone and
+        no other job of that phone is running.
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("""
+                    SELECT id, phone, payload, attempts, enqueued_at FROM jobs AS j
+                    WHERE status = 'pending'
+                      AND id = (SELECT MIN(id) FROM jobs WHERE phone = j.phone AND status = 'pending')
+                      AND NOT EXISTS (SELECT 1 FROM jobs WHERE phone = j.phone AND status = 'running')
+                    ORDER BY id LIMIT 1
+                """).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (self.owner, now, row['id'])
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self._wait_total += now - row['enqueued_at']
+            self._wait_count += 1
+            return Job(
+                id=row['id'],
+                phone=row['phone'],
+                message=json.loads(row['payload']),
+                attempts=row['attempts'] + 1,
+                enqueued_at=row['enqueued_at'],
+            )
+
+    def complete(self, job: Job):
+        """Remove a successfully processed job"""
+        with self._lock:
+            self.conn.execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+            self._counters['completed'] += 1
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> bool:
+        """
+        Return a failed job to the queue, or park it once attempts run out (or
+        at once when retry is False). Returns True if retried
+        """
+        retry = retry and job.attempts < self.max_attempts
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, error = ? WHERE id = ?",
+                ('pending' if retry else 'failed', error, job.id)
+            )
+            self._counters['retried' if retry else 'dead'] += 1
+        return retry
+
+    def recover(self) -> int:
+        """Requeue running jobs whose worker process is gone (crash or restart)"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT owner FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            dead = [r['owner'] for r in rows if not _owner_alive(r['owner'], self.owner)]
+            recovered = 0
+            for owner in dead:
+                cur = self.conn.execute(
+                    "UPDATE jobs SET status = 'pending', owner = NULL WHERE status = 'running' AND owner IS ?",
+                    (owner,)
+                )
+                recovered += cur.rowcount
+        if recovered:
+            print(f"♻️ Requeued {recovered} interrupted job(s)")
+        return recovered
+
+    def release(self) -> int:
+        """Requeue the jobs this process is still running (graceful shutdown)"""
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE jobs SET status = 'pending', owner = NULL WHERE status = 'running' AND owner = ?",
+                (self.owner,)
+            )
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        """Queue depth and throughput counters for backpressure monitoring"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) AS n, MIN(enqueued_at) AS oldest FROM jobs GROUP BY status"
+            ).fetchall()
+        by_status = {r['status']: r for r in rows}
+        pending = by_status.get('pending')
+        return {
+            'pending': pending['n'] if pending else 0,
+            'running': by_status['running']['n'] if 'running' in by_status else 0,
+            'failed': by_status['failed']['n'] if 'failed' in by_status else 0,
+            'oldest_pending_age_s': round(time.time() - pending['oldest'], 3) if pending else 0.0,
+            'avg_wait_ms': round(1000 * self._wait_total / self._wait_count, 1) if self._wait_count else 0.0,
+            **self._counters,
+        }
+
+
+class QueueWorkerPool:
+    """Pool of asyncio workers draining the MessageQueue through MessageHandler"""
+
+    def __init__(self, queue: MessageQueue, workers: int, poll_interval: float = 1.0):
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    async def start(self):
+        """Start the worker tasks on the running event loop"""
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop taking new jobs and wait for in-flight ones"""
+        self._stopping = True
+        self.notify()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+        self._tasks = []
+        self.queue.release()
+
+    def notify(self):
+        """Wake idle workers after an enqueue"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, n: int):
+        from app.services.message_handler import ReplyAlreadySent, get_message_handler
+        handler = get_message_handler()
+        idle_polls = 0
+
+        while not self._stopping:
+            try:
+                job = await asyncio.to_thread(self.queue.claim)
+            except Exception as e:
+                print(f"Queue worker {n} claim error:", e)
+                job = None
+
+            if job is None:
+                # Periodically pick up jobs orphaned by crashed sibling workers
+                idle_polls += 1
+                if idle_polls % 30 == 0:
+                    await asyncio.to_thread(self.queue.recover)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            idle_polls = 0
+            try:
+                result = await handler.aprocess_message(job.phone, job.message)
+                await asyncio.to_thread(self.queue.complete, job)
+                print(f"Job {job.id} for {job.phone} processed: {result}")
+            except Exception as e:
+                # A job whose reply already reached the customer is parked, not run again
+                retried = await asyncio.to_thread(self.queue.fail, job, str(e),
+                                                  not isinstance(e, ReplyAlreadySent))
+                print(f"Job {job.id} failed ({'will retry' if retried else 'giving up'}):", e)
+
+
+# Singleton instances
+_message_queue = None
+_worker_pool = None
+
+
+def get_message_queue() -> MessageQueue:
+    """Get message queue singleton"""
+    global _message_queue
+    if _message_queue is None:
+        settings = get_settings()
+        _message_queue = MessageQueue(
+            os.path.join(settings.DATA_FOLDER, 'queue.db'),
+            max_attempts=settings.QUEUE_MAX_ATTEMPTS
+        )
+    return _message_queue
+
+
+def get_worker_pool() -> QueueWorkerPool:
+    """Get queue worker pool singleton"""
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = QueueWorkerPool(get_message_queue(), workers=get_settings().QUEUE_WORKERS)
+    return _worker_pool
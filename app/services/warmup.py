@@ -0,0 +1,39 @@
+"""Background warmup of the external API clients"""
+import time
+import threading
+
+from app.core.kb.manager import get_embeddings, get_vector_store
+from app.core.speech.stt import get_stt_client
+from app.core.speech.tts import get_tts_client
+from app.core.ai.llm import get_qa_chain
+
+# (name, factory) in the order the first message needs them
+CLIENTS = (
+    ('vector store', get_vector_store),
+    ('embeddings', get_embeddings),
+    ('LLM chain', get_qa_chain),
+    ('speech-to-text', get_stt_client),
+    ('text-to-speech', get_tts_client),
+)
+
+
+def warmup_clients() -> dict:
+    """Build every client now; failures are logged and retried on first use"""
+    results = {}
+    for name, factory in CLIENTS:
+        start = time.perf_counter()
+        try:
+            factory()
+            results[name] = True
+            print(f"✅ {name} ready ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        except Exception as e:
+            results[name] = False
+            print(f"⚠️ {name} warmup failed (will retry on first use): {e}")
+    return results
+
+
+def start_background_warmup() -> threading.Thread:
+    """Warm the clients up without delaying startup"""
+    thread = threading.Thread(target=warmup_clients, name='client-warmup', daemon=True)
+    thread.start()
+    return thread
@@ -1,114 +1,474 @@
 """WhatsApp Cloud API client"""
 import os
-import requests
-from typing import Optional
+import asyncio
+import tempfile
+import httpx
+from typing import AsyncIterable, Iterable, Optional, BinaryIO, Tuple
 from app.config import get_settings
+from app.services import http_client
+from app.services.media_cache import get_media_cache
+from app.utils.tempfiles import get_temp_space
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Streamed uploads cannot be replayed, so these fall back to a buffered upload
+# of the bytes produced so far (411: the endpoint wants a Content-Length)
+STREAM_FALLBACK_STATUSES = http_client.RETRY_STATUSES | {411}
+
+# Graph errors saying the media id itself is unknown or expired: 131053 (media
+# upload error) and 100/33 (object does not exist). Other 400s, e.g. a customer
+# outside the 24h window or an invalid number, leave a cached id valid
+MEDIA_ID_ERROR_CODES = {131053}
+MEDIA_ID_ERROR_SUBCODES = {(100, 33)}
+
+
+class _WhatsAppBase:
+    """URLs, payloads and connection settings shared by the sync and async clients"""
 
-class WhatsAppClient:
-    """WhatsApp Cloud API integration"""
-    
     def __init__(self):
         settings = get_settings()
         self.token = settings.WHATSAPP_ACCESS_TOKEN
         self.phone_id = settings.WHATSAPP_PHONE_ID
         self.base_url = 'https://graph.facebook.com/v20.0'
-        self.temp_folder = settings.TEMP_FOLDER
-        os.makedirs(self.temp_folder, exist_ok=True)
-    
-    def send_text(self, to: str, body: str) -> dict:
-        """Send text message"""
-        url = f"{self.base_url}/{self.phone_id}/messages"
-        payload = {
+        self.temp_space = get_temp_space()
+        self.pool_options = {
+            'pool_size': settings.WHATSAPP_POOL_SIZE,
+            'timeout': settings.WHATSAPP_TIMEOUT,
+            'connect_timeout': settings.WHATSAPP_CONNECT_TIMEOUT,
+        }
+        self.retry_options = {
+            'max_retries': settings.WHATSAPP_MAX_RETRIES,
+            'backoff': settings.WHATSAPP_RETRY_BACKOFF,
+        }
+        self.max_download_bytes = settings.MAX_MEDIA_DOWNLOAD_BYTES
+        self.media_cache = get_media_cache()
+
+    @property
+    def headers(self) -> dict:
+        return {'Authorization': f'Bearer {self.token}'}
+
+    @property
+    def messages_url(self) -> str:
+        return f"{self.base_url}/{self.phone_id}/messages"
+
+    @property
+    def media_url(self) -> str:
+        return f"{self.base_url}/{self.phone_id}/media"
+
+    @staticmethod
+    def text_payload(to: str, body: str) -> dict:
+        return {
             "messaging_product": "whatsapp",
             "to": to,
             'type': 'text',
             'text': {'body': body}
         }
-        headers = {'Authorization': f'Bearer {self.token}'}
-        r = requests.post(url, json=payload, headers=headers)
+
+    @staticmethod
+    def media_payload(to: str, msg_type: str, media_id: str) -> dict:
+        return {
+            'messaging_product': 'whatsapp',
+            'to': to,
+            'type': msg_type,
+            msg_type: {'id': media_id}
+        }
+
+    @staticmethod
+    def upload_files(file_path: str, content: bytes) -> dict:
+        return {'file': (os.path.basename(file_path), content)}
+
+    @staticmethod
+    def stream_upload(filename: str, mime_type: str) -> Tuple[dict, bytes, bytes]:
+        """Extra headers and multipart envelope for an upload streamed as it is produced"""
+        content_type, head, tail = http_client.multipart_envelope(
+            'file', filename, mime_type, {'messaging_product': 'whatsapp'}
+        )
+        return {'Content-Type': content_type}, head, tail
+
+    @staticmethod
+    def media_type(file_path: str) -> str:
+        """Message type (image/video) for a media file"""
+        ext = file_path.split('.')[-1].lower()
+        return 'image' if ext in ['jpg', 'jpeg', 'png'] else 'video'
+
+    def check_media_size(self, size) -> None:
+        """Abort a download as soon as it is known to exceed the cap"""
+        if size is not None and int(size) > self.max_download_bytes:
+            raise ValueError(f'media too large: {size} bytes (limit {self.max_download_bytes})')
+
+    def new_temp_path(self, directory: Optional[str] = None) -> Tuple[int, str]:
+        """Unique temp file (fd, path) for a download, next to out_path when one is given"""
+        if directory:
+            return tempfile.mkstemp(prefix='download_', dir=directory)
+        return self.temp_space.mkstemp(prefix='download_')
+
+    @staticmethod
+    def is_media_rejected(r: httpx.Response) -> bool:
+        """Whether a send failed because the platform no longer knows the media id"""
+        if r.status_code not in (400, 404):
+            return False
+        try:
+            error = r.json().get('error') or {}
+        except (ValueError, AttributeError):
+            return False
+        code = error.get('code')
+        return code in MEDIA_ID_ERROR_CODES or (code, error.get('error_subcode')) in MEDIA_ID_ERROR_SUBCODES
+
+
+class WhatsAppClient(_WhatsAppBase):
+    """WhatsApp Cloud API integration over a pooled keep-alive session"""
+
+    def __init__(self):
+        super().__init__()
+        self.client = http_client.build_client(**self.pool_options)
+
+    def close(self):
+        """Close the underlying HTTP connections"""
+        self.client.close()
+
+    def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return http_client.request(self.client, method, url, headers=self.headers, **self.retry_options, **kwargs)
+
+    def send_text(self, to: str, body: str) -> dict:
+        """Send text message"""
+        r = self._request('POST', self.messages_url, json=self.text_payload(to, body))
         print('send_text', r.status_code, r.text)
         return r.json()
-    
+
     def upload_media(self, file_path: str) -> dict:
         """Upload media file to WhatsApp"""
-        url = f"{self.base_url}/{self.phone_id}/media"
-        files = {'file': open(file_path, 'rb')}
-        params = {'messaging_product': 'whatsapp'}
-        headers = {'Authorization': f'Bearer {self.token}'}
-        r = requests.post(url, files=files, data=params, headers=headers)
+        files = self.upload_files(file_path, _read_bytes(file_path))
+        r = self._request('POST', self.media_url, files=files, data={'messaging_product': 'whatsapp'},
+                          idempotent=True)
         print('upload_media', r.status_code, r.text)
         return r.json()
-    
-    def send_media(self, to: str, file_path: str) -> Optional[dict]:
-        """Send media (image/video) message"""
+
+    def upload_media_stream(self, chunks: Iterable[bytes], filename: str = 'reply.ogg',
+                            mime_type: str = 'audio/ogg') -> dict:
+        """Upload media while it is still being produced, e.g. audio straight from TTS"""
+        chunks = iter(chunks)
+        produced = []
+        headers, head, tail = self.stream_upload(filename, mime_type)
+
+        def body():
+            yield head
+            for chunk in chunks:
+                produced.append(chunk)
+                yield chunk
+            yield tail
+
+        try:
+            r = self.client.post(self.media_url, content=body(), headers={**self.headers, **headers})
+        except httpx.TransportError as e:
+            print('streamed upload failed, retrying buffered:', e)
+            r = None
+        if r is None or r.status_code in STREAM_FALLBACK_STATUSES:
+            produced.extend(chunks)
+            files = {'file': (filename, b''.join(produced), mime_type)}
+            r = self._request('POST', self.media_url, files=files, data={'messaging_product': 'whatsapp'},
+                              idempotent=True)
+        print('upload_media', r.status_code, r.text)
+        return r.json()
+
+    def _upload_and_cache(self, file_path: str) -> Optional[str]:
         up = self.upload_media(file_path)
         media_id = up.get('id')
         if not media_id:
             print('upload failed', up)
             return None
-        
-        ext = file_path.split('.')[-1].lower()
-        msg_type = 'image' if ext in ['jpg', 'jpeg', 'png'] else 'video'
-        url = f"{self.base_url}/{self.phone_id}/messages"
-        payload = {
-            'messaging_product': 'whatsapp',
-            'to': to,
-            'type': msg_type,
-            msg_type: {'id': media_id}
-        }
-        headers = {'Authorization': f'Bearer {self.token}'}
-        r = requests.post(url, json=payload, headers=headers)
+        if self.media_cache:
+            self.media_cache.put(file_path, media_id)
+        return media_id
+
+    def ensure_uploaded(self, file_path: str) -> Optional[str]:
+        """Media id for a file, uploading it only when no live cached id exists"""
+        cached_id = self.media_cache.get(file_path) if self.media_cache else None
+        return cached_id or self._upload_and_cache(file_path)
+
+    def send_media(self, to: str, file_path: str) -> Optional[dict]:
+        """Send media (image/video) message, reusing the cached media id when possible"""
+        msg_type = self.media_type(file_path)
+        cached_id = self.media_cache.get(file_path) if self.media_cache else None
+        media_id = cached_id or self._upload_and_cache(file_path)
+        if not media_id:
+            return None
+
+        r = self._request('POST', self.messages_url, json=self.media_payload(to, msg_type, media_id))
+        if cached_id and self.is_media_rejected(r):
+            print('cached media id rejected, re-uploading', file_path)
+            self.media_cache.invalidate(file_path)
+            media_id = self._upload_and_cache(file_path)
+            if not media_id:
+                return None
+            r = self._request('POST', self.messages_url, json=self.media_payload(to, msg_type, media_id))
         print('send_media', r.status_code, r.text)
         return r.json()
-    
+
     def send_audio(self, to: str, file_path: str) -> Optional[dict]:
         """Send audio message"""
-        up = self.upload_media(file_path)
+        return self.send_uploaded_audio(to, self.upload_media(file_path))
+
+    def send_audio_stream(self, to: str, chunks: Iterable[bytes]) -> Optional[dict]:
+        """Send audio message, uploading the audio while it is still being synthesized"""
+        return self.send_uploaded_audio(to, self.upload_media_stream(chunks))
+
+    def send_uploaded_audio(self, to: str, up: dict) -> Optional[dict]:
+        """Send an audio message for an upload response"""
         media_id = up.get('id')
         if not media_id:
             print('upload failed', up)
             return None
-        
-        url = f"{self.base_url}/{self.phone_id}/messages"
-        payload = {
-            'messaging_product': 'whatsapp',
-            'to': to,
-            'type': 'audio',
-            'audio': {'id': media_id}
-        }
-        headers = {'Authorization': f'Bearer {self.token}'}
-        r = requests.post(url, json=payload, headers=headers)
+
+        payload = self.media_payload(to, 'audio', media_id)
+        r = self._request('POST', self.messages_url, json=payload)
+        print('send_audio', r.status_code, r.text)
+        return r.json()
+
+    def send_cached_audio(self, to: str, media_id: str) -> Optional[dict]:
+        """Send audio by a previously uploaded media id; None if the platform rejects the id"""
+        r = self._request('POST', self.messages_url, json=self.media_payload(to, 'audio', media_id))
+        if self.is_media_rejected(r):
+            return None
         print('send_audio', r.status_code, r.text)
-        
-        # Delete temp file after sending
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"🗑️ Deleted temp audio file: {file_path}")
-        except Exception as e:
-            print("⚠️ Failed to delete temp audio file:", e)
-        
         return r.json()
-    
+
+    def _media_download_url(self, media_id: str) -> str:
+        r = self._request('GET', f"{self.base_url}/{media_id}")
+        meta = r.json()
+        media_url = meta.get('url')
+        if not media_url:
+            raise ValueError('no media url')
+        self.check_media_size(meta.get('file_size'))
+        return media_url
+
+    def _stream_media(self, media_id: str, out: BinaryIO) -> int:
+        """Copy media into out chunk by chunk, never holding the whole file"""
+        media_url = self._media_download_url(media_id)
+        written = 0
+        with self.client.stream('GET', media_url, headers=self.headers) as r:
+            r.raise_for_status()
+            self.check_media_size(r.headers.get('Content-Length'))
+            for chunk in r.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                self.check_media_size(written)
+                out.write(chunk)
+        return written
+
+    def download_media(self, media_id: str) -> BinaryIO:
+        """Download media into a spooled buffer, rewound and ready to read"""
+        buf = self.temp_space.spool()
+        try:
+            self._stream_media(media_id, buf)
+        except Exception:
+            buf.close()
+            raise
+        buf.seek(0)
+        return buf
+
     def download_media_file(self, media_id: str, out_path: Optional[str] = None) -> str:
-        """Download media file from WhatsApp"""
-        out_path = out_path or os.path.join(self.temp_folder, media_id)
-        url_meta = f"https://graph.facebook.com/v20.0/{media_id}"
-        headers = {'Authorization': f'Bearer {self.token}'}
-        r = requests.get(url_meta, headers=headers)
+        """Stream media file from WhatsApp to out_path, or to a unique temp file"""
+        fd, tmp_path = self.new_temp_path(os.path.dirname(out_path) if out_path else None)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                self._stream_media(media_id, f)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        if out_path:
+            os.replace(tmp_path, out_path)
+            return out_path
+        return tmp_path
+
+
+class AsyncWhatsAppClient(_WhatsAppBase):
+    """Non-blocking WhatsApp Cloud API client with the same methods as WhatsAppClient"""
+
+    def __init__(self):
+        super().__init__()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = http_client.build_async_client(**self.pool_options)
+        return self._client
+
+    async def aclose(self):
+        """Close the underlying HTTP connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return await http_client.arequest(self.client, method, url, headers=self.headers, **self.retry_options, **kwargs)
+
+    async def send_text(self, to: str, body: str) -> dict:
+        """Send text message"""
+        r = await self._request('POST', self.messages_url, json=self.text_payload(to, body))
+        print('send_text', r.status_code, r.text)
+        return r.json()
+
+    async def upload_media(self, file_path: str) -> dict:
+        """Upload media file to WhatsApp"""
+        content = await asyncio.to_thread(_read_bytes, file_path)
+        files = self.upload_files(file_path, content)
+        r = await self._request('POST', self.media_url, files=files, data={'messaging_product': 'whatsapp'},
+                                idempotent=True)
+        print('upload_media', r.status_code, r.text)
+        return r.json()
+
+    async def upload_media_stream(self, chunks: AsyncIterable[bytes], filename: str = 'reply.ogg',
+                                  mime_type: str = 'audio/ogg') -> dict:
+        """Upload media while it is still being produced, e.g. audio straight from TTS"""
+        chunks = chunks.__aiter__()
+        produced = []
+        headers, head, tail = self.stream_upload(filename, mime_type)
+
+        async def body():
+            yield head
+            async for chunk in chunks:
+                produced.append(chunk)
+                yield chunk
+            yield tail
+
+        try:
+            try:
+                r = await self.client.post(self.media_url, content=body(), headers={**self.headers, **headers})
+            except httpx.TransportError as e:
+                print('streamed upload failed, retrying buffered:', e)
+                r = None
+            if r is None or r.status_code in STREAM_FALLBACK_STATUSES:
+                async for chunk in chunks:
+                    produced.append(chunk)
+                files = {'file': (filename, b''.join(produced), mime_type)}
+                r = await self._request('POST', self.media_url, files=files, data={'messaging_product': 'whatsapp'},
+                                        idempotent=True)
+        finally:
+            # A cancelled upload stops its producer (e.g. the TTS thread) now, not when collected
+            aclose = getattr(chunks, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+        print('upload_media', r.status_code, r.text)
+        return r.json()
+
+    async def _upload_and_cache(self, file_path: str) -> Optional[str]:
+        up = await self.upload_media(file_path)
+        media_id = up.get('id')
+        if not media_id:
+            print('upload failed', up)
+            return None
+        if self.media_cache:
+            await asyncio.to_thread(self.media_cache.put, file_path, media_id)
+        return media_id
+
+    async def ensure_uploaded(self, file_path: str) -> Optional[str]:
+        """Media id for a file, uploading it only when no live cached id exists"""
+        cached_id = await asyncio.to_thread(self.media_cache.get, file_path) if self.media_cache else None
+        return cached_id or await self._upload_and_cache(file_path)
+
+    async def send_media(self, to: str, file_path: str) -> Optional[dict]:
+        """Send media (image/video) message, reusing the cached media id when possible"""
+        msg_type = self.media_type(file_path)
+        cached_id = await asyncio.to_thread(self.media_cache.get, file_path) if self.media_cache else None
+        media_id = cached_id or await self._upload_and_cache(file_path)
+        if not media_id:
+            return None
+
+        r = await self._request('POST', self.messages_url, json=self.media_payload(to, msg_type, media_id))
+        if cached_id and self.is_media_rejected(r):
+            print('cached media id rejected, re-uploading', file_path)
+            await asyncio.to_thread(self.media_cache.invalidate, file_path)
+            media_id = await self._upload_and_cache(file_path)
+            if not media_id:
+                return None
+            r = await self._request('POST', self.messages_url, json=self.media_payload(to, msg_type, media_id))
+        print('send_media', r.status_code, r.text)
+        return r.json()
+
+    async def send_audio(self, to: str, file_path: str) -> Optional[dict]:
+        """Send audio message"""
+        return await self.send_uploaded_audio(to, await self.upload_media(file_path))
+
+    async def send_audio_stream(self, to: str, chunks: AsyncIterable[bytes]) -> Optional[dict]:
+        """Send audio message, uploading the audio while it is still being synthesized"""
+        return await self.send_uploaded_audio(to, await self.upload_media_stream(chunks))
+
+    async def send_uploaded_audio(self, to: str, up: dict) -> Optional[dict]:
+        """Send an audio message for an upload response"""
+        media_id = up.get('id')
+        if not media_id:
+            print('upload failed', up)
+            return None
+
+        payload = self.media_payload(to, 'audio', media_id)
+        r = await self._request('POST', self.messages_url, json=payload)
+        print('send_audio', r.status_code, r.text)
+        return r.json()
+
+    async def send_cached_audio(self, to: str, media_id: str) -> Optional[dict]:
+        """Send audio by a previously uploaded media id; None if the platform rejects the id"""
+        r = await self._request('POST', self.messages_url, json=self.media_payload(to, 'audio', media_id))
+        if self.is_media_rejected(r):
+            return None
+        print('send_audio', r.status_code, r.text)
+        return r.json()
+
+    async def _media_download_url(self, media_id: str) -> str:
+        r = await self._request('GET', f"{self.base_url}/{media_id}")
         meta = r.json()
         media_url = meta.get('url')
         if not media_url:
             raise ValueError('no media url')
-        r2 = requests.get(media_url, headers=headers)
-        with open(out_path, 'wb') as f:
-            f.write(r2.content)
-        return out_path
+        self.check_media_size(meta.get('file_size'))
+        return media_url
 
+    async def _stream_media(self, media_id: str, out: BinaryIO) -> int:
+        """Copy media into out chunk by chunk, never holding the whole file"""
+        media_url = await self._media_download_url(media_id)
+        written = 0
+        async with self.client.stream('GET', media_url, headers=self.headers) as r:
+            r.raise_for_status()
+            self.check_media_size(r.headers.get('Content-Length'))
+            async for chunk in r.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                self.check_media_size(written)
+                out.write(chunk)
+        return written
 
-# Singleton instance
+    async def download_media(self, media_id: str) -> BinaryIO:
+        """Download media into a spooled buffer, rewound and ready to read"""
+        buf = self.temp_space.spool()
+        try:
+            await self._stream_media(media_id, buf)
+        except Exception:
+            buf.close()
+            raise
+        buf.seek(0)
+        return buf
+
+    async def download_media_file(self, media_id: str, out_path: Optional[str] = None) -> str:
+        """Stream media file from WhatsApp to out_path, or to a unique temp file"""
+        fd, tmp_path = self.new_temp_path(os.path.dirname(out_path) if out_path else None)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                await self._stream_media(media_id, f)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        if out_path:
+            os.replace(tmp_path, out_path)
+            return out_path
+        return tmp_path
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# Singleton instances
 _whatsapp_client = None
+_async_whatsapp_client = None
 
 
 def get_whatsapp_client() -> WhatsAppClient:
@@ -118,3 +478,10 @@ def get_whatsapp_client() -> WhatsAppClient:
         _whatsapp_client = WhatsAppClient()
     return _whatsapp_client
 
+
+def get_async_whatsapp_client() -> AsyncWhatsAppClient:
+    """Get async WhatsApp client singleton"""
+    global _async_whatsapp_client
+    if _async_whatsapp_client is None:
+        _async_whatsapp_client = AsyncWhatsAppClient()
+    return _async_whatsapp_client
@@ -0,0 +1,58 @@
+"""Helpers for bridging blocking code into asyncio"""
+import asyncio
+import threading
+from typing import AsyncIterator, Iterable, Optional
+
+
+class _End:
+    """Marks the end of a bridged iterable, carrying the error that ended it"""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+async def aiter_in_thread(iterable: Iterable, maxsize: int = 16) -> AsyncIterator:
+    """
+    Iterate a blocking iterable in a worker thread and yield its items on the
+    event loop. At most maxsize items are buffered; if the consumer stops
+    early the producer is told to stop and the iterable is closed.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        iterator = iter(iterable)
+        error = None
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    return
+                put(item)
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+        if not stop.is_set():
+            put(_End(error))
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if isinstance(item, _End):
+                if item.error is not None:
+                    raise item.error
+                break
+            yield item
+        await producer
+    finally:
+        stop.set()
+        # Unblock a producer waiting on a full queue so it can see the stop flag
+        while not queue.empty():
+            queue.get_nowait()
@@ -0,0 +1,20 @@
+"""SQLite helpers for the local on-disk stores"""
+import os
+import sqlite3
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Open a SQLite connection that can be shared between threads and processes.
+    WAL mode lets readers and a writer work concurrently; the busy timeout
+    makes writers from other uvicorn workers wait instead of failing.
+    """
+    folder = os.path.dirname(db_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.row_factory = sqlite3.Row
+    return conn
@@ -1,5 +1,6 @@
 """File handling utilities"""
 import os
+import hashlib
 from typing import Optional
 
 
@@ -32,6 +33,28 @@ def is_audio(filename: str) -> bool:
     return get_file_extension(filename) in audio_extensions
 
 
+def get_audio_extension(mime_type: Optional[str]) -> str:
+    """File extension for a WhatsApp audio MIME type (e.g. 'audio/ogg; codecs=opus')"""
+    extensions = {
+        'audio/ogg': 'ogg',
+        'audio/mpeg': 'mp3',
+        'audio/mp4': 'm4a',
+        'audio/aac': 'aac',
+        'audio/amr': 'amr',
+    }
+    base = (mime_type or '').split(';')[0].strip().lower()
+    return extensions.get(base, 'ogg')
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a file, read in chunks"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
 def get_safe_filename(filename: str) -> str:
     """Get safe filename by removing dangerous characters"""
     # Remove path separators and other dangerous characters
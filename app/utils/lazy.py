@@ -0,0 +1,29 @@
+"""Thread-safe lazy construction of expensive clients"""
+import threading
+from functools import wraps
+from typing import Callable, TypeVar
+
+T = TypeVar('T')
+
+_UNSET = object()
+
+
+def lazy(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    Build the factory's result on first call and return the same object
+    afterwards. Concurrent first calls wait for a single construction; a
+    failed construction is retried on the next call.
+    """
+    lock = threading.Lock()
+    value = _UNSET
+
+    @wraps(factory)
+    def get() -> T:
+        nonlocal value
+        if value is _UNSET:
+            with lock:
+                if value is _UNSET:
+                    value = factory()
+        return value
+
+    return get
@@ -0,0 +1,201 @@
+"""Temp-space manager for per-request audio and media files"""
+import os
+import time
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from app.config import get_settings
+
+TMPFS_ROOT = '/dev/shm'
+
+
+def _job_owner(path: str) -> Optional[int]:
+    """Pid of the process that made a job directory ({prefix}_{pid}_{id}), None for other entries"""
+    parts = os.path.basename(path).rsplit('_', 2)
+    if len(parts) == 3 and parts[1].isdigit() and len(parts[2]) == 32:
+        return int(parts[1])
+    return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class TempJob:
+    """Private directory for one unit of work, removed when the job ends"""
+
+    def __init__(self, space: 'TempSpace', directory: str):
+        self.space = space
+        self.dir = directory
+
+    def path(self, name: str) -> str:
+        """Path for a file that lives as long as the job"""
+        return os.path.join(self.dir, name)
+
+    def spool(self) -> BinaryIO:
+        return self.space.spool()
+
+
+class TempSpace:
+    """
+    Hands out collision-free temp paths under a single root, prefers memory
+    (spooled buffers, optionally tmpfs) and keeps the root under a disk quota
+    by evicting stale files. Directories of running jobs are never evicted,
+    whichever process owns them.
+    """
+
+    def __init__(self, root: str, quota_bytes: int, max_age_seconds: int,
+                 spool_bytes: int, min_evict_age: int = 60, sweep_interval: int = 30):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age_seconds
+        self.spool_bytes = spool_bytes
+        self.min_evict_age = min_evict_age
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._live = set()  # this process's running job directories
+        self._live_lock = threading.Lock()
+        self.evicted = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    @contextmanager
+    def job(self, prefix: str = 'job') -> Iterator[TempJob]:
+        """Unique directory for one job, cleaned up on exit"""
+        self.maybe_sweep()
+        # The pid in the name lets other processes' sweeps tell it is still in use
+        directory = os.path.join(self.root, f"{prefix}_{os.getpid()}_{uuid.uuid4().hex}")
+        os.makedirs(directory)
+        with self._live_lock:
+            self._live.add(directory)
+        try:
+            yield TempJob(self, directory)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+            with self._live_lock:
+                self._live.discard(directory)
+
+    def mkstemp(self, prefix: str = 'tmp_', suffix: str = '') -> Tuple[int, str]:
+        """Unique file (fd, path) that outlives the call; the caller deletes it"""
+        self.maybe_sweep()
+        return tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=self.root)
+
+    def spool(self) -> BinaryIO:
+        """Buffer kept in memory up to spool_bytes, spilled to the temp root beyond"""
+        return tempfile.SpooledTemporaryFile(max_size=self.spool_bytes, dir=self.root)
+
+    def maybe_sweep(self):
+        """Run sweep() at most once per sweep_interval"""
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        try:
+            self.sweep()
+        except OSError as e:
+            print("⚠️ Temp sweep failed:", e)
+
+    def sweep(self) -> int:
+        """
+        Delete files past max_age, then the oldest ones until usage fits the
+        quota. A directory's mtime does not change while files in it are
+        written or read, so running jobs are skipped whatever their age.
+        """
+        with self._lock:
+            now = time.time()
+            entries = self._entries()
+            with self._live_lock:
+                live = set(self._live)
+            removed = 0
+            usage = sum(size for _, _, size in entries)
+            for mtime, path, size in sorted(entries):
+                age = now - mtime
+                if age < self.min_evict_age:
+                    break
+                if path in live or self._owned_elsewhere(path):
+                    continue
+                if age > self.max_age or usage > self.quota_bytes:
+                    self._remove(path)
+                    usage -= size
+                    removed += 1
+            self.evicted += removed
+        if removed:
+            print(f"🧹 Evicted {removed} stale temp file(s)")
+        return removed
+
+    def _entries(self) -> list:
+        """(mtime, path, size) for every top-level file and job directory"""
+        entries = []
+        for entry in os.scandir(self.root):
+            try:
+                st = entry.stat(follow_symlinks=False)
+                size = st.st_size
+                if entry.is_dir(follow_symlinks=False):
+                    size = sum(
+                        os.path.getsize(os.path.join(d, f))
+                        for d, _, files in os.walk(entry.path) for f in files
+                    )
+                entries.append((st.st_mtime, entry.path, size))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    @staticmethod
+    def _owned_elsewhere(path: str) -> bool:
+        """Whether path is a job directory of another process that is still running"""
+        owner = _job_owner(path) if os.path.isdir(path) else None
+        return owner is not None and owner != os.getpid() and _pid_alive(owner)
+
+    @staticmethod
+    def _remove(path: str):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        """Disk usage and eviction counters"""
+        usage = sum(size for _, _, size in self._entries())
+        return {
+            'root': self.root,
+            'usage_bytes': usage,
+            'quota_bytes': self.quota_bytes,
+            'evicted': self.evicted,
+        }
+
+
+# Singleton instance
+_temp_space = None
+
+
+def _temp_root(temp_folder: str, use_tmpfs: bool) -> str:
+    if use_tmpfs and os.path.isdir(TMPFS_ROOT) and os.access(TMPFS_ROOT, os.W_OK):
+        return os.path.join(TMPFS_ROOT, 'vagner-temp')
+    return temp_folder
+
+
+def get_temp_space() -> TempSpace:
+    """Get temp space singleton"""
+    global _temp_space
+    if _temp_space is None:
+        settings = get_settings()
+        _temp_space = TempSpace(
+            _temp_root(settings.TEMP_FOLDER, settings.TEMP_USE_TMPFS),
+            quota_bytes=settings.TEMP_QUOTA_MB * 1024 * 1024,
+            max_age_seconds=settings.TEMP_MAX_AGE_SECONDS,
+            spool_bytes=settings.MEDIA_SPOOL_BYTES,
+        )
+    return _temp_space
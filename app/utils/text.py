@@ -1,6 +1,8 @@
 """Text processing utilities"""
 import re
 
+from app.utils.lazy import lazy
+
 
 def normalize_text(text: str) -> str:
     """Normalize whitespace in text"""
@@ -31,3 +33,124 @@ def extract_phone_number(text: str) -> str:
         return match.group(0)
     return ""
 
+
+@lazy
+def _token_encoding():
+    """
+    tiktoken encoding; its BPE file is fetched and cached on first use.
+    None if that fails, so later calls estimate instead of retrying the download.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of LLM tokens in text (estimated if tiktoken is unavailable)"""
+    enc = _token_encoding()
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """First max_tokens tokens of text"""
+    enc = _token_encoding()
+    if enc is None:
+        return text[:max_tokens * 4]
+    tokens = enc.encode(text)
+    return text if len(tokens) <= max_tokens else enc.decode(tokens[:max_tokens])
+
+
+# Words that end in a period without ending the sentence ("Sr. João", "R$ 297 p. mês")
+_ABBREVIATIONS = {'sr', 'sra', 'srta', 'dr', 'dra', 'prof', 'profa', 'etc', 'ex', 'obs', 'p', 'pg', 'pág',
+                  'av', 'tel', 'vs', 'aprox', 'máx', 'mín', 'n', 'nº', 'no', 'min', 'seg', 'h'}
+_SENTENCE_PUNCT = '.!?…'
+_CLOSERS = '"”\')]*'
+
+
+class SentenceSegmenter:
+    """
+    Splits text arriving in pieces (LLM tokens) into sentences, each returned
+    as soon as the text after it shows it is complete. Sentences shorter than
+    min_chars are joined to the next one; text running past max_chars without
+    a sentence end is cut at the last comma or space.
+    """
+
+    def __init__(self, min_chars: int = 20, max_chars: int = 300):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ''
+        self._pos = 0  # where to resume scanning for a boundary
+
+    def feed(self, text: str) -> list:
+        """Sentences completed by text"""
+        self._buffer += text
+        sentences = []
+        while True:
+            end = self._boundary()
+            if end is None:
+                break
+            sentence, self._buffer, self._pos = self._buffer[:end].strip(), self._buffer[end:], 0
+            if sentence:
+                sentences.append(sentence)
+        return sentences
+
+    def flush(self) -> list:
+        """Whatever is left once the stream has ended"""
+        rest, self._buffer, self._pos = self._buffer.strip(), '', 0
+        return [rest] if rest else []
+
+    def _boundary(self):
+        """End offset of the first complete sentence in the buffer, or None"""
+        buf = self._buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '\n':
+                if i >= self.min_chars and buf[:i].strip():
+                    return i + 1
+            elif ch in _SENTENCE_PUNCT:
+                j = i + 1
+                while j < len(buf) and (buf[j] in _SENTENCE_PUNCT or buf[j] in _CLOSERS):
+                    j += 1
+                if j >= len(buf):
+                    self._pos = i
+                    return None  # the next piece decides
+                if buf[j].isspace() and not self._is_abbreviation(buf, i) and j >= self.min_chars:
+                    # Emoji right after the punctuation belong to this sentence ("Claro! 😊 Temos...")
+                    k = j
+                    while k < len(buf) and buf[k].isspace():
+                        k += 1
+                    m = k
+                    while m < len(buf) and not buf[m].isspace() and not buf[m].isalnum() and buf[m] not in '"“(*-•':
+                        m += 1
+                    if m >= len(buf):
+                        self._pos = i
+                        return None
+                    return m if m > k and buf[m].isspace() else j
+                i = j
+                continue
+            i += 1
+        self._pos = len(buf)
+        if len(buf) > self.max_chars:
+            cut = max(buf.rfind(',', 0, self.max_chars), buf.rfind(' ', 0, self.max_chars))
+            return cut + 1 if cut > 0 else self.max_chars
+        return None
+
+    @staticmethod
+    def _is_abbreviation(buf: str, i: int) -> bool:
+        """Whether the period at i ends an abbreviation or a list number ("1. ")"""
+        if buf[i] != '.':
+            return False
+        start = i
+        while start > 0 and (buf[start - 1].isalnum() or buf[start - 1] == 'º'):
+            start -= 1
+        word = buf[start:i].lower()
+        if word in _ABBREVIATIONS:
+            return True
+        # "1." at the start of a line is a numbered list item, not a sentence
+        return word.isdigit() and len(word) <= 2 and (start == 0 or buf[start - 1] == '\n')
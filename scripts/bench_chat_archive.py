@@ -0,0 +1,155 @@
+"""
+Benchmark chat archiving on the message response path
+Compares the old inline add_chat_to_kb (one embedding call and one upsert per
+turn, before the reply is sent) with the background ChatArchiver, using
+stand-in embeddings and vector store with a fixed per-request latency.
+Reports the time each turn adds to the response path and the API requests
+made, and checks that ids never collide and that close() archives every
+buffered turn.
+
+Usage: python scripts/bench_chat_archive.py [--turns 200] [--latency 0.08]
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+import io
+import statistics
+import threading
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# The stand-ins need no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+
+from app.core.kb import manager
+from app.core.kb.archive import ChatArchiver
+from app.core.kb.vectorstore import VectorStore
+
+
+class SlowEmbeddings:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [[0.1] * manager.EMBED_DIM for _ in texts]
+
+
+class SlowStore(VectorStore):
+    name = 'slow'
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.ids = []
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            self.ids.extend(v[0] for v in vectors)
+
+    def query(self, vector, top_k, include_metadata=True, filter=None):
+        return {'matches': []}
+
+    def delete(self, ids):
+        pass
+
+
+class NullChunkStore:
+    def __init__(self):
+        self.texts = 0
+
+    def put_many(self, items):
+        for _ in items:
+            self.texts += 1
+
+    def delete_many(self, ids):
+        pass
+
+
+def run(label, add, turns, emb, store, close=None):
+    emb.calls, store.calls, store.ids = 0, 0, []
+    latencies = []
+    start = time.perf_counter()
+    for i in range(turns):
+        t = time.perf_counter()
+        # A handful of customers, several turns each within the same second
+        add(f"Quanto custa a mentoria {i}?", f"A mentoria custa R$ {297 + i}.", f"55119{i % 5:08d}")
+        latencies.append((time.perf_counter() - t) * 1000)
+    if close:
+        close()
+    total = time.perf_counter() - start
+    unique = len(set(store.ids))
+    print(f"{label:<22} response path p50 {statistics.median(latencies):7.2f} ms  "
+          f"max {max(latencies):7.2f} ms  | {emb.calls:>4} embed + {store.calls:>4} upsert requests  "
+          f"| {unique}/{turns} turns stored  ({total:.1f}s total)")
+    return unique
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.08, help="seconds per API request")
+    args = parser.parse_args()
+
+    emb, store = SlowEmbeddings(args.latency), SlowStore(args.latency / 2)
+    manager.get_embeddings = lambda: emb
+    manager.get_vector_store = lambda: store
+    chunk_store = NullChunkStore()
+    manager.get_chunk_store = lambda: chunk_store
+
+    print(f"{args.turns} chat turns, {args.latency * 1000:.0f} ms per embedding request\n")
+    failed = False
+    with contextlib.redirect_stdout(io.StringIO()) as quiet:  # one log line per turn
+        run("inline add_chat_to_kb", manager.add_chat_to_kb, args.turns, emb, store)
+    print(quiet.getvalue().splitlines()[-1])
+
+    archiver = ChatArchiver(batch_size=32, flush_seconds=1.0)
+    stored = run("ChatArchiver", archiver.add, args.turns, emb, store, close=archiver.close)
+    if stored != args.turns:
+        failed = True
+        print(f"❌ expected {args.turns} turns archived after close(), got {stored}")
+    else:
+        print("✅ every buffered turn archived at close(), no id collisions")
+
+    # A failed batch is retried, not lost
+    attempts = []
+
+    def flaky(records):
+        attempts.append(len(records))
+        if len(attempts) == 1:
+            raise RuntimeError("embedding API unavailable")
+        manager.add_chats_to_kb(records)
+
+    store.ids = []
+    archiver = ChatArchiver(batch_size=8, flush_seconds=0.1, archive=flaky, retry_seconds=0.1)
+    for i in range(8):
+        archiver.add(f"pergunta {i}", f"resposta {i}", "5511900000000")
+    archiver.flush(timeout=10)
+    archiver.close()
+    ok = len(set(store.ids)) == 8 and len(attempts) == 2
+    failed |= not ok
+    print(f"{'✅' if ok else '❌'} failed batch retried: {attempts} -> {len(set(store.ids))}/8 stored")
+    ok = chunk_store.texts == 0
+    failed |= not ok
+    print(f"{'✅' if ok else '❌'} chat text kept out of the shared chunk store")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
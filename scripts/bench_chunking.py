@@ -0,0 +1,175 @@
+"""
+Benchmark the KB chunker against the old fixed 800-character slicer
+Builds a fixture corpus of PDF-like product catalogues (wrapped lines,
+headings, page headers and the same terms section after every product)
+with one known answer sentence per question, then reports chunk count,
+embedding tokens and retrieval hit-rate, and checks that deduplication
+drops repeated boilerplate but keeps chunks that differ only in a price.
+Retrieval uses BM25 as a stand-in for embeddings, so no API key is needed;
+a question is a hit when a top-k chunk contains its whole answer sentence.
+
+Usage: python scripts/bench_chunking.py [--products 40] [--top-k 3]
+"""
+import os
+import sys
+import math
+import random
+import re
+import argparse
+import textwrap
+from collections import Counter
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# The chunker needs no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+
+from app.core.kb.chunker import chunk_text, iter_chunks
+from app.utils.text import count_tokens
+
+FILLER = [
+    "Nossa metodologia combina aulas gravadas, encontros ao vivo e exercícios práticos.",
+    "Os alunos recebem materiais complementares em PDF e planilhas editáveis.",
+    "O conteúdo é atualizado periodicamente de acordo com as mudanças do mercado.",
+    "A comunidade exclusiva permite trocar experiências com outros empreendedores.",
+    "Cada módulo termina com uma avaliação para fixar o aprendizado.",
+    "O acesso pode ser feito pelo computador, tablet ou celular.",
+]
+TERMS = (
+    "Todos os direitos reservados. A reprodução deste material sem autorização "
+    "prévia e por escrito é proibida. Os valores podem ser alterados sem aviso "
+    "prévio e valem apenas para compras realizadas pelo site oficial. O acesso "
+    "é pessoal e intransferível, e o compartilhamento de login resulta no "
+    "cancelamento da matrícula sem reembolso. Em caso de dúvidas, consulte os "
+    "termos de uso completos ou fale com a nossa equipe de atendimento."
+)
+HEADER = "Vagner Treinamentos - Catálogo de produtos"
+
+
+def build_corpus(products: int, per_document: int = 5, seed: int = 7):
+    """(documents, questions); questions are (question, answer sentence)"""
+    rng = random.Random(seed)
+    pages, questions = [], []
+    for n in range(products):
+        name = f"Mentoria {rng.choice(['Alfa', 'Beta', 'Gama', 'Delta', 'Sigma', 'Ômega'])} {n}"
+        price = rng.randint(97, 1997)
+        hours = rng.randint(8, 120)
+        days = rng.choice([7, 15, 30])
+        facts = {
+            'price': f"O plano {name} custa R$ {price} por mês no cartão de crédito.",
+            'hours': f"A {name} tem {hours} horas de aulas gravadas e ao vivo.",
+            'refund': f"A garantia da {name} é de {days} dias após a compra.",
+        }
+        questions += [
+            (f"Quanto custa o plano {name}?", facts['price']),
+            (f"Quantas horas de aula tem a {name}?", facts['hours']),
+            (f"Qual é a garantia da {name}?", facts['refund']),
+        ]
+
+        def paragraph(fact):
+            sentences = rng.sample(FILLER, 3)
+            sentences.insert(rng.randint(0, 3), fact)
+            return textwrap.fill(' '.join(sentences), width=72)
+
+        pages.append(
+            f"{HEADER}\n{name.upper()}\n\n{paragraph(facts['price'])}\n\n"
+            f"1. Conteúdo do programa\n{paragraph(facts['hours'])}\n\n"
+            f"2. Garantia e suporte\n{paragraph(facts['refund'])}\n\n"
+            f"TERMOS E CONDIÇÕES\n{textwrap.fill(TERMS, 72)}"
+        )
+    docs = ['\n\n'.join(pages[i:i + per_document]) for i in range(0, len(pages), per_document)]
+    return docs, questions
+
+
+def fixed_chunks(text: str, size: int = 800):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# -------------------
+# BM25 retrieval (embedding stand-in)
+# -------------------
+def _terms(text: str):
+    return re.findall(r'\w+', text.lower())
+
+
+class BM25:
+    def __init__(self, chunks, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.tfs = [Counter(_terms(c)) for c in chunks]
+        self.lengths = [sum(tf.values()) for tf in self.tfs]
+        self.avg = sum(self.lengths) / max(len(chunks), 1)
+        df = Counter(term for tf in self.tfs for term in tf)
+        self.idf = {t: math.log(1 + (len(chunks) - n + 0.5) / (n + 0.5)) for t, n in df.items()}
+        self.k1, self.b = k1, b
+
+    def search(self, query: str, top_k: int):
+        terms = _terms(query)
+        scores = []
+        for i, tf in enumerate(self.tfs):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg)
+            score = sum(self.idf.get(t, 0) * tf[t] * (self.k1 + 1) / (tf[t] + norm) for t in terms if t in tf)
+            scores.append((score, i))
+        return [self.chunks[i] for _, i in sorted(scores, reverse=True)[:top_k]]
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def evaluate(label: str, chunks, questions, top_k: int):
+    index = BM25(chunks)
+    hits = 0
+    for question, answer in questions:
+        found = index.search(question, top_k)
+        hits += any(answer in _normalize(c) for c in found)
+    tokens = sum(count_tokens(c) for c in chunks)
+    print(f"{label:<24} chunks={len(chunks):>5}  embedding tokens={tokens:>7}  "
+          f"hit-rate@{top_k}={hits / len(questions):.0%}")
+    return len(chunks), tokens, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=40)
+    parser.add_argument('--top-k', type=int, default=3)
+    args = parser.parse_args()
+
+    docs, questions = build_corpus(args.products)
+    print(f"Fixture corpus: {len(docs)} documents, {len(questions)} questions\n")
+
+    baseline = evaluate("fixed 800 chars", [c for d in docs for c in fixed_chunks(d)], questions, args.top_k)
+    no_dedup = evaluate("chunker (no dedup)", [c for d in docs for c in chunk_text(d, dedup=False)],
+                        questions, args.top_k)
+    chunked = evaluate("chunker", [c for d in docs for c in chunk_text(d)], questions, args.top_k)
+
+    print(f"\nChunks: {chunked[0] / baseline[0]:.2f}x, embedding tokens: {chunked[1] / baseline[1]:.2f}x, "
+          f"hits: {chunked[2]} vs {baseline[2]} of {len(questions)} "
+          f"(dedup dropped {no_dedup[0] - chunked[0]} chunks)")
+
+    # A price list: long chunks that differ only in the price are all kept
+    body = ' '.join(FILLER)
+    prices = [f"# Plano A\n{body} O Plano A custa R$ {97 + n},00 por mês. {body}" for n in range(200)]
+    kept = list(iter_chunks(prices))
+    repeated = list(iter_chunks([f"# Termos\n{TERMS}", f"# Produto\nCusta R$ 97.\n\n{TERMS}"]))
+    checks = [
+        (chunked[0] < baseline[0] and chunked[1] < baseline[1], "fewer chunks and embedding tokens than 800 chars"),
+        (chunked[2] >= baseline[2], "retrieval at least as good"),
+        (len(kept) == 200, f"price variants kept ({len(kept)} of 200)"),
+        (len(list(iter_chunks([prices[0], prices[0]]))) == 1, "exact repeats dropped"),
+        (sum(TERMS[:40] in c for c in repeated) == 1, "repeated terms paragraph embedded once"),
+    ]
+    failed = False
+    for ok, message in checks:
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {message}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Per-format throughput of the KB document extractors
+Writes the same synthetic catalogue as PDF, DOCX (with a price table) and
+TXT, runs each through the extract -> chunk stage of ingestion and reports
+MB/s and chunks/sec. Exits non-zero if a format yields no chunks or loses
+the catalogue's prices, so it doubles as a smoke test for the registry.
+
+Usage: python scripts/bench_extractors.py [--pages 100] [--repeat 3]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import shutil
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# Extraction needs no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+
+from app.core.kb.extract import get_extractor, supported_extensions
+from app.core.kb.ingest import extract_document_chunks
+from scripts.bench_pdf_ingest import catalogue_pages, write_pdf
+
+PRICES = [(f"Mentoria Sigma {n}", f"R$ {97 + n * 10},00") for n in range(20)]
+
+
+def write_txt(path: str, pages):
+    with open(path, 'w', encoding='utf-8') as f:
+        for lines in pages:
+            f.write('\n'.join(lines) + '\n\n')
+        f.write("TABELA DE PREÇOS\n\n")
+        f.writelines(f"- {name}: {price}\n" for name, price in PRICES)
+
+
+def write_docx(path: str, pages):
+    from docx import Document
+    doc = Document()
+    for lines in pages:
+        paragraph = []
+        for line in lines + ['']:
+            if line and line[0].isdigit() and '. ' in line[:4]:
+                doc.add_heading(line, level=2)
+            elif line:
+                paragraph.append(line)
+            elif paragraph:
+                doc.add_paragraph(' '.join(paragraph))
+                paragraph = []
+    doc.add_heading("Tabela de preços", level=1)
+    table = doc.add_table(rows=1, cols=2)
+    table.rows[0].cells[0].text, table.rows[0].cells[1].text = "Produto", "Preço"
+    for name, price in PRICES:
+        row = table.add_row()
+        row.cells[0].text, row.cells[1].text = name, price
+    doc.save(path)
+
+
+def write_pdf_with_prices(path: str, pages):
+    write_pdf(path, pages + [["TABELA DE PREÇOS", ""] + [f"- {name}: {price}" for name, price in PRICES]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = catalogue_pages(args.pages, seed=1)
+    folder = tempfile.mkdtemp(prefix='bench_extract_')
+    failed = False
+    try:
+        files = {
+            '.pdf': write_pdf_with_prices,
+            '.docx': write_docx,
+            '.txt': write_txt,
+        }
+        print(f"Registered extensions: {', '.join(supported_extensions())}")
+        print(f"Catalogue of {args.pages} pages per format, best of {args.repeat}\n")
+        for ext, writer in files.items():
+            path = os.path.join(folder, f"catalogue{ext}")
+            writer(path, pages)
+            size = os.path.getsize(path) / 1e6
+
+            best, chunks = float('inf'), []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                chunks = extract_document_chunks(path)
+                best = min(best, time.perf_counter() - start)
+
+            text = ' '.join(chunks)
+            prices_found = sum(price in text for _, price in PRICES)
+            ok = chunks and prices_found == len(PRICES)
+            failed |= not ok
+            print(f"{get_extractor(path).name:<6} {size:6.2f} MB  {best:6.2f}s  {size / best:6.2f} MB/s  "
+                  f"{len(chunks):>5} chunks  {len(chunks) / best:8.1f} chunks/sec  "
+                  f"prices {prices_found}/{len(PRICES)} {'✅' if ok else '❌'}")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark and check the per-customer conversation memory
+Replays long sales conversations through ConversationMemory with a stand-in
+summarizer and reports the prompt tokens spent on history (against stuffing
+the full transcript), history() latency from the in-memory LRU and from
+SQLite, and checks the token budget, rolling summaries, persistence across
+restarts, LRU eviction and that the QA prompt receives the history.
+
+Usage: python scripts/bench_memory.py [--customers 200] [--turns 40]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import tempfile
+import shutil
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# The stand-ins need no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+
+from app.core.ai.memory import ConversationMemory
+from app.utils.text import count_tokens
+
+QUESTIONS = [
+    "Oi, meu nome é Ana e quero saber da mentoria {n}.",
+    "Quanto custa a mentoria {n}?",
+    "Tem garantia? E quantas aulas são?",
+    "Achei caro, tem desconto para pagar à vista?",
+    "Posso parcelar no cartão em 12 vezes?",
+    "Qual a diferença para o plano premium {n}?",
+]
+
+
+def reply_for(question: str) -> str:
+    return f"Claro! Sobre isso: {question.lower()} A mentoria inclui encontros ao vivo e suporte por WhatsApp."
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        check.failed = True
+
+
+check.failed = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--turns', type=int, default=40)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='bench_memory_')
+    db = os.path.join(folder, 'conversations.db')
+    summaries = []
+
+    def summarize(summary, transcript, max_tokens):
+        summaries.append(transcript)
+        lines = [l for l in transcript.splitlines() if l.startswith('Cliente:')]
+        return (summary + ' | ' if summary else '') + '; '.join(l[9:50] for l in lines)
+
+    try:
+        memory = ConversationMemory(db, max_customers=args.customers // 2, max_turns=12,
+                                    window_tokens=600, summary_tokens=150, summarize=summarize)
+        phones = [f"55119{i:08d}" for i in range(args.customers)]
+        history_tokens, adds, transcript = [], [], 0
+        for t in range(args.turns):
+            for n, phone in enumerate(phones):
+                question = QUESTIONS[t % len(QUESTIONS)].format(n=n)
+                history = memory.history(phone)
+                history_tokens.append(count_tokens(history))
+                if n == 0:
+                    transcript += count_tokens(f"Cliente: {question}\nAgente: {reply_for(question)}")
+                start = time.perf_counter()
+                memory.add_turn(phone, question, reply_for(question))
+                adds.append((time.perf_counter() - start) * 1000)
+        memory.close()
+        stats = memory.stats()
+
+        print(f"{args.customers} customers x {args.turns} turns, LRU of {args.customers // 2}\n")
+        print(f"history tokens per prompt: avg {statistics.mean(history_tokens):6.1f}  "
+              f"max {max(history_tokens)}   (full transcript after {args.turns} turns: {transcript})")
+        print(f"add_turn: p50 {statistics.median(adds):.3f} ms  max {max(adds):.2f} ms   "
+              f"summaries {stats['summaries']}  evictions {stats['evictions']}")
+
+        check(max(history_tokens) <= 600, f"history stays within the 600-token window (max {max(history_tokens)})")
+        check(stats['summaries'] > 0 and stats['summary_failures'] == 0, "older turns folded into summaries")
+
+        # Latency: cached vs loaded from SQLite (evicted, or after a restart)
+        hot_phone = phones[-1]
+        hot = []
+        for _ in range(200):
+            start = time.perf_counter()
+            memory.history(hot_phone)
+            hot.append((time.perf_counter() - start) * 1000)
+        restarted = ConversationMemory(db, summarize=summarize)
+        cold = []
+        for phone in phones[:200]:
+            start = time.perf_counter()
+            restarted.history(phone)
+            cold.append((time.perf_counter() - start) * 1000)
+        print(f"history(): cached p50 {statistics.median(hot):.3f} ms   "
+              f"from SQLite p50 {statistics.median(cold):.3f} ms\n")
+
+        before = memory.history(phones[0])
+        after = restarted.history(phones[0])
+        check(before == after and 'Resumo da conversa anterior' in after,
+              "summary and recent turns survive a restart")
+        check(len(memory._conversations) <= args.customers // 2, "idle customers evicted from the LRU")
+
+        # The QA prompt receives the history
+        from langchain_core.language_models.fake import FakeListLLM
+        from langchain_core.documents import Document
+        from app.core.ai import llm as llm_module
+
+        prompts = []
+
+        class RecordingLLM(FakeListLLM):
+            def _call(self, prompt, *a, **kw):
+                prompts.append(prompt)
+                return super()._call(prompt, *a, **kw)
+
+        llm_module.get_llm = lambda: RecordingLLM(responses=["ok"])
+        llm_module.get_qa_chain.cache_clear()
+        llm_module.generate_ai_response("E o desconto?", docs=[Document(page_content="Preço R$ 297")],
+                                        history=after)
+        check(prompts and after.splitlines()[-1] in prompts[0] and "Preço R$ 297" in prompts[0],
+              "history and KB context both reach the prompt")
+        llm_module.generate_ai_response("Oi", docs=[])
+        check("primeira mensagem" in prompts[-1], "first message gets the no-history marker")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    sys.exit(1 if check.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Benchmark PDF ingestion on large synthetic catalogues
+Compares the old path (PyPDF2, extract_text() twice per page, every page,
+chunk and vector held in memory before the first upsert) with the streaming
+add_file_to_kb (pypdf, page -> chunks -> embedding batch -> upsert) and with
+the Ingestor, which parses page slices of several files in parallel.
+Embeddings and the vector store are in-memory stand-ins, so only the parsing,
+chunking and batching work is measured. Peak memory is the tracemalloc peak
+of this process (the Ingestor's parser processes are not included).
+
+Usage: python scripts/bench_pdf_ingest.py [--pages 300] [--files 2]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import shutil
+import textwrap
+import tracemalloc
+
+import numpy as np
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# The stand-ins need no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+
+from app.core.kb import manager
+from app.core.kb.chunker import chunk_text
+from app.core.kb.ingest import Ingestor, IngestManifest
+from app.core.kb.vectorstore import VectorStore
+
+DIM = 1536
+SENTENCES = [
+    "Nossa metodologia combina aulas gravadas, encontros ao vivo e exercícios práticos.",
+    "Os alunos recebem materiais complementares em PDF e planilhas editáveis.",
+    "O conteúdo é atualizado periodicamente de acordo com as mudanças do mercado.",
+    "A comunidade exclusiva permite trocar experiências com outros empreendedores.",
+    "Cada módulo termina com uma avaliação para fixar o aprendizado.",
+    "O acesso pode ser feito pelo computador, tablet ou celular.",
+    "O suporte responde dúvidas por e-mail e WhatsApp em dias úteis.",
+    "O certificado é emitido ao final do curso para quem concluir as atividades.",
+]
+
+
+# -------------------
+# Synthetic PDFs
+# -------------------
+def _pdf_string(line: str) -> bytes:
+    escaped = line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b'(' + escaped.encode('cp1252', errors='replace') + b')'
+
+
+def write_pdf(path: str, pages: list):
+    """Minimal PDF with one Helvetica text stream per page; pages are lists of lines"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for lines in pages:
+        stream = b"BT /F1 10 Tf 12 TL 40 800 Td " + b" ".join(_pdf_string(l) + b" '" for l in lines) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def catalogue_pages(n_pages: int, seed: int):
+    rng = random.Random(seed)
+    pages = []
+    for p in range(n_pages):
+        lines = ["Vagner Treinamentos - Catálogo de produtos", ""]
+        while len(lines) < 60:
+            if rng.random() < 0.2:
+                lines += ["", f"{rng.randint(1, 9)}. Módulo {p}-{len(lines)}", ""]
+            paragraph = ' '.join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 6)))
+            lines += textwrap.wrap(f"Página {p}: {paragraph}", width=95) + [""]
+        pages.append(lines[:60])
+    return pages
+
+
+# -------------------
+# Stand-ins
+# -------------------
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return np.random.rand(len(texts), DIM).astype(np.float32).tolist()
+
+
+class CountingStore(VectorStore):
+    name = 'counting'
+
+    def __init__(self):
+        self.vectors = 0
+
+    def upsert(self, vectors):
+        self.vectors += len(vectors)
+
+    def query(self, vector, top_k, include_metadata=True, filter=None):
+        return {'matches': []}
+
+    def delete(self, ids):
+        pass
+
+
+class NullChunkStore:
+    def put_many(self, items):
+        for _ in items:
+            pass
+
+    def delete_many(self, ids):
+        pass
+
+
+# -------------------
+# Pipelines
+# -------------------
+def old_add_file(path: str):
+    """add_file_to_kb before streaming: everything in memory, extract_text() twice"""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    texts = [p.extract_text() for p in reader.pages if p.extract_text()]
+    chunks = chunk_text("\n\n".join(texts))
+    vectors = manager._embed_texts(chunks)
+    to_upsert = [(manager.chunk_id("doc", path, c), v, {"source": path}) for c, v in zip(chunks, vectors)]
+    manager._upsert_chunks(to_upsert, chunks)
+
+
+def run(label, fn, paths, store):
+    store.vectors = 0
+    start = time.perf_counter()
+    fn(paths)
+    elapsed = time.perf_counter() - start
+
+    store.vectors = 0
+    tracemalloc.start()
+    fn(paths)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:7.2f}s  {store.vectors / elapsed:8.1f} chunks/sec  "
+          f"peak memory {peak / 1e6:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--files', type=int, default=2)
+    args = parser.parse_args()
+
+    store = CountingStore()
+    manager.get_embeddings = lambda: FakeEmbeddings()
+    manager.get_vector_store = lambda: store
+    manager.get_chunk_store = lambda: NullChunkStore()
+
+    folder = tempfile.mkdtemp(prefix='bench_pdf_')
+    try:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(folder, f"catalogue_{i}.pdf")
+            write_pdf(path, catalogue_pages(args.pages, seed=i))
+            paths.append(path)
+        size = sum(os.path.getsize(p) for p in paths) / 1e6
+        print(f"{args.files} PDFs x {args.pages} pages ({size:.1f} MB), {os.cpu_count()} CPUs\n")
+
+        def ingestor(paths):
+            # A fresh manifest each time, so nothing is skipped
+            db = os.path.join(folder, f"manifest_{time.time_ns()}.db")
+            ing = Ingestor(manifest=IngestManifest(db), requests_per_minute=0)
+            ing.ingest_files(paths)
+            ing.close()
+
+        run("old (PyPDF2, all in memory)", lambda ps: [old_add_file(p) for p in ps], paths, store)
+        run("streaming add_file_to_kb", lambda ps: [manager.add_file_to_kb(p) for p in ps], paths, store)
+        run("Ingestor (parallel slices)", ingestor, paths, store)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
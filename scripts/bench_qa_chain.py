@@ -0,0 +1,194 @@
+"""
+Benchmark the QA chain against the old RetrievalQA setup
+Runs the same question, KB documents and prompt through the deprecated
+RetrievalQA/StuffDocumentsChain and through get_qa_chain() with a stand-in
+LLM that answers instantly, so the timings are the chain's own per-call
+overhead. Then compares answering a burst of customers one by one against
+batch() and asyncio.gather(ainvoke()) with an LLM that takes --latency
+seconds, and checks that astream() yields the answer in pieces.
+
+Usage: python scripts/bench_qa_chain.py [--calls 500] [--burst 8] [--latency 0.2]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import warnings
+import statistics
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# The stand-ins need no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+os.environ['SEMANTIC_CACHE_ENABLED'] = 'false'
+
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.ai import llm as llm_module
+from app.core.ai.prompts import NO_HISTORY, get_qa_prompt_template
+
+ANSWER = "A Mentoria Sigma custa R$ 297,00 à vista ou 12x de R$ 29,70. Quer o link de pagamento?"
+DOCS = [
+    Document(page_content="Mentoria Sigma: R$ 297,00 à vista ou 12 parcelas de R$ 29,70 no cartão."),
+    Document(page_content="São oito semanas de encontros ao vivo, com gravações liberadas no mesmo dia."),
+    Document(page_content="Garantia de sete dias: se não gostar, devolvemos todo o valor."),
+]
+HISTORY = "Cliente: Oi, quero saber da mentoria\nAgente: Claro! Qual a sua dúvida?"
+
+
+class FixedRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return DOCS
+
+
+class SlowChatModel(BaseChatModel):
+    """Stand-in chat model (like ChatOpenAI) that takes `latency` seconds per answer"""
+    latency: float = 0.0
+    prompts: list = []
+
+    @property
+    def _llm_type(self):
+        return 'slow-fake'
+
+    def _result(self, messages):
+        self.prompts.append(messages[-1].content)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=ANSWER))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in ANSWER.split(' '):
+            await asyncio.sleep(self.latency / 20)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + ' '))
+
+
+def use_llm(llm):
+    llm_module.get_llm = lambda: llm
+    llm_module.get_retriever = lambda: FixedRetriever()
+    llm_module.get_qa_chain.cache_clear()
+
+
+def per_call_ms(fn, calls):
+    for _ in range(min(20, calls)):  # warm up
+        fn()
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def old_chain(llm):
+    """The setup generate_ai_response used before: RetrievalQA with a stuff chain"""
+    from langchain.chains import RetrievalQA
+    # RetrievalQA only passes the question through, so history is fixed in the prompt
+    qa = RetrievalQA.from_chain_type(
+        llm=llm, retriever=FixedRetriever(), chain_type='stuff',
+        chain_type_kwargs={'prompt': get_qa_prompt_template().partial(history=NO_HISTORY)}
+    )
+    stuff = RetrievalQA.from_chain_type(
+        llm=llm, retriever=FixedRetriever(), chain_type='stuff',
+        chain_type_kwargs={'prompt': get_qa_prompt_template()}
+    ).combine_documents_chain
+    return qa, stuff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--burst', type=int, default=8, help="customers answered at once")
+    parser.add_argument('--latency', type=float, default=0.2, help="stand-in LLM seconds per answer")
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')  # RetrievalQA and Chain.run are deprecated
+
+    # Per-call overhead with an instant model
+    fast = SlowChatModel()
+    use_llm(fast)
+    qa, stuff = old_chain(fast)
+    chain = llm_module.get_qa_chain()
+    rows = [
+        ("RetrievalQA.run (retriever)", lambda: qa.run("Quanto custa?")),
+        ("get_qa_chain (retriever)", lambda: chain.invoke(llm_module.qa_inputs("Quanto custa?"))),
+        ("StuffDocumentsChain.run (docs)", lambda: stuff.run(input_documents=DOCS, question="Quanto custa?",
+                                                             history=HISTORY)),
+        ("get_qa_chain (docs)", lambda: chain.invoke(llm_module.qa_inputs("Quanto custa?", DOCS, HISTORY))),
+    ]
+    print(f"per-call chain overhead, instant LLM, median of {args.calls} calls\n")
+    overhead = {}
+    for label, fn in rows:
+        overhead[label] = per_call_ms(fn, args.calls)
+        print(f"{label:<32} {overhead[label]:7.3f} ms")
+
+    # A burst of customers with a model that takes a while
+    use_llm(SlowChatModel(latency=args.latency))
+    chain = llm_module.get_qa_chain()
+    inputs = [llm_module.qa_inputs(f"Pergunta {i}", DOCS) for i in range(args.burst)]
+
+    start = time.perf_counter()
+    sequential = [chain.invoke(i) for i in inputs]
+    sequential_s = time.perf_counter() - start
+    start = time.perf_counter()
+    batched = chain.batch(inputs)
+    batch_s = time.perf_counter() - start
+
+    async def gather():
+        return await asyncio.gather(*(chain.ainvoke(i) for i in inputs))
+
+    start = time.perf_counter()
+    gathered = asyncio.run(gather())
+    gather_s = time.perf_counter() - start
+
+    async def pieces():
+        return [p async for p in llm_module.astream_ai_response("Quanto custa?", DOCS)]
+
+    streamed = asyncio.run(pieces())
+    print(f"\n{args.burst} customers, LLM {args.latency:.2f}s per answer\n")
+    print(f"invoke one by one   {sequential_s:6.2f}s")
+    print(f"batch               {batch_s:6.2f}s")
+    print(f"gather(ainvoke)     {gather_s:6.2f}s\n")
+
+    # The prompt the model sees
+    use_llm(SlowChatModel(prompts=[]))
+    prompts = llm_module.get_llm().prompts
+    llm_module.generate_ai_response("Quanto custa?")
+    llm_module.generate_ai_response("E a garantia?", docs=DOCS[:1], history=HISTORY)
+
+    failed = False
+    checks = [
+        (overhead["get_qa_chain (docs)"] - overhead["StuffDocumentsChain.run (docs)"] < 1.0,
+         "chain overhead within 1 ms of the old chain (an answer takes 1-2 s)"),
+        (sequential == batched == list(gathered) == [ANSWER] * args.burst, "batch and ainvoke give the same answers"),
+        (batch_s < sequential_s / 2 and gather_s < sequential_s / 2, "a burst is answered concurrently"),
+        (len(streamed) > 1 and ''.join(streamed).strip() == ANSWER, "astream yields the answer in pieces"),
+        (len(prompts) == 2 and all(d.page_content in prompts[0] for d in DOCS) and NO_HISTORY in prompts[0],
+         "without docs the retriever fills the context"),
+        (DOCS[0].page_content in prompts[1] and DOCS[2].page_content not in prompts[1] and HISTORY in prompts[1],
+         "given docs and history are used as they are"),
+        (get_qa_prompt_template() is get_qa_prompt_template(), "prompt template compiled once"),
+    ]
+    for ok, message in checks:
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {message}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark the semantic answer cache on a stream of FAQ variants
+Replays customer first messages drawn from 50 FAQs (10 products x 5
+questions), each asked in several wordings with fillers, typos and
+punctuation changes, through SemanticCache. Reports hit rate, wrong answers
+served, lookup latency with a full cache and LLM time saved, and checks TTL
+expiry and invalidation when the KB version changes.
+
+The embeddings are a lexical stand-in (hashed words and character trigrams),
+not text-embedding-3-small, so the threshold here is lower than the
+production default; pass --threshold to explore.
+
+Usage: python scripts/bench_semantic_cache.py [--messages 2000] [--threshold 0.8]
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import unicodedata
+
+import numpy as np
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# The stand-ins need no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+
+from app.core.ai.semantic_cache import SemanticCache
+
+DIM = 1536
+LLM_SECONDS = 1.8  # typical QA chain answer time the cache avoids
+
+PRODUCTS = ["Mentoria Sigma", "Curso Alfa", "Método Vértice", "Imersão Delta", "Clube Ômega",
+            "Programa Atlas", "Workshop Prisma", "Formação Órion", "Jornada Zênite", "Trilha Kappa"]
+INTENTS = {
+    'preco': ["quanto custa o {p}", "qual o valor do {p}", "qual o preço do {p}"],
+    'acesso': ["como recebo o acesso ao {p}", "quando libera o acesso do {p}", "como faço para acessar o {p}"],
+    'funciona': ["como funciona o {p}", "me explica como é o {p}", "o que tem no {p}"],
+    'garantia': ["o {p} tem garantia", "qual a garantia do {p}", "posso pedir reembolso do {p}"],
+    'parcela': ["posso parcelar o {p}", "o {p} pode ser parcelado no cartão", "dá pra pagar o {p} em parcelas"],
+}
+FILLERS = ["", "oi, ", "olá! ", "boa tarde, ", "oi tudo bem? "]
+ENDINGS = ["?", "??", "", " por favor?", "? obrigado"]
+
+
+def strip_accents(text: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn')
+
+
+def embed(text: str):
+    """Hashed bag of words and character trigrams, L2-normalized"""
+    text = strip_accents(text.lower())
+    words = ''.join(c if c.isalnum() else ' ' for c in text).split()
+    vec = np.zeros(DIM, dtype=np.float32)
+    features = words + [f"#{w[i:i + 3]}" for w in words for i in range(max(1, len(w) - 2))]
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+        vec[h % DIM] += 1.0 if (h >> 63) else -1.0
+    return (vec / (np.linalg.norm(vec) or 1)).tolist()
+
+
+def typo(text: str, rng: random.Random) -> str:
+    if len(text) < 8 or rng.random() < 0.7:
+        return text
+    i = rng.randrange(2, len(text) - 2)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def messages(n: int, seed: int = 7):
+    """(faq key, message), FAQs chosen with a Zipf-like skew as in real traffic"""
+    rng = random.Random(seed)
+    faqs = [(product, intent) for product in PRODUCTS for intent in INTENTS]
+    weights = [1 / (rank + 1) for rank in range(len(faqs))]
+    rng.shuffle(faqs)
+    for _ in range(n):
+        product, intent = rng.choices(faqs, weights)[0]
+        template = rng.choice(INTENTS[intent])
+        text = rng.choice(FILLERS) + template.format(p=product) + rng.choice(ENDINGS)
+        if rng.random() < 0.5:
+            text = text.capitalize()
+        yield (product, intent), typo(text, rng)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    args = parser.parse_args()
+
+    failed = False
+    version = ['v1']
+    cache = SemanticCache(threshold=args.threshold, embed=embed, version=lambda: version[0])
+    wrong = 0
+    for faq, text in messages(args.messages):
+        found = cache.lookup(text)
+        if found.answer is None:
+            cache.store(text, f"answer:{faq}", LLM_SECONDS, found.vector)
+        elif found.answer != f"answer:{faq}":
+            wrong += 1
+    stats = cache.stats()
+    print(f"{args.messages} first messages over 50 FAQs, threshold {args.threshold}\n")
+    print(f"hit rate {stats['hit_rate']:.1%}  ({stats['hits']} hits, {stats['misses']} LLM calls, "
+          f"{stats['entries']} entries)   wrong answers served: {wrong}")
+    print(f"avg lookup {stats['avg_lookup_ms']:.2f} ms (stand-in embedding included)   "
+          f"LLM time saved {stats['seconds_saved'] / 60:.1f} min at {LLM_SECONDS}s per answer")
+
+    # Matrix lookup cost with a full cache
+    full = SemanticCache(threshold=0.99, max_entries=2000, embed=embed, version=lambda: 'v1')
+    rng = np.random.default_rng(1)
+    for i in range(2000):
+        full.store(f"pergunta sintética {i}", "x", vector=rng.standard_normal(DIM).astype(np.float32))
+    query = np.asarray(embed("quanto custa o curso alfa?"), dtype=np.float32)
+    full.embed = lambda text: query
+    start = time.perf_counter()
+    for _ in range(500):
+        full.lookup("quanto custa o curso alfa?")
+    print(f"lookup over 2000 cached answers: {(time.perf_counter() - start) / 500 * 1000:.3f} ms "
+          f"(matrix product only)\n")
+
+    checks = [
+        (stats['hit_rate'] >= 0.5 and wrong / max(1, stats['hits']) < 0.02,
+         "most repeats served from the cache, almost never the wrong FAQ"),
+    ]
+    version[0] = 'v2'  # KB re-ingested
+    checks.append((cache.lookup("quanto custa o curso alfa?").answer is None and cache.stats()['entries'] == 0,
+                   "every answer dropped when the KB version changes"))
+    cache.store("quanto custa o curso alfa?", "old")
+    cache.ttl = 0
+    checks.append((cache.lookup("quanto custa o curso alfa?").answer is None, "expired answers are not served"))
+    checks.append((cache.lookup("sim").answer is None and cache.stats()['skipped'] == 1,
+                   "short contextual messages bypass the cache"))
+    for ok, message in checks:
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {message}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Benchmark time-to-first-message for streamed replies
+Runs MessageHandler's reply step twice with stand-in LLM, TTS and WhatsApp
+clients: the blocking path (whole completion, then text, then one TTS call)
+and astream_reply (first sentence sent as soon as it is generated, speech
+synthesized per sentence in parallel). Reports when the customer receives
+the first text, the whole text and the voice note, and checks that a reply
+whose send fails or that is cancelled leaves no TTS thread or upload behind.
+Without ffmpeg the Opus encoder is replaced by a pass-through.
+
+Usage: python scripts/bench_streaming_reply.py [--tokens-per-sec 40] [--tts-latency 0.4]
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import threading
+import argparse
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# The stand-ins need no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+os.environ['TTS_CACHE_ENABLED'] = 'false'
+
+from app.config import get_settings
+from app.core.speech import tts
+from app.services import message_handler
+from app.services.message_handler import MessageHandler
+
+REPLY = ("Oi, tudo bem? Que bom que você se interessou pela Mentoria Sigma! "
+         "Ela custa R$ 297,00 à vista ou 12 parcelas de R$ 29,70 no cartão. "
+         "São oito semanas de encontros ao vivo, com gravações liberadas no mesmo dia. "
+         "Você também entra na comunidade exclusiva e tem suporte pelo WhatsApp em dias úteis. "
+         "E a garantia é de sete dias: se não gostar, devolvemos todo o valor. "
+         "Quer que eu te envie o link de pagamento?")
+
+
+class FakeWhatsApp:
+    def __init__(self, start):
+        self.start = start
+        self.events = []
+
+    def log(self, kind, detail=''):
+        self.events.append((time.perf_counter() - self.start, kind, detail))
+
+    async def send_text(self, to, body):
+        await asyncio.sleep(0.15)
+        self.log('text', body)
+        return {}
+
+    async def upload_media_stream(self, chunks, filename='reply.ogg', mime_type='audio/ogg'):
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+        await asyncio.sleep(0.2)
+        return {'id': 'media', 'bytes': size}
+
+    async def send_uploaded_audio(self, to, up):
+        await asyncio.sleep(0.15)
+        self.log('audio', f"{up['bytes']} bytes")
+        return {}
+
+
+def install_stand_ins(tokens_per_sec, tts_latency):
+    words = REPLY.split(' ')
+    total = len(words) / tokens_per_sec
+
+    async def astream(user_text, docs=None, history=""):
+        for i, word in enumerate(words):
+            await asyncio.sleep(1 / tokens_per_sec)
+            yield word if i == 0 else ' ' + word
+
+    def generate(user_text, docs=None, history="", use_cache=True):
+        time.sleep(total)
+        return REPLY
+
+    def speech_mp3(text):
+        # Time to first byte, then audio roughly as long as the text takes to read
+        time.sleep(tts_latency + len(text) * 0.002)
+        yield text.encode('utf-8')
+
+    message_handler.astream_ai_response = astream
+    message_handler.generate_ai_response = generate
+    tts.stream_speech_mp3 = speech_mp3
+    if shutil.which('ffmpeg') is None:
+        tts.transcode_to_opus = lambda mp3_chunks, read_size=0: iter(mp3_chunks)
+
+
+async def run(label, streaming):
+    handler = MessageHandler.__new__(MessageHandler)
+    handler.settings = get_settings()
+    handler.tts_cache = None
+    start = time.perf_counter()
+    handler.whatsapp_async = wa = FakeWhatsApp(start)
+    if streaming:
+        reply, _ = await handler.astream_reply('5511900000000', 'Quanto custa?', [], '')
+    else:
+        reply = await asyncio.to_thread(message_handler.generate_ai_response, 'Quanto custa?', [], '')
+        await handler.asend_reply('5511900000000', reply)
+    texts = [e for e in wa.events if e[1] == 'text']
+    audio = [e for e in wa.events if e[1] == 'audio']
+    sent = ' '.join(e[2] for e in texts)
+    print(f"{label:<26} first text {texts[0][0]:5.2f}s  whole text {texts[-1][0]:5.2f}s  "
+          f"voice note {audio[0][0] if audio else float('nan'):5.2f}s  ({len(texts)} texts)")
+    return reply, sent, texts, audio
+
+
+async def interrupted():
+    """A stream that breaks after the first sentence: the start is sent, but flagged incomplete"""
+    async def astream(user_text, docs=None, history=""):
+        for word in REPLY.split(' ')[:20]:
+            yield word + ' '
+        raise ConnectionError("stream reset")
+
+    handler = MessageHandler.__new__(MessageHandler)
+    handler.settings = get_settings()
+    handler.tts_cache = None
+    handler.whatsapp_async = FakeWhatsApp(time.perf_counter())
+    saved, message_handler.astream_ai_response = message_handler.astream_ai_response, astream
+    try:
+        return await handler.astream_reply('5511900000000', 'Quanto custa?', [], '')
+    finally:
+        message_handler.astream_ai_response = saved
+
+
+async def abandoned(cancel: bool):
+    """A reply cancelled mid-stream, or whose second text fails: returns (TTS thread ended, nothing left running)"""
+    handler = MessageHandler.__new__(MessageHandler)
+    handler.settings = get_settings()
+    handler.tts_cache = None
+    handler.whatsapp_async = wa = FakeWhatsApp(time.perf_counter())
+    if not cancel:
+        send_text = wa.send_text
+
+        async def failing_send(to, body):
+            if wa.events:
+                raise ConnectionError("send failed")
+            return await send_text(to, body)
+
+        wa.send_text = failing_send
+    task = asyncio.ensure_future(handler.astream_reply('5511900000000', 'Quanto custa?', [], ''))
+    if cancel:
+        await asyncio.sleep(0.5)
+        task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    for _ in range(50):
+        if not any(t.name == 'tts-sentences' for t in threading.enumerate()):
+            break
+        await asyncio.sleep(0.1)
+    thread_ended = not any(t.name == 'tts-sentences' for t in threading.enumerate())
+    return thread_ended, asyncio.all_tasks() == {asyncio.current_task()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tokens-per-sec', type=float, default=40)
+    parser.add_argument('--tts-latency', type=float, default=0.4, help="seconds to the first TTS byte")
+    args = parser.parse_args()
+    install_stand_ins(args.tokens_per_sec, args.tts_latency)
+
+    print(f"{len(REPLY.split())} words at {args.tokens_per_sec:.0f} tokens/s, "
+          f"TTS first byte after {args.tts_latency:.1f}s\n")
+    _, _, blocking_texts, blocking_audio = asyncio.run(run("blocking (run, then send)", streaming=False))
+    reply, sent, texts, audio = asyncio.run(run("streamed (astream_reply)", streaming=True))
+    partial, completed = asyncio.run(interrupted())
+    cancelled = asyncio.run(abandoned(cancel=True))
+    send_failed = asyncio.run(abandoned(cancel=False))
+
+    failed = False
+    checks = [
+        (reply == REPLY and sent == REPLY, "customer receives the whole reply, unchanged"),
+        (len(texts) == 2 and texts[0][2] == "Oi, tudo bem? Que bom que você se interessou pela Mentoria Sigma!",
+         "first sentence sent on its own"),
+        (texts[0][0] < blocking_texts[0][0] / 2, "first text arrives in under half the blocking time"),
+        (audio and audio[0][0] < blocking_audio[0][0], "voice note arrives earlier"),
+        (not completed and partial and REPLY.startswith(partial), "an interrupted stream is flagged incomplete"),
+        (cancelled == (True, True), "a cancelled reply ends its TTS thread and upload"),
+        (send_failed == (True, True), "a failed send ends its TTS thread and upload"),
+    ]
+    print()
+    for ok, message in checks:
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {message}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
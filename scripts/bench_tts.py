@@ -0,0 +1,136 @@
+"""
+Benchmark TTS post-processing per reply
+Replays an MP3 clip as if ElevenLabs were streaming it and compares the old
+path (write the MP3, re-read it with pydub, export OGG) with the piped
+ffmpeg Opus transcoder. Reports wall time, time to the first uploadable
+byte and CPU time (this process plus ffmpeg) per reply.
+
+Needs ffmpeg on PATH.
+Usage: python scripts/bench_tts.py [--replies 10] [--seconds 12] [--synth-ms 1500]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# No ElevenLabs call is made; the clip is replayed locally
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+
+from pydub import AudioSegment
+from app.core.speech.tts import transcode_to_opus
+
+CHUNK_SIZE = 4096
+
+
+def make_sample(path: str, seconds: int):
+    """Speech-length MP3 in the format ElevenLabs returns (mp3_44100_128)"""
+    subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+         '-f', 'lavfi', '-i', f'sine=frequency=220:duration={seconds}',
+         '-ar', '44100', '-c:a', 'libmp3lame', '-b:a', '128k', path],
+        check=True
+    )
+
+
+def synth_stream(mp3: bytes, synth_seconds: float):
+    """MP3 chunks paced as if the whole clip took synth_seconds to synthesize"""
+    n_chunks = max(1, len(mp3) // CHUNK_SIZE)
+    delay = synth_seconds / n_chunks
+    for i in range(0, len(mp3), CHUNK_SIZE):
+        time.sleep(delay)
+        yield mp3[i:i + CHUNK_SIZE]
+
+
+def legacy_reply(mp3: bytes, synth_seconds: float, tmp: str):
+    """The old path; the upload can only start once the OGG file is complete"""
+    tmp_mp3 = os.path.join(tmp, 'temp.mp3')
+    out_file = os.path.join(tmp, 'reply.ogg')
+    with open(tmp_mp3, 'wb') as f:
+        for chunk in synth_stream(mp3, synth_seconds):
+            f.write(chunk)
+    audio = AudioSegment.from_file(tmp_mp3, format='mp3')
+    audio.export(out_file, format='ogg')
+    os.remove(tmp_mp3)
+    os.remove(out_file)
+
+
+def streamed_reply(mp3: bytes, synth_seconds: float, start: float):
+    """The piped path; returns seconds until the first Opus byte could be uploaded"""
+    first = None
+    for _ in transcode_to_opus(synth_stream(mp3, synth_seconds)):
+        if first is None:
+            first = time.perf_counter() - start
+    return first
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def measure(replies: int, run) -> tuple:
+    wall, first, cpu = [], [], []
+    for _ in range(replies):
+        cpu_start = cpu_seconds()
+        start = time.perf_counter()
+        first_byte = run(start)
+        wall.append(time.perf_counter() - start)
+        first.append(wall[-1] if first_byte is None else first_byte)
+        cpu.append(cpu_seconds() - cpu_start)
+    return wall, first, cpu
+
+
+def report(name: str, wall: list, first: list, cpu: list):
+    print(f"  {name:<26} wall={statistics.mean(wall) * 1000:7.1f} ms  "
+          f"first byte={statistics.mean(first) * 1000:7.1f} ms  "
+          f"cpu={statistics.mean(cpu) * 1000:6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--replies', type=int, default=10)
+    parser.add_argument('--seconds', type=int, default=12, help='length of the spoken reply')
+    parser.add_argument('--synth-ms', type=float, default=1500.0,
+                        help='time ElevenLabs takes to stream the whole clip')
+    args = parser.parse_args()
+
+    if not shutil.which('ffmpeg'):
+        print('❌ ffmpeg not found on PATH')
+        sys.exit(1)
+
+    tmp = tempfile.mkdtemp()
+    sample = os.path.join(tmp, 'sample.mp3')
+    make_sample(sample, args.seconds)
+    with open(sample, 'rb') as f:
+        mp3 = f.read()
+    synth_seconds = args.synth_ms / 1000
+
+    print("=" * 60)
+    print(f"🔊 TTS post-processing ({args.replies} replies, {args.seconds}s of speech, "
+          f"{args.synth_ms:.0f} ms synthesis)")
+    print("=" * 60)
+
+    report('before (mp3 file + pydub)',
+           *measure(args.replies, lambda start: legacy_reply(mp3, synth_seconds, tmp)))
+    report('after (piped Opus)',
+           *measure(args.replies, lambda start: streamed_reply(mp3, synth_seconds, start)))
+    print("  first byte = when the WhatsApp upload can start")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
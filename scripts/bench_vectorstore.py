@@ -0,0 +1,147 @@
+"""
+Benchmark the local vector store against a Pinecone stand-in
+The stand-in answers with exact float64 cosine search plus a simulated
+network round-trip, so it doubles as ground truth for recall@k.
+
+Usage: python scripts/bench_vectorstore.py [--vectors 5000] [--queries 200] [--rtt-ms 40]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import shutil
+import statistics
+
+import numpy as np
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# The local store needs no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+
+from app.core.kb.vectorstore import LocalVectorStore, VectorStore, _matches_filter
+
+DIM = 1536
+
+
+class PineconeStandIn(VectorStore):
+    """Exact search in float64 behind a fixed round-trip delay"""
+
+    name = 'pinecone stand-in'
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.ids, self.meta, self.rows = [], [], []
+
+    def upsert(self, vectors):
+        for vid, values, meta in vectors:
+            self.ids.append(vid)
+            self.meta.append(meta)
+            self.rows.append(np.asarray(values, dtype=np.float64))
+        matrix = np.vstack(self.rows)
+        self.matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def query(self, vector, top_k, include_metadata=True, filter=None):
+        time.sleep(self.rtt)
+        q = np.asarray(vector, dtype=np.float64)
+        scores = self.matrix @ (q / np.linalg.norm(q))
+        if filter:
+            allowed = np.array([_matches_filter(m, filter) for m in self.meta])
+            scores = np.where(allowed, scores, -np.inf)
+        top = np.argsort(-scores)[:top_k]
+        return {'matches': [
+            {'id': self.ids[i], 'score': float(scores[i]), 'metadata': self.meta[i]}
+            for i in top if np.isfinite(scores[i])
+        ]}
+
+    def delete(self, ids):
+        drop = set(ids)
+        keep = [i for i, vid in enumerate(self.ids) if vid not in drop]
+        self.ids = [self.ids[i] for i in keep]
+        self.meta = [self.meta[i] for i in keep]
+        self.rows = [self.rows[i] for i in keep]
+
+
+def make_corpus(n: int, clusters: int = 50, seed: int = 7):
+    """Clustered vectors (chunks of the same document are close to each other)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, DIM))
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.6 * rng.normal(size=(n, DIM))
+    items = [
+        (f"doc_{i}", vectors[i].tolist(), {'type': 'media' if i % 20 == 0 else 'text', 'source': f"src_{labels[i]}"})
+        for i in range(n)
+    ]
+    queries = centers[rng.integers(0, clusters, size=n)] + 0.8 * rng.normal(size=(n, DIM))
+    return items, queries
+
+
+def run(store: VectorStore, queries, top_k: int, flt=None):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        res = store.query(q.tolist(), top_k=top_k, filter=flt)
+        latencies.append(time.perf_counter() - start)
+        results.append([m['id'] for m in res['matches']])
+    return latencies, results
+
+
+def recall(results, truth) -> float:
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    total = sum(len(t) for t in truth)
+    return hits / total if total else 1.0
+
+
+def report(name: str, latencies: list, rec: float):
+    ms = [s * 1000 for s in latencies]
+    p95 = statistics.quantiles(ms, n=20)[18] if len(ms) >= 20 else max(ms)
+    print(f"  {name:<30} p50={statistics.median(ms):8.3f} ms  p95={p95:8.3f} ms  recall={rec:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vectors', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--rtt-ms', type=float, default=40.0, help='simulated Pinecone round-trip')
+    args = parser.parse_args()
+
+    items, queries = make_corpus(args.vectors)
+    queries = queries[:args.queries]
+    tmp = tempfile.mkdtemp()
+
+    start = time.perf_counter()
+    local = LocalVectorStore(tmp, DIM)
+    for i in range(0, len(items), 500):
+        local.upsert(items[i:i + 500])
+    load_s = time.perf_counter() - start
+    reopened = time.perf_counter()
+    local = LocalVectorStore(tmp, DIM)
+    reopen_s = time.perf_counter() - reopened
+
+    remote = PineconeStandIn(args.rtt_ms / 1000)
+    remote.upsert(items)
+
+    print("=" * 60)
+    print(f"🔎 Vector search ({args.vectors} x {DIM} vectors, {len(queries)} queries, top_k={args.top_k})")
+    print(f"  local index: built in {load_s:.2f}s, reopened in {reopen_s * 1000:.1f} ms")
+    print("=" * 60)
+
+    for label, flt in (('', None), (' + filter', {'type': 'media'})):
+        remote_lat, truth = run(remote, queries, args.top_k, flt)
+        local_lat, found = run(local, queries, args.top_k, flt)
+        report(f"pinecone stand-in{label}", remote_lat, 1.0)
+        report(f"local{label}", local_lat, recall(found, truth))
+
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark WhatsApp reply latency against a local stub of the Graph API
+Compares unpooled module-level requests calls (the old client) with the
+pooled WhatsAppClient and AsyncWhatsAppClient.
+
+Usage: python scripts/bench_whatsapp.py [--replies 50] [--handshake-ms 40]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import shutil
+import contextlib
+import argparse
+import tempfile
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# The stub needs no real credentials
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'bench')
+
+import requests
+from app.services.whatsapp import WhatsAppClient, AsyncWhatsAppClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Minimal Graph API: media uploads and message sends"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        body = {'id': 'media-1'} if self.path.endswith('/media') else {'messages': [{'id': 'wamid.1'}]}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Adds a fixed delay to every new connection to stand in for TCP+TLS setup"""
+    daemon_threads = True
+    handshake_delay = 0.0
+
+    def get_request(self):
+        conn = super().get_request()
+        time.sleep(self.handshake_delay)
+        return conn
+
+
+def legacy_reply(base_url: str, phone_id: str, audio: str, image: str):
+    """One reply the way the old client did it: a fresh connection per call"""
+    headers = {'Authorization': 'Bearer bench'}
+    messages_url = f"{base_url}/{phone_id}/messages"
+    media_url = f"{base_url}/{phone_id}/media"
+    requests.post(messages_url, json={'type': 'text'}, headers=headers).json()
+    for path, msg_type in ((audio, 'audio'), (image, 'image')):
+        with open(path, 'rb') as f:
+            up = requests.post(media_url, files={'file': f}, data={'messaging_product': 'whatsapp'}, headers=headers).json()
+        requests.post(messages_url, json={'type': msg_type, msg_type: {'id': up['id']}}, headers=headers).json()
+
+
+def pooled_reply(client: WhatsAppClient, audio: str, image: str):
+    client.send_text('5511999999999', 'Olá!')
+    client.send_audio('5511999999999', audio)
+    client.send_media('5511999999999', image)
+
+
+async def async_reply(client: AsyncWhatsAppClient, audio: str, image: str):
+    await client.send_text('5511999999999', 'Olá!')
+    await client.send_audio('5511999999999', audio)
+    await client.send_media('5511999999999', image)
+
+
+def copy_audio(src: str) -> str:
+    """send_audio deletes the file it sends, so each reply gets its own copy"""
+    dst = f"{src}.{time.perf_counter_ns()}.ogg"
+    shutil.copyfile(src, dst)
+    return dst
+
+
+async def run_async(base_url: str, audio: str, image: str, replies: int) -> list:
+    client = AsyncWhatsAppClient()
+    client.base_url = base_url
+    client.media_cache = None
+    samples = []
+    for _ in range(replies):
+        reply_audio = copy_audio(audio)
+        start = time.perf_counter()
+        await async_reply(client, reply_audio, image)
+        samples.append(time.perf_counter() - start)
+    await client.aclose()
+    return samples
+
+
+def report(name: str, samples: list):
+    samples_ms = [s * 1000 for s in samples]
+    p95 = statistics.quantiles(samples_ms, n=20)[18] if len(samples_ms) >= 20 else max(samples_ms)
+    print(f"  {name:<28} mean={statistics.mean(samples_ms):7.2f} ms  "
+          f"p50={statistics.median(samples_ms):7.2f} ms  p95={p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--replies', type=int, default=50)
+    parser.add_argument('--handshake-ms', type=float, default=40.0,
+                        help='simulated connection setup cost per new connection')
+    args = parser.parse_args()
+
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    server.handshake_delay = args.handshake_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    tmp = tempfile.mkdtemp()
+    audio = os.path.join(tmp, 'reply.ogg')
+    image = os.path.join(tmp, 'before_after.jpg')
+    for path in (audio, image):
+        with open(path, 'wb') as f:
+            f.write(os.urandom(64 * 1024))
+
+    print("=" * 60)
+    print(f"📨 WhatsApp reply latency ({args.replies} replies, 5 API calls each, "
+          f"{args.handshake_ms:.0f} ms per new connection)")
+    print("=" * 60)
+
+    samples = []
+    for _ in range(args.replies):
+        start = time.perf_counter()
+        legacy_reply(base_url, 'bench', audio, image)
+        samples.append(time.perf_counter() - start)
+    report('before (requests.post)', samples)
+
+    # The clients log every call; keep the report readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        client = WhatsAppClient()
+        client.base_url = base_url
+        client.media_cache = None  # measure connection reuse only
+        sync_samples = []
+        for _ in range(args.replies):
+            reply_audio = copy_audio(audio)
+            start = time.perf_counter()
+            pooled_reply(client, reply_audio, image)
+            sync_samples.append(time.perf_counter() - start)
+        client.close()
+        async_samples = asyncio.run(run_async(base_url, audio, image, args.replies))
+    report('after (pooled sync client)', sync_samples)
+    report('after (pooled async client)', async_samples)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Check the KB crawler against a local HTTP fixture server
+Serves a small site with ETag/Last-Modified support and verifies link
+following and depth limits, same-domain filtering, conditional re-crawls
+(304s), change and removal detection, bounded concurrency and connection
+reuse, then runs the Ingestor end to end with stand-in embeddings, including
+failed and truncated crawls that must not remove anything.
+
+Usage: python scripts/check_crawler.py
+"""
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import tempfile
+import shutil
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+# Stand-ins only: no real credentials, a throwaway local index
+DATA = tempfile.mkdtemp(prefix='check_crawler_')
+for key in ('OPENAI_API_KEY', 'PINECONE_API_KEY', 'WHATSAPP_ACCESS_TOKEN',
+            'WHATSAPP_PHONE_ID', 'ELEVENLABS_API_KEY'):
+    os.environ.setdefault(key, 'check')
+os.environ['VECTOR_BACKEND'] = 'local'
+os.environ['VECTOR_INDEX_FOLDER'] = os.path.join(DATA, 'vectors')
+os.environ['DATA_FOLDER'] = DATA
+os.environ['EMBED_CACHE_ENABLED'] = 'false'
+
+from app.config import get_settings
+from app.core.kb import manager
+from app.core.kb.crawler import Crawler
+from app.core.kb.ingest import Ingestor
+
+SITE = {
+    '/index.html': '<h1>Vagner Treinamentos</h1><p>Cursos online.</p>'
+                   '<a href="a.html">A</a> <a href="/b.html#preco">B</a> '
+                   '<a href="http://example.invalid/fora">fora</a>',
+    '/a.html': '<h2>Mentoria A</h2><p>A mentoria custa R$ 297.</p><a href="c.html">C</a>',
+    '/b.html': '<h2>Mentoria B</h2><ul><li>Garantia de 7 dias.</li></ul><script>x()</script>',
+    '/c.html': '<p>Página profunda.</p>',
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+    stats = {'requests': 0, 'connections': set(), 'active': 0, 'max_active': 0, 'statuses': []}
+    lock = threading.Lock()
+    modified = {}
+    failing = set()  # paths answering 500
+
+    def do_GET(self):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['connections'].add(self.client_address)
+            self.stats['active'] += 1
+            self.stats['max_active'] = max(self.stats['max_active'], self.stats['active'])
+        try:
+            time.sleep(0.05)
+            if self.path in self.failing:
+                return self._reply(500)
+            body = SITE.get(self.path)
+            if body is None:
+                return self._reply(404)
+            etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+            last_modified = self.modified.setdefault(self.path, formatdate(usegmt=True))
+            if self.headers.get('If-None-Match') == etag:
+                return self._reply(304, etag=etag, last_modified=last_modified)
+            self._reply(200, f"<html><body>{body}</body></html>".encode(), etag, last_modified)
+        finally:
+            with self.lock:
+                self.stats['active'] -= 1
+
+    def _reply(self, status, body=b'', etag=None, last_modified=None):
+        self.stats['statuses'].append((self.path, status))
+        self.send_response(status)
+        if status == 200:
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def crawl(crawler, seeds):
+    async def run():
+        return [page async for page in crawler.crawl(seeds)]
+    return {page.url.rsplit('/', 1)[-1]: page for page in asyncio.run(run())}
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        check.failed = True
+
+
+check.failed = False
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[(hashlib.md5(t.encode()).digest()[i % 16] + 1) / 256 for i in range(manager.EMBED_DIM)]
+                for t in texts]
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    stats = FixtureHandler.stats
+    try:
+        # First crawl: depth 1 reaches a and b but not c; the external link is ignored
+        recorded = {}
+        crawler = Crawler(lambda url: recorded.get(url), concurrency=2, max_depth=1)
+        pages = crawl(crawler, [f"{base}/index.html"])
+        check(sorted(pages) == ['a.html', 'b.html', 'index.html'], f"depth 1 crawl fetched {sorted(pages)}")
+        check(all(p.status == 'changed' for p in pages.values()), "all pages fetched on the first crawl")
+        check(pages['b.html'].blocks == ['# Mentoria B', 'Garantia de 7 dias.'],
+              f"text and headings extracted, scripts dropped: {pages['b.html'].blocks}")
+        check(stats['max_active'] <= 2, f"at most 2 requests in flight (saw {stats['max_active']})")
+        check(len(stats['connections']) < stats['requests'],
+              f"connections reused ({len(stats['connections'])} for {stats['requests']} requests)")
+
+        for page in pages.values():
+            recorded[page.url] = {'etag': page.etag, 'last_modified': page.last_modified, 'links': page.links}
+
+        # Re-crawl: every page answers 304, and links still come from the previous crawl
+        pages = crawl(crawler, [f"{base}/index.html"])
+        check(len(pages) == 3 and all(p.status == 'unchanged' for p in pages.values()),
+              f"re-crawl is all 304: {sorted((k, p.status) for k, p in pages.items())}")
+
+        # A changed page is re-fetched, a removed one reported gone
+        SITE['/b.html'] = SITE['/b.html'].replace('7 dias', '30 dias')
+        del SITE['/a.html']
+        pages = crawl(crawler, [f"{base}/index.html"])
+        check(pages['b.html'].status == 'changed', "changed page fetched again")
+        check(pages['a.html'].status == 'gone', "removed page reported gone")
+        check(pages['index.html'].status == 'unchanged', "unchanged page skipped")
+
+        # End to end: the second ingestion embeds nothing
+        manager.get_embeddings = lambda: FakeEmbeddings()
+        runs = []
+        for _ in range(2):
+            ingestor = Ingestor(requests_per_minute=0)
+            online = ingestor.ingest_urls([f"{base}/index.html"], max_depth=2)
+            ingestor.remove_missing('url', online)
+            ingestor.close()
+            runs.append(ingestor.stats)
+        check(runs[0].chunks_embedded > 0, f"first ingestion: {runs[0].summary()}")
+        check(runs[1].chunks_embedded == 0 and runs[1].skipped == 2, f"second ingestion: {runs[1].summary()}")
+        known = sorted(ingestor.manifest.sources('url'))
+
+        # A failing seed still leads to its children, and nothing is removed
+        FixtureHandler.failing.add('/index.html')
+        ingestor = Ingestor(requests_per_minute=0)
+        online = ingestor.ingest_urls([f"{base}/index.html"], max_depth=2)
+        ingestor.remove_missing('url', online)
+        ingestor.close()
+        FixtureHandler.failing.clear()
+        check(ingestor.stats.failed == 1 and ingestor.stats.sources == runs[1].sources,
+              f"children of a failing seed still crawled: {ingestor.stats.summary()}")
+        check(ingestor.stats.removed == 0 and sorted(ingestor.manifest.sources('url')) == known,
+              "a failed fetch removes nothing from the KB")
+
+        # A crawl cut short by max_pages removes nothing either
+        settings = get_settings()
+        max_pages, settings.CRAWL_MAX_PAGES = settings.CRAWL_MAX_PAGES, 1
+        try:
+            ingestor = Ingestor(requests_per_minute=0)
+            online = ingestor.ingest_urls([f"{base}/index.html"], max_depth=2)
+            ingestor.remove_missing('url', online)
+            ingestor.close()
+        finally:
+            settings.CRAWL_MAX_PAGES = max_pages
+        check(ingestor.stats.removed == 0 and sorted(ingestor.manifest.sources('url')) == known,
+              f"a truncated crawl removes nothing ({ingestor.stats.summary()})")
+
+        # init_kb with no URLs configured removes the listed pages, not ones added at runtime
+        ingestor = Ingestor(requests_per_minute=0)
+        ingestor.remove_missing('url', [])
+        ingestor.close()
+        manager.add_url_to_kb(f"{base}/b.html", max_depth=0)
+        ingestor = Ingestor(requests_per_minute=0)
+        ingestor.remove_missing('url', [])
+        ingestor.close()
+        check(ingestor.stats.removed == 0 and ingestor.manifest.sources('url_added') == [f"{base}/b.html"],
+              "pages added with add_url_to_kb survive init_kb's clean-up")
+    finally:
+        server.shutdown()
+        shutil.rmtree(DATA, ignore_errors=True)
+    sys.exit(1 if check.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
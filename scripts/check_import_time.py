@@ -0,0 +1,87 @@
+"""
+Import-time budget check
+Imports app.main in a fresh interpreter with all network access blocked
+and fails if any connection or DNS lookup is attempted, or if the import
+takes longer than the budget.
+
+Usage: python scripts/check_import_time.py [--budget-seconds 5]
+Exit code 0 on success, 1 on failure.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter: block the network, then time the import
+PROBE = r'''
+import json, socket, sys, time
+attempts = []
+
+def _blocked(kind):
+    def block(*args, **kwargs):
+        attempts.append(f"{kind} {args[1:] if kind == 'connect' else args[:2]}")
+        raise OSError(f"network access during import: {kind}")
+    return block
+
+socket.socket.connect = _blocked('connect')
+socket.socket.connect_ex = _blocked('connect')
+socket.getaddrinfo = _blocked('getaddrinfo')
+socket.create_connection = _blocked('create_connection')
+
+start = time.perf_counter()
+error = None
+try:
+    import app.main  # noqa: F401
+except BaseException as e:
+    error = repr(e)
+print(json.dumps({'seconds': time.perf_counter() - start, 'network': attempts, 'error': error}))
+'''
+
+# Required settings need a value, not a working credential
+PLACEHOLDER_ENV = {
+    'OPENAI_API_KEY': 'check', 'PINECONE_API_KEY': 'check', 'WHATSAPP_ACCESS_TOKEN': 'check',
+    'WHATSAPP_PHONE_ID': 'check', 'ELEVENLABS_API_KEY': 'check',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget-seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    env = {**PLACEHOLDER_ENV, **os.environ}
+    proc = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=PROJECT_ROOT, env=env,
+        capture_output=True, text=True
+    )
+    try:
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        print("❌ Import probe crashed:")
+        print(proc.stderr)
+        sys.exit(1)
+
+    failed = False
+    if result['error']:
+        print(f"❌ import app.main failed: {result['error']}")
+        failed = True
+    if result['network']:
+        print(f"❌ Network access during import ({len(result['network'])} attempt(s)):")
+        for attempt in result['network']:
+            print(f"   {attempt}")
+        failed = True
+    if result['seconds'] > args.budget_seconds:
+        print(f"❌ import app.main took {result['seconds']:.2f}s (budget {args.budget_seconds:.2f}s)")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print(f"✅ import app.main: {result['seconds']:.2f}s, no network access (budget {args.budget_seconds:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 """
 Initialize Knowledge Base
-Ingests PDFs, URLs, and media files into Pinecone
+Ingests PDFs, URLs, and media files into the vector store. Re-runs are
+incremental: unchanged sources are skipped and removed ones are deleted.
 """
 import os
 import json
@@ -12,12 +13,14 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Add parent directory to path for imports
 sys.path.insert(0, PROJECT_ROOT)
 
-from app.core.kb.manager import add_file_to_kb, add_url_to_kb, add_media_to_kb
+from app.core.kb.extract import supported_extensions
+from app.core.kb.ingest import Ingestor
+from app.core.kb.embedding_cache import get_embedding_cache
 from app.config import get_settings
 
 
-def ingest_pdfs():
-    """Ingest all PDF files from the PDFs folder"""
+def ingest_pdfs(ingestor: Ingestor):
+    """Ingest all documents (PDF, DOCX, TXT...) from the PDFs folder"""
     settings = get_settings()
     pdf_folder = settings.PDF_FOLDER
 
@@ -32,20 +35,24 @@ def ingest_pdfs():
         print(f'⚠️ PDF folder not found: {pdf_folder}')
         return
     
-    print(f"\n📚 Ingesting PDFs from {pdf_folder}...")
-    count = 0
-    
-    for filename in os.listdir(pdf_folder):
+    print(f"\n📚 Ingesting documents from {pdf_folder}...")
+    extensions = tuple(supported_extensions())
+    paths = []
+    for filename in sorted(os.listdir(pdf_folder)):
         file_path = os.path.join(pdf_folder, filename)
-        if filename.lower().endswith(('.pdf', '.txt', '.doc', '.docx')):
-            print(f"  Processing: {filename}")
-            add_file_to_kb(file_path)
-            count += 1
+        if not os.path.isfile(file_path) or filename.startswith('.'):
+            continue
+        if filename.lower().endswith(extensions):
+            paths.append(file_path)
+        else:
+            print(f"  ⚠️ Skipping {filename}: unsupported format ({', '.join(extensions)})")
     
-    print(f"✅ Ingested {count} documents")
+    ingestor.ingest_files(paths)
+    ingestor.remove_missing('doc', paths)
+    print(f"✅ {len(paths)} documents up to date")
 
 
-def ingest_urls():
+def ingest_urls(ingestor: Ingestor):
     """Ingest URLs (add your URLs here)"""
     print("\n🌐 Ingesting URLs...")
     
@@ -56,18 +63,19 @@ def ingest_urls():
         # 'https://example.com/about',
     ]
     
+    online = []
     if not urls:
         print("⚠️ No URLs configured. Edit scripts/init_kb.py to add URLs.")
-        return
-    
-    for url in urls:
-        print(f"  Processing: {url}")
-        add_url_to_kb(url)
-    
-    print(f"✅ Ingested {len(urls)} URLs")
+    else:
+        online = ingestor.ingest_urls(urls)
+        print(f"✅ {len(online)} pages up to date")
+    # Pages dropped from the list, no longer linked or gone (404/410) are removed;
+    # after a failed fetch or a truncated crawl only gone pages are. Pages added
+    # at runtime (add_url_to_kb) are kind 'url_added' and are not touched
+    ingestor.remove_missing('url', online)
 
 
-def ingest_media():
+def ingest_media(ingestor: Ingestor):
     """Ingest media files with captions from dataset"""
     settings = get_settings()
     media_folder = settings.MEDIA_FOLDER
@@ -90,19 +98,19 @@ def ingest_media():
     with open(dataset_path, 'r', encoding='utf-8') as f:
         dataset = json.load(f)
     
-    count = 0
+    entries = []
     for entry in dataset:
         file_path = os.path.join(media_folder, entry['file'])
         caption = entry.get('caption', entry['file'])
         
         if os.path.exists(file_path):
-            print(f"  Processing: {entry['file']}")
-            add_media_to_kb(file_path, caption)
-            count += 1
+            entries.append((file_path, caption))
         else:
             print(f"  ⚠️ Missing: {file_path}")
     
-    print(f"✅ Ingested {count} media files")
+    ingestor.ingest_media(entries)
+    ingestor.remove_missing('media', [file_path for file_path, _ in entries])
+    print(f"✅ {len(entries)} media files up to date")
 
 
 def main():
@@ -111,10 +119,19 @@ def main():
     print("🚀 Initializing Knowledge Base")
     print("=" * 60)
     
+    ingestor = Ingestor()
     try:
-        ingest_pdfs()
-        ingest_urls()
-        ingest_media()
+        ingest_pdfs(ingestor)
+        ingest_urls(ingestor)
+        ingest_media(ingestor)
+        
+        print(f"\n⚡ {ingestor.stats.summary()}")
+        
+        cache = get_embedding_cache()
+        if cache:
+            stats = cache.stats()
+            print(f"\n🧠 Embeddings: {stats['api_calls']} API calls, "
+                  f"{stats['api_calls_saved']} saved by the cache (hit rate {stats['hit_rate']:.0%})")
         
         print("\n" + "=" * 60)
         print("✅ Knowledge Base initialization complete!")
@@ -123,6 +140,8 @@ def main():
     except Exception as e:
         print(f"\n❌ Error during ingestion: {e}")
         raise
+    finally:
+        ingestor.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,59 @@
+"""
+Pre-upload media to WhatsApp
+Uploads every image/video in MEDIA_FOLDER that has no live cached media id,
+so the first customer reply does not pay for the upload.
+"""
+import os
+import sys
+
+# Get the project root directory (parent of scripts/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.config import get_settings
+from app.services.whatsapp import get_whatsapp_client
+from app.utils.files import is_image, is_video
+
+
+def warmup_media():
+    """Upload all media files without a valid cached id"""
+    settings = get_settings()
+    media_folder = settings.MEDIA_FOLDER
+
+    # Convert relative path to absolute (relative to PROJECT_ROOT, not cwd)
+    if not os.path.isabs(media_folder):
+        media_folder = os.path.join(PROJECT_ROOT, media_folder)
+
+    if not os.path.exists(media_folder):
+        print(f'⚠️ Media folder not found: {media_folder}')
+        return
+
+    print(f"\n🎨 Warming up media ids from {media_folder}...")
+    client = get_whatsapp_client()
+    cache = client.media_cache
+    cached = uploaded = failed = 0
+
+    for filename in sorted(os.listdir(media_folder)):
+        file_path = os.path.join(media_folder, filename)
+        if not (is_image(filename) or is_video(filename)):
+            continue
+
+        if cache.get(file_path):
+            cached += 1
+            continue
+
+        # Upload directly: ensure_uploaded() would look the file up again
+        # and count a second cache miss
+        print(f"  Uploading: {filename}")
+        if client._upload_and_cache(file_path):
+            uploaded += 1
+        else:
+            failed += 1
+
+    print(f"✅ Media ids ready: {uploaded} uploaded, {cached} already cached, {failed} failed")
+
+
+if __name__ == '__main__':
+    warmup_media()